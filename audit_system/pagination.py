@@ -0,0 +1,50 @@
+import json
+
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+
+
+def estimate_count(queryset):
+    """Row count estimated by the query planner, exact on databases without estimates"""
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination on (created_at, id), newest first
+
+    Page cost does not grow with depth. Responses carry the exact total
+    ``count``; ``?count=estimate`` replaces it with the planner's estimate.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.count = estimate_count(queryset)
+        else:
+            self.count = queryset.order_by().count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count'] = self.count
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
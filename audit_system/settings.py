@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -155,6 +156,23 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# MEDIA_ROOT is the 'default' volume, blobs are spread over it and any extra
+# volumes given as "name=/path,name=/path" by free space
+STORAGES = {
+    'default': {'BACKEND': 'files.storage.MultiVolumeStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+FILES_STORAGE_VOLUMES = config(
+    'FILES_STORAGE_VOLUMES', default='',
+    cast=lambda value: dict(pair.strip().split('=', 1) for pair in value.split(',') if pair.strip())
+)
+# Public base URL of each extra volume as "name=url,name=url", MEDIA_URL + volumes/<name>/ if not given
+FILES_STORAGE_VOLUME_URLS = config(
+    'FILES_STORAGE_VOLUME_URLS', default='',
+    cast=lambda value: dict(pair.strip().split('=', 1) for pair in value.split(',') if pair.strip())
+)
+FILES_VOLUME_RESERVE = config('FILES_VOLUME_RESERVE', default=1024 * 1024 * 1024, cast=int)  # 1GB kept free per volume
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -226,6 +244,56 @@ X_FRAME_OPTIONS = 'SAMEORIGIN'
 ONLYOFFICE_DOCUMENT_SERVER_URL = config('ONLYOFFICE_DOCUMENT_SERVER_URL', default='http://localhost:8080')
 ONLYOFFICE_JWT_SECRET = config('ONLYOFFICE_JWT_SECRET', default='your-secret-key')
 
+# Callbacks are queued and saved by `manage.py run_onlyoffice_workers`, failed
+# saves are retried with exponential backoff
+ONLYOFFICE_CALLBACK_MAX_ATTEMPTS = config('ONLYOFFICE_CALLBACK_MAX_ATTEMPTS', default=5, cast=int)
+ONLYOFFICE_CALLBACK_RETRY_DELAY = 30  # seconds before the first retry, doubled each time
+ONLYOFFICE_CALLBACK_MAX_RETRY_DELAY = 3600  # seconds
+ONLYOFFICE_FORCESAVE_WINDOW = config('ONLYOFFICE_FORCESAVE_WINDOW', default=60, cast=int)  # seconds of force-saves committed as one version
+
+# Downloads of edited documents from the Document Server
+ONLYOFFICE_DOWNLOAD_CONNECT_TIMEOUT = config('ONLYOFFICE_DOWNLOAD_CONNECT_TIMEOUT', default=5, cast=float)  # seconds
+ONLYOFFICE_DOWNLOAD_READ_TIMEOUT = config('ONLYOFFICE_DOWNLOAD_READ_TIMEOUT', default=60, cast=float)  # seconds between bytes
+ONLYOFFICE_DOWNLOAD_MAX_SIZE = config('ONLYOFFICE_DOWNLOAD_MAX_SIZE', default=100 * 1024 * 1024, cast=int)  # 100MB
+ONLYOFFICE_DOWNLOAD_POOL_SIZE = 10  # keep-alive connections per worker thread
+
 # File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
+# Uploads stream to a temp dir on the media volume and are renamed into place
+FILE_UPLOAD_HANDLERS = ['files.uploadhandlers.StreamingHashUploadHandler']
+FILES_UPLOAD_TEMP_DIR = MEDIA_ROOT / 'tmp'
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB of non-file request data
+FILES_MAX_UPLOAD_SIZE = config('FILES_MAX_UPLOAD_SIZE', default=50 * 1024 * 1024, cast=int)  # 50MB
+FILES_ALLOWED_EXTENSIONS = [
+    '.xlsx', '.xls', '.docx', '.doc', '.pdf',
+    '.txt', '.csv', '.ppt', '.pptx'
+]
+
+# Resumable uploads (/api/files/uploads/)
+FILES_MAX_RESUMABLE_UPLOAD_SIZE = config('FILES_MAX_RESUMABLE_UPLOAD_SIZE', default=2 * 1024 * 1024 * 1024, cast=int)  # 2GB
+FILES_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB, the largest chunk accepted
+FILES_UPLOAD_SESSION_TTL = timedelta(hours=24)  # since the last chunk
+
+# Bulk uploads (/api/files/bulk/), many files or one ZIP archive per request
+FILES_BULK_MAX_ENTRIES = config('FILES_BULK_MAX_ENTRIES', default=1000, cast=int)
+FILES_BULK_MAX_ARCHIVE_SIZE = config('FILES_BULK_MAX_ARCHIVE_SIZE', default=1024 * 1024 * 1024, cast=int)  # 1GB
+FILES_BULK_MAX_UNPACKED_SIZE = config('FILES_BULK_MAX_UNPACKED_SIZE', default=4 * 1024 * 1024 * 1024, cast=int)  # 4GB
+FILES_BULK_MAX_COMPRESSION_RATIO = 100  # larger ratios are treated as zip bombs
+FILES_BULK_WORKERS = config('FILES_BULK_WORKERS', default=os.cpu_count() or 1, cast=int)
+
+# File downloads: 'django' streams the bytes itself, 'nginx' hands them to the
+# front proxy with X-Accel-Redirect and 'sendfile' with X-Sendfile
+FILES_SERVE_MODE = config('FILES_SERVE_MODE', default='django')
+FILES_ACCEL_REDIRECT_PREFIX = config('FILES_ACCEL_REDIRECT_PREFIX', default='/protected-media/')  # internal nginx location
+FILES_SIGNED_URL_TTL = config('FILES_SIGNED_URL_TTL', default=300, cast=int)  # seconds
+ONLYOFFICE_DOCUMENT_URL_TTL = config('ONLYOFFICE_DOCUMENT_URL_TTL', default=3600, cast=int)  # seconds
+
+# Cold tier: archived files and versions older than FILES_COLD_VERSION_AGE are
+# packed compressed (zstd when zstandard is installed, zlib otherwise)
+FILES_COLD_ROOT = config('FILES_COLD_ROOT', default=str(BASE_DIR / 'cold_storage'))
+FILES_COLD_VERSION_AGE = timedelta(days=config('FILES_COLD_VERSION_AGE_DAYS', default=90, cast=int))
+FILES_COLD_REHEAT_PERIOD = timedelta(days=30)  # re-read content stays hot this long
+FILES_COLD_PACK_SIZE = 1024 * 1024 * 1024  # 1GB, then a new pack is started
+FILES_COLD_ZSTD_LEVEL = 10
+
+# Document text extraction (0 runs extraction inline instead of in a thread pool)
+FILE_EXTRACTION_WORKERS = config('FILE_EXTRACTION_WORKERS', default=2, cast=int)
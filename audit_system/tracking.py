@@ -0,0 +1,46 @@
+from django.db.models.fields.files import FieldFile
+
+
+def _comparable(value):
+    # FieldFile objects are mutated in place by FieldFile.save(), keep the name
+    if isinstance(value, FieldFile):
+        return value.name
+    return value
+
+
+class LoadedValuesMixin:
+    """Remember the field values a model instance was loaded with.
+
+    Signal handlers use ``previous_value`` and ``has_changed`` to find out
+    what a save changed without issuing an extra query for the old row.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def previous_value(self, attname, default=None):
+        """Get the value ``attname`` had before the current save"""
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    def has_changed(self, *attnames):
+        """Check if any of the given fields differ from the loaded values"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return True
+        missing = object()
+        return any(
+            loaded.get(attname, missing) != _comparable(getattr(self, attname))
+            for attname in attnames
+        )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save receivers have seen the old values by now
+        self._loaded_values = {
+            field.attname: _comparable(getattr(self, field.attname))
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
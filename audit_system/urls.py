@@ -26,6 +26,9 @@ urlpatterns = [
     path('api/files/', include('files.urls')),
 ]
 
-# Serve media files during development
+# Serve media files during development, extra volumes under MEDIA_URL/volumes/<name>/
 if settings.DEBUG:
+    for volume, root in settings.FILES_STORAGE_VOLUMES.items():
+        if volume not in settings.FILES_STORAGE_VOLUME_URLS:
+            urlpatterns += static(f'{settings.MEDIA_URL}volumes/{volume}/', document_root=root)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
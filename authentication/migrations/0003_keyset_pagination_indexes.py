@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0002_initial'),
+        ('departments', '0003_departmentcounters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='auth_user_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['department', 'created_at', 'id'], name='auth_user_dept_created'),
+        ),
+    ]
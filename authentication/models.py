@@ -1,8 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from audit_system.tracking import LoadedValuesMixin
 
 
-class User(AbstractUser):
+class User(LoadedValuesMixin, AbstractUser):
     """Custom User model with additional fields"""
     
     ROLE_CHOICES = [
@@ -31,6 +32,11 @@ class User(AbstractUser):
     class Meta:
         db_table = 'auth_user'
         verbose_name = 'User'
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='auth_user_created_id'),
+            models.Index(fields=['department', 'created_at', 'id'], name='auth_user_dept_created'),
+        ]
         verbose_name_plural = 'Users'
 
     def __str__(self):
@@ -47,7 +53,7 @@ class User(AbstractUser):
         return hasattr(self, f'can_{permission_type}') and getattr(self, f'can_{permission_type}')
 
 
-class Permission(models.Model):
+class Permission(LoadedValuesMixin, models.Model):
     """Permission model for file access control"""
     
     PERMISSION_CHOICES = [
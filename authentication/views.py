@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.db import models
+from audit_system.pagination import CreatedAtCursorPagination
 from .models import User, Permission
 from .serializers import (
     CustomTokenObtainPairSerializer,
@@ -64,6 +65,7 @@ class UserListCreateView(generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
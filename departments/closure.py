@@ -0,0 +1,69 @@
+"""Maintenance of the DepartmentClosure table."""
+from django.db import transaction
+
+from .models import Department, DepartmentClosure
+
+
+def insert_department(department):
+    """Add the closure rows of a newly created department"""
+    rows = [DepartmentClosure(ancestor_id=department.id, descendant_id=department.id, depth=0)]
+    if department.parent_id:
+        rows.extend(
+            DepartmentClosure(ancestor_id=ancestor_id, descendant_id=department.id, depth=depth + 1)
+            for ancestor_id, depth in DepartmentClosure.objects.filter(
+                descendant_id=department.parent_id
+            ).values_list('ancestor_id', 'depth')
+        )
+    DepartmentClosure.objects.bulk_create(rows)
+
+
+def move_department(department):
+    """Rewrite the closure rows of a subtree whose root got a new parent"""
+    with transaction.atomic():
+        subtree = list(DepartmentClosure.objects.filter(
+            ancestor_id=department.id
+        ).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # Drop the links from the old ancestors into the subtree
+        DepartmentClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+
+        if not department.parent_id:
+            return
+        new_ancestors = DepartmentClosure.objects.filter(
+            descendant_id=department.parent_id
+        ).values_list('ancestor_id', 'depth')
+        DepartmentClosure.objects.bulk_create([
+            DepartmentClosure(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + depth + 1
+            )
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree
+        ], batch_size=1000)
+
+
+def closure_rows(parents):
+    """Yield (ancestor, descendant, depth) for a {department_id: parent_id} map"""
+    for department_id in parents:
+        ancestor_id, depth, seen = department_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            yield ancestor_id, department_id, depth
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+
+def rebuild_closure():
+    """Rebuild the whole closure table, returns the number of rows written"""
+    parents = dict(Department.objects.values_list('id', 'parent_id'))
+    rows = [
+        DepartmentClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for ancestor_id, descendant_id, depth in closure_rows(parents)
+    ]
+    with transaction.atomic():
+        DepartmentClosure.objects.all().delete()
+        DepartmentClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,174 @@
+"""Maintenance of the DepartmentCounters table.
+
+Frequent events (users joining or leaving, files added, resized or
+removed) apply F() deltas to the affected rows. Structural changes to the
+tree are rare and recompute the affected ancestors instead.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Subquery, Sum
+
+from .models import DepartmentClosure, DepartmentCounters
+
+
+def _ancestor_ids(department_id):
+    """The department and all departments above it"""
+    return DepartmentClosure.objects.filter(descendant_id=department_id).values('ancestor_id')
+
+
+def _ensure(department_ids):
+    DepartmentCounters.objects.bulk_create(
+        [DepartmentCounters(department_id=department_id) for department_id in department_ids],
+        ignore_conflicts=True
+    )
+
+
+def _apply(department_id, direct=None, subtree=None):
+    """Add ``direct`` deltas to one department and ``subtree`` deltas to it and its ancestors"""
+    if direct:
+        DepartmentCounters.objects.filter(department_id=department_id).update(
+            **{field: F(field) + delta for field, delta in direct.items()}
+        )
+    if subtree:
+        DepartmentCounters.objects.filter(department_id__in=_ancestor_ids(department_id)).update(
+            **{field: F(field) + delta for field, delta in subtree.items()}
+        )
+
+
+def user_changed(old_department_id, old_active, new_department_id, new_active):
+    """Move one user's contribution between departments"""
+    with transaction.atomic():
+        if old_department_id:
+            _apply(
+                old_department_id,
+                direct={'user_count': -1, 'active_user_count': -int(old_active)},
+                subtree={'subtree_user_count': -1, 'subtree_active_user_count': -int(old_active)}
+            )
+        if new_department_id:
+            _apply(
+                new_department_id,
+                direct={'user_count': 1, 'active_user_count': int(new_active)},
+                subtree={'subtree_user_count': 1, 'subtree_active_user_count': int(new_active)}
+            )
+
+
+def _refresh_last_file_at(department_id):
+    File = apps.get_model('files', 'File')
+    latest = File.objects.filter(department_id=department_id).order_by('-created_at').values('created_at')[:1]
+    DepartmentCounters.objects.filter(department_id=department_id).update(last_file_at=Subquery(latest))
+
+
+def file_changed(old_department_id, old_size, new_department_id, new_size, created_at=None):
+    """Move one file's contribution between departments
+
+    ``created_at`` is given for new files, which are always the latest upload.
+    """
+    with transaction.atomic():
+        if old_department_id:
+            _apply(old_department_id, direct={'file_count': -1, 'total_bytes': -old_size})
+            if old_department_id != new_department_id:
+                _refresh_last_file_at(old_department_id)
+        if new_department_id:
+            _apply(new_department_id, direct={'file_count': 1, 'total_bytes': new_size})
+            if created_at is not None:
+                DepartmentCounters.objects.filter(department_id=new_department_id).update(
+                    last_file_at=created_at
+                )
+            elif old_department_id != new_department_id:
+                _refresh_last_file_at(new_department_id)
+
+
+def files_added(department_id, count, size, created_at):
+    """Count ``count`` new files of ``size`` bytes in total, created in bulk"""
+    if department_id and count:
+        with transaction.atomic():
+            _apply(department_id, direct={'file_count': count, 'total_bytes': size})
+            DepartmentCounters.objects.filter(department_id=department_id).update(last_file_at=created_at)
+
+
+def department_created(department):
+    """Add the counters row of a new department and count it in its ancestors"""
+    with transaction.atomic():
+        _ensure([department.id])
+        if department.parent_id:
+            _apply(department.parent_id, direct={'child_count': 1}, subtree={'subdepartment_count': 1})
+
+
+def departments_restructured(*department_ids):
+    """Recompute the given departments and everything above them"""
+    affected = set(DepartmentClosure.objects.filter(
+        descendant_id__in=[department_id for department_id in department_ids if department_id]
+    ).values_list('ancestor_id', flat=True))
+    if affected:
+        recompute(affected)
+
+
+def compute(department_ids=None):
+    """Count everything from scratch, returns {department_id: {field: value}}"""
+    Department = apps.get_model('departments', 'Department')
+    User = apps.get_model('authentication', 'User')
+    File = apps.get_model('files', 'File')
+
+    departments = Department.objects.all()
+    users = User.objects.filter(department__isnull=False)
+    closure = DepartmentClosure.objects.all()
+    files = File.objects.filter(department__isnull=False)
+    if department_ids is not None:
+        departments = departments.filter(id__in=department_ids)
+        users = users.filter(department_id__in=department_ids)
+        closure = closure.filter(ancestor_id__in=department_ids)
+        files = files.filter(department_id__in=department_ids)
+
+    values = {
+        department_id: dict.fromkeys(DepartmentCounters.COUNTER_FIELDS, 0)
+        for department_id in departments.values_list('id', flat=True)
+    }
+    for row in values.values():
+        row['last_file_at'] = None
+
+    def fill(queryset, key, **aggregates):
+        for row in queryset.values(key).annotate(**aggregates).order_by():
+            if row[key] in values:
+                values[row[key]].update({
+                    field: row[field] if field == 'last_file_at' else row[field] or 0
+                    for field in aggregates
+                })
+
+    fill(users, 'department_id',
+         user_count=Count('id'), active_user_count=Count('id', filter=Q(is_active=True)))
+    fill(closure, 'ancestor_id',
+         subtree_user_count=Count('descendant__users'),
+         subtree_active_user_count=Count('descendant__users', filter=Q(descendant__users__is_active=True)))
+    fill(closure.filter(depth=1), 'ancestor_id', child_count=Count('id'))
+    fill(closure.filter(depth__gt=0), 'ancestor_id', subdepartment_count=Count('id'))
+    fill(files, 'department_id',
+         file_count=Count('id'), total_bytes=Sum('file_size'), last_file_at=Max('created_at'))
+    return values
+
+
+def recompute(department_ids=None, dry_run=False):
+    """Overwrite counters that drifted from the real data, returns the ids that drifted"""
+    expected = compute(department_ids)
+    with transaction.atomic():
+        current = DepartmentCounters.objects.select_for_update()
+        if department_ids is not None:
+            current = current.filter(department_id__in=list(expected))
+        current = {counters.department_id: counters for counters in current}
+
+        missing = [department_id for department_id in expected if department_id not in current]
+        drifted = []
+        for department_id, counters in current.items():
+            values = expected.get(department_id)
+            if values and any(getattr(counters, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(counters, field, value)
+                drifted.append(counters)
+
+        if not dry_run:
+            DepartmentCounters.objects.bulk_create(
+                [DepartmentCounters(department_id=department_id, **expected[department_id])
+                 for department_id in missing],
+                ignore_conflicts=True
+            )
+            DepartmentCounters.objects.bulk_update(drifted, DepartmentCounters.COUNTER_FIELDS, batch_size=500)
+    return missing + [counters.department_id for counters in drifted]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from departments import closure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the department closure table from the parent links'
+
+    def handle(self, *args, **options):
+        written = closure.rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(f'Department closure rebuilt: {written} rows'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from departments import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute department counters in bulk and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report departments whose counters drifted'
+        )
+
+    def handle(self, *args, **options):
+        drifted = counters.recompute(dry_run=options['dry_run'])
+        for department_id in drifted:
+            self.stdout.write(f'Department {department_id}: counters drifted')
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} drifted department counters {action}'))
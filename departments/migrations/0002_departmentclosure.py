@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_closure(apps, schema_editor):
+    Department = apps.get_model('departments', 'Department')
+    DepartmentClosure = apps.get_model('departments', 'DepartmentClosure')
+    parents = dict(Department.objects.values_list('id', 'parent_id'))
+    rows = []
+    for department_id in parents:
+        ancestor_id, depth, seen = department_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(DepartmentClosure(ancestor_id=ancestor_id, descendant_id=department_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    DepartmentClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='departments.department')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='departments.department')),
+            ],
+            options={
+                'verbose_name': 'Department Closure',
+                'verbose_name_plural': 'Department Closure',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='departments_closure_desc')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
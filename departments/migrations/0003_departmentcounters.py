@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0002_departmentclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentCounters',
+            fields=[
+                ('department', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='departments.department')),
+                ('user_count', models.IntegerField(default=0)),
+                ('active_user_count', models.IntegerField(default=0)),
+                ('subtree_user_count', models.IntegerField(default=0)),
+                ('subtree_active_user_count', models.IntegerField(default=0)),
+                ('child_count', models.IntegerField(default=0)),
+                ('subdepartment_count', models.IntegerField(default=0)),
+                ('file_count', models.IntegerField(default=0)),
+                ('total_bytes', models.BigIntegerField(default=0)),
+                ('last_file_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Department Counters',
+                'verbose_name_plural': 'Department Counters',
+            },
+        ),
+    ]
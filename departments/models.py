@@ -1,7 +1,8 @@
 from django.db import models
+from audit_system.tracking import LoadedValuesMixin
 
 
-class Department(models.Model):
+class Department(LoadedValuesMixin, models.Model):
     """Department model"""
     
     name = models.CharField(max_length=100, unique=True)
@@ -42,13 +43,77 @@ class Department(models.Model):
     def get_all_users(self):
         """Get all users in this department and its subdepartments"""
         from authentication.models import User
-        department_ids = [self.id] + list(self.get_all_subdepartments().values_list('id', flat=True))
-        return User.objects.filter(department_id__in=department_ids)
+        return User.objects.filter(department__ancestor_links__ancestor=self)
+
+    def get_subtree(self, max_depth=None):
+        """Get this department and its subdepartments, optionally only ``max_depth`` levels down"""
+        if max_depth is None:
+            return Department.objects.filter(ancestor_links__ancestor=self)
+        return Department.objects.filter(ancestor_links__ancestor=self, ancestor_links__depth__lte=max_depth)
 
     def get_all_subdepartments(self):
-        """Get all subdepartments recursively"""
-        subdepartments = Department.objects.filter(parent=self)
-        all_subdepartments = subdepartments
-        for subdept in subdepartments:
-            all_subdepartments = all_subdepartments | subdept.get_all_subdepartments()
-        return all_subdepartments
+        """Get all subdepartments at any depth"""
+        return Department.objects.filter(ancestor_links__ancestor=self, ancestor_links__depth__gt=0)
+
+
+class DepartmentClosure(models.Model):
+    """Closure table of the department tree
+
+    Holds one row per (ancestor, descendant) pair, including a depth 0 row
+    for every department, so subtree queries are a single indexed join.
+    Maintained by departments/closure.py.
+    """
+
+    ancestor = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='departments_closure_desc'),
+        ]
+        verbose_name = 'Department Closure'
+        verbose_name_plural = 'Department Closure'
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class DepartmentCounters(models.Model):
+    """Denormalized department statistics
+
+    Updated incrementally by the receivers in departments/signals.py and
+    recomputed in bulk by ``verify_department_counters``. The ``subtree_``
+    fields include all subdepartments at any depth.
+    """
+
+    department = models.OneToOneField(
+        Department,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    user_count = models.IntegerField(default=0)
+    active_user_count = models.IntegerField(default=0)
+    subtree_user_count = models.IntegerField(default=0)
+    subtree_active_user_count = models.IntegerField(default=0)
+    child_count = models.IntegerField(default=0)
+    subdepartment_count = models.IntegerField(default=0)
+    file_count = models.IntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    last_file_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTER_FIELDS = (
+        'user_count', 'active_user_count', 'subtree_user_count',
+        'subtree_active_user_count', 'child_count', 'subdepartment_count',
+        'file_count', 'total_bytes', 'last_file_at'
+    )
+
+    class Meta:
+        verbose_name = 'Department Counters'
+        verbose_name_plural = 'Department Counters'
+
+    def __str__(self):
+        return f"{self.department_id} counters"
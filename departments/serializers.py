@@ -1,5 +1,16 @@
+from datetime import timedelta
+from django.db.models import Max, Sum
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Department
+from .models import Department, DepartmentCounters
+
+
+def get_counters(department):
+    """Get the department's counters row, None until it has been computed"""
+    try:
+        return department.counters
+    except DepartmentCounters.DoesNotExist:
+        return None
 
 
 class DepartmentSerializer(serializers.ModelSerializer):
@@ -22,11 +33,13 @@ class DepartmentSerializer(serializers.ModelSerializer):
 
     def get_user_count(self, obj):
         """Get the number of users in this department"""
-        return obj.users.count()
+        counters = get_counters(obj)
+        return counters.user_count if counters else obj.users.count()
 
     def get_subdepartment_count(self, obj):
         """Get the number of subdepartments"""
-        return obj.subdepartments.count()
+        counters = get_counters(obj)
+        return counters.child_count if counters else obj.subdepartments.count()
 
 
 class DepartmentCreateSerializer(serializers.ModelSerializer):
@@ -40,7 +53,8 @@ class DepartmentCreateSerializer(serializers.ModelSerializer):
         # Prevent circular parent-child relationships
         parent = attrs.get('parent')
         if parent and self.instance:
-            if parent == self.instance or parent in self.instance.get_all_subdepartments():
+            # The closure table includes the department itself at depth 0
+            if self.instance.descendant_links.filter(descendant=parent).exists():
                 raise serializers.ValidationError(
                     "Cannot set parent to self or subdepartment."
                 )
@@ -63,45 +77,79 @@ class DepartmentTreeSerializer(serializers.ModelSerializer):
 
     def get_subdepartments(self, obj):
         """Get subdepartments recursively"""
-        subdepts = obj.subdepartments.filter(is_active=True)
-        return DepartmentTreeSerializer(subdepts, many=True).data
+        # department_tree passes the prefetched tree in the context
+        children = self.context.get('children')
+        if children is None:
+            subdepts = obj.subdepartments.filter(is_active=True)
+        else:
+            subdepts = [child for child in children.get(obj.id, []) if child.is_active]
+        return DepartmentTreeSerializer(subdepts, many=True, context=self.context).data
 
     def get_user_count(self, obj):
         """Get the total number of users in this department and subdepartments"""
-        return obj.get_all_users().count()
+        user_counts = self.context.get('user_counts')
+        if user_counts is None:
+            return obj.get_all_users().count()
+        return user_counts.get(obj.id, 0)
 
 
 class DepartmentStatsSerializer(serializers.ModelSerializer):
-    """Department statistics serializer"""
+    """Department statistics serializer
+
+    Reads DepartmentCounters; department_stats annotates ``recent_file_count``
+    in the same query. Falls back to live counts for departments whose
+    counters have not been computed yet.
+    """
     
     total_users = serializers.SerializerMethodField()
     active_users = serializers.SerializerMethodField()
     total_files = serializers.SerializerMethodField()
+    total_bytes = serializers.SerializerMethodField()
     recent_files = serializers.SerializerMethodField()
+    last_file_at = serializers.SerializerMethodField()
     subdepartment_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Department
         fields = (
             'id', 'name', 'total_users', 'active_users',
-            'total_files', 'recent_files', 'subdepartment_count'
+            'total_files', 'total_bytes', 'recent_files', 'last_file_at',
+            'subdepartment_count'
         )
 
     def get_total_users(self, obj):
-        return obj.get_all_users().count()
+        counters = get_counters(obj)
+        return counters.subtree_user_count if counters else obj.get_all_users().count()
 
     def get_active_users(self, obj):
+        counters = get_counters(obj)
+        if counters:
+            return counters.subtree_active_user_count
         return obj.get_all_users().filter(is_active=True).count()
 
     def get_total_files(self, obj):
-        return obj.files.count()
+        counters = get_counters(obj)
+        return counters.file_count if counters else obj.files.count()
+
+    def get_total_bytes(self, obj):
+        counters = get_counters(obj)
+        if counters:
+            return counters.total_bytes
+        return obj.files.aggregate(total=Sum('file_size'))['total'] or 0
 
     def get_recent_files(self, obj):
-        from django.utils import timezone
-        from datetime import timedelta
+        if hasattr(obj, 'recent_file_count'):
+            return obj.recent_file_count
         
         last_week = timezone.now() - timedelta(days=7)
         return obj.files.filter(created_at__gte=last_week).count()
 
+    def get_last_file_at(self, obj):
+        counters = get_counters(obj)
+        if counters:
+            return counters.last_file_at
+        return obj.files.aggregate(last=Max('created_at'))['last']
+
     def get_subdepartment_count(self, obj):
-        return obj.get_all_subdepartments().count()
+        counters = get_counters(obj)
+        return counters.subdepartment_count if counters else obj.get_all_subdepartments().count()
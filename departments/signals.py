@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import closure, counters
+from .models import Department
+
+# Sent after the closure table reflects a department moved under a new parent
+department_moved = Signal()
+
+
+@receiver(post_save, sender=Department)
+def department_saved(sender, instance, created, **kwargs):
+    """Keep the closure table and counters in step with the department tree"""
+    if created:
+        closure.insert_department(instance)
+        counters.department_created(instance)
+    elif instance.has_changed('parent_id'):
+        previous_parent_id = instance.previous_value('parent_id')
+        closure.move_department(instance)
+        counters.departments_restructured(previous_parent_id, instance.id)
+        department_moved.send(sender=Department, department=instance)
+
+
+@receiver(post_delete, sender=Department)
+def department_deleted(sender, instance, **kwargs):
+    counters.departments_restructured(instance.parent_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Count users joining, leaving or (de)activated in a department"""
+    if created:
+        counters.user_changed(None, False, instance.department_id, instance.is_active)
+    elif instance.has_changed('department_id', 'is_active'):
+        counters.user_changed(
+            instance.previous_value('department_id'),
+            instance.previous_value('is_active', False),
+            instance.department_id,
+            instance.is_active
+        )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    counters.user_changed(instance.department_id, instance.is_active, None, False)
+
+
+@receiver(post_save, sender='files.File')
+def file_saved(sender, instance, created, **kwargs):
+    """Count files and stored bytes per department"""
+    if created:
+        counters.file_changed(None, 0, instance.department_id, instance.file_size, instance.created_at)
+    elif instance.has_changed('department_id', 'file_size'):
+        counters.file_changed(
+            instance.previous_value('department_id'),
+            instance.previous_value('file_size', 0),
+            instance.department_id,
+            instance.file_size
+        )
+
+
+@receiver(post_delete, sender='files.File')
+def file_deleted(sender, instance, **kwargs):
+    counters.file_changed(instance.department_id, instance.file_size, None, 0)
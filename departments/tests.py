@@ -1,3 +1,118 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from authentication.models import User
+from files.models import File
+from . import counters
+from .models import Department, DepartmentCounters
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DepartmentTreeBenchmarkTest(TestCase):
+    """The tree endpoint issues the same number of queries at any tree size"""
+
+    SIZES = (10, 100, 1000, 5000)
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.department_ids = []
+
+    def grow_tree(self, size):
+        """Grow the tree to ``size`` departments with four children per node, one user each"""
+        ids = self.department_ids
+        while len(ids) < size:
+            created = Department.objects.bulk_create([
+                Department(name=f'Department {index}', parent_id=ids[(index - 1) // 4] if index else None)
+                for index in range(len(ids), min(size, len(ids) * 4 + 1))
+            ])
+            User.objects.bulk_create([
+                User(username=f'user{department.id}', email=f'user{department.id}@example.com', department=department)
+                for department in created
+            ])
+            ids.extend(department.id for department in created)
+
+    def test_query_count_is_constant(self):
+        query_counts = {}
+        for size in self.SIZES:
+            self.grow_tree(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/departments/tree/')
+            self.assertEqual(response.status_code, 200)
+            query_counts[size] = len(queries)
+
+            # Every user is rolled up into the single root
+            self.assertEqual(len(response.data), 1)
+            self.assertEqual(response.data[0]['user_count'], size)
+
+        self.assertEqual(len(set(query_counts.values())), 1, query_counts)
+
+
+class DepartmentCountersTest(TestCase):
+    """Counters follow users and files incrementally and match a full recount"""
+
+    def setUp(self):
+        self.parent = Department.objects.create(name='Audit')
+        self.child = Department.objects.create(name='Team', parent=self.parent)
+
+    def counters(self, department):
+        return DepartmentCounters.objects.get(department=department)
+
+    def test_incremental_updates_match_recount(self):
+        user = User.objects.create_user(
+            username='editor', email='editor@example.com', password='pass', department=self.child
+        )
+        File.objects.create(name='Report', file_type='other', uploaded_by=user, department=self.child, file_size=100)
+
+        child, parent = self.counters(self.child), self.counters(self.parent)
+        self.assertEqual((child.user_count, child.file_count, child.total_bytes), (1, 1, 100))
+        self.assertEqual((parent.user_count, parent.subtree_user_count, parent.child_count), (0, 1, 1))
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.counters(self.parent).subtree_active_user_count, 0)
+
+        user.department = self.parent
+        user.save()
+        self.assertEqual(self.counters(self.child).user_count, 0)
+        self.assertEqual(self.counters(self.parent).user_count, 1)
+
+        self.assertEqual(counters.recompute(dry_run=True), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ManagerScopeTest(TestCase):
+    """Managers see two levels below them in the list and one level in detail and stats"""
+
+    def setUp(self):
+        self.root = Department.objects.create(name='Audit')
+        self.child = Department.objects.create(name='Team', parent=self.root)
+        self.grandchild = Department.objects.create(name='Squad', parent=self.child)
+        self.great_grandchild = Department.objects.create(name='Pod', parent=self.grandchild)
+        self.manager = User.objects.create_user(
+            username='manager', email='manager@example.com', password='pass', role='manager', department=self.root
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def ids(self, data):
+        results = data['results'] if isinstance(data, dict) else data
+        return {department['id'] for department in results}
+
+    def test_list_reaches_two_levels(self):
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response.data), {self.root.id, self.child.id, self.grandchild.id})
+
+    def test_detail_and_stats_reach_direct_children(self):
+        self.assertEqual(self.client.get(f'/api/departments/{self.child.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/departments/{self.grandchild.id}/').status_code, 404)
+
+        response = self.client.get('/api/departments/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response.data), {self.root.id, self.child.id})
@@ -2,7 +2,12 @@ from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
-from django.db.models import Q
+from datetime import timedelta
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from authentication.models import User
+from files.models import FileActivity
 from .models import Department
 from .serializers import (
     DepartmentSerializer,
@@ -12,26 +17,39 @@ from .serializers import (
 )
 
 
+def with_stats(queryset):
+    """Join the counters and sum last week's uploads from the activity rollups"""
+    last_week = timezone.localdate() - timedelta(days=6)
+    recent_files = (
+        FileActivity.objects.filter(department=OuterRef('pk'), day__gte=last_week)
+        .order_by()
+        .values('department')
+        .annotate(count=Sum('uploads'))
+        .values('count')
+    )
+    return queryset.select_related('counters').annotate(
+        recent_file_count=Coalesce(Subquery(recent_files), 0)
+    )
+
+
 class DepartmentListCreateView(generics.ListCreateAPIView):
     """List and create departments"""
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
+    def get_visible_departments(self):
         user = self.request.user
         if user.role == 'admin':
             return Department.objects.all()
         elif user.role == 'manager' and user.department:
-            # Managers can see their department and subdepartments
-            department = user.department
-            return Department.objects.filter(
-                Q(id=department.id) |
-                Q(parent=department) |
-                Q(parent__parent=department)
-            )
+            # Managers can see their department and two levels of subdepartments
+            return user.department.get_subtree(max_depth=2)
         else:
             # Regular users can only see their own department
             return Department.objects.filter(id=user.department.id) if user.department else Department.objects.none()
 
+    def get_queryset(self):
+        return self.get_visible_departments().select_related('counters', 'manager', 'parent')
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return DepartmentCreateSerializer
@@ -55,13 +73,9 @@ class DepartmentDetailView(generics.RetrieveUpdateDestroyAPIView):
         if user.role == 'admin':
             return Department.objects.all()
         elif user.role == 'manager':
-            # Managers can manage their department and subdepartments
+            # Managers can manage their department and its direct subdepartments
             if user.department:
-                department = user.department
-                return Department.objects.filter(
-                    Q(id=department.id) |
-                    Q(parent=department)
-                )
+                return user.department.get_subtree(max_depth=1)
         return Department.objects.filter(id=user.department.id) if user.department else Department.objects.none()
 
     def get_serializer_class(self):
@@ -95,29 +109,71 @@ class DepartmentDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
+def build_department_tree(departments, users):
+    """Index departments by parent and roll user counts up the tree
+
+    Returns ``(children, user_counts)`` where ``user_counts`` holds the number
+    of ``users`` in each department and all of its subdepartments.
+    """
+    children = {}
+    for department in departments:
+        children.setdefault(department.parent_id, []).append(department)
+    
+    user_counts = dict(
+        users.values('department_id')
+        .annotate(count=Count('id'))
+        .values_list('department_id', 'count')
+    )
+    
+    # Visit parents before children, then add each count to its parent in reverse
+    known_ids = {department.id for department in departments}
+    order = [department for department in departments if department.parent_id not in known_ids]
+    for department in order:
+        order.extend(children.get(department.id, []))
+    for department in reversed(order):
+        if department.parent_id in known_ids:
+            user_counts[department.parent_id] = (
+                user_counts.get(department.parent_id, 0) + user_counts.get(department.id, 0)
+            )
+    
+    return children, user_counts
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def department_tree(request):
     """Get department tree structure"""
     user = request.user
     
+    # Fetch the whole visible tree at once and build it in memory
+    users = User.objects.filter(department__isnull=False)
     if user.role == 'admin':
-        # Admin can see full tree
-        root_departments = Department.objects.filter(parent=None, is_active=True)
-    elif user.role == 'manager' and user.department:
-        # Managers see their department tree
-        root_departments = Department.objects.filter(
-            Q(id=user.department.id) |
-            Q(parent=None, id=user.department.id)
-        ).filter(is_active=True)
+        departments = list(Department.objects.select_related('manager'))
+        root_departments = [
+            department for department in departments
+            if department.parent_id is None and department.is_active
+        ]
+    elif user.department:
+        departments = list(user.department.get_subtree().select_related('manager'))
+        users = user.department.get_all_users()
+        root_departments = [
+            department for department in departments
+            if department.id == user.department_id
+        ]
+        if user.role == 'manager':
+            # Managers see their department tree
+            root_departments = [department for department in root_departments if department.is_active]
     else:
         # Regular users see only their department
-        if user.department:
-            root_departments = Department.objects.filter(id=user.department.id)
-        else:
-            root_departments = Department.objects.none()
+        departments = []
+        root_departments = []
     
-    serializer = DepartmentTreeSerializer(root_departments, many=True)
+    children, user_counts = build_department_tree(departments, users)
+    serializer = DepartmentTreeSerializer(
+        root_departments,
+        many=True,
+        context={'children': children, 'user_counts': user_counts}
+    )
     return Response(serializer.data)
 
 
@@ -129,7 +185,7 @@ def department_stats(request, pk=None):
     
     if pk:
         try:
-            department = Department.objects.get(pk=pk)
+            department = with_stats(Department.objects.all()).get(pk=pk)
             
             # Check permissions
             if user.role != 'admin' and user.department != department and department.manager != user:
@@ -151,16 +207,13 @@ def department_stats(request, pk=None):
         if user.role == 'admin':
             departments = Department.objects.filter(is_active=True)
         elif user.role == 'manager' and user.department:
-            departments = Department.objects.filter(
-                Q(id=user.department.id) |
-                Q(parent=user.department)
-            ).filter(is_active=True)
+            departments = user.department.get_subtree(max_depth=1).filter(is_active=True)
         else:
             departments = Department.objects.filter(
                 id=user.department.id
             ) if user.department else Department.objects.none()
         
-        serializer = DepartmentStatsSerializer(departments, many=True)
+        serializer = DepartmentStatsSerializer(with_stats(departments), many=True)
         return Response(serializer.data)
 
 
@@ -0,0 +1,108 @@
+"""Recording and backfilling of the FileActivity daily rollups."""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import File, FileActivity, FileVersion
+
+ACTIVITY_FIELDS = ('uploads', 'versions', 'edits', 'bytes_added')
+
+# FileVersion comments written by the OnlyOffice save path, counted as edits
+ONLYOFFICE_COMMENT = 'OnlyOffice auto-save'
+ONLYOFFICE_FORCESAVE_COMMENT = 'OnlyOffice force-save'
+ONLYOFFICE_COMMENTS = (ONLYOFFICE_COMMENT, ONLYOFFICE_FORCESAVE_COMMENT)
+
+
+def record(file_obj, day=None, **deltas):
+    """Add ``deltas`` (uploads, versions, edits, bytes_added) to today's rollup of the file"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    key = {
+        'day': day or timezone.localdate(),
+        'department_id': file_obj.department_id,
+        'file_type': file_obj.file_type,
+        'status': file_obj.status,
+    }
+    increments = {field: F(field) + value for field, value in deltas.items()}
+
+    with transaction.atomic():
+        if FileActivity.objects.filter(**key).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                FileActivity.objects.create(**key, **deltas)
+        except IntegrityError:
+            # Another request created today's row first
+            FileActivity.objects.filter(**key).update(**increments)
+
+
+def _version_size(version):
+    try:
+        return version.file_data.size
+    except (OSError, ValueError):
+        return 0
+
+
+def backfill(since=None):
+    """Rebuild the rollups from File and FileVersion history, returns the rows written
+
+    Files are bucketed by their current department, type and status, which
+    is the best the history tables can tell.
+    """
+    rows = {}
+
+    def add(day, department_id, file_type, status, **deltas):
+        row = rows.setdefault(
+            (day, department_id, file_type, status),
+            dict.fromkeys(ACTIVITY_FIELDS, 0)
+        )
+        for field, value in deltas.items():
+            row[field] += value or 0
+
+    files = File.objects.all()
+    versions = FileVersion.objects.select_related('file')
+    if since:
+        files = files.filter(created_at__date__gte=since)
+        versions = versions.filter(created_at__date__gte=since)
+
+    uploads = (
+        files.annotate(day=TruncDate('created_at'))
+        .values('day', 'department_id', 'file_type', 'status')
+        .annotate(uploads=Count('id'), bytes_added=Sum('file_size'))
+        .order_by()
+    )
+    for row in uploads:
+        add(row['day'], row['department_id'], row['file_type'], row['status'],
+            uploads=row['uploads'], bytes_added=row['bytes_added'])
+
+    version_counts = (
+        versions.annotate(day=TruncDate('created_at'))
+        .values('day', 'file__department_id', 'file__file_type', 'file__status')
+        .annotate(
+            versions=Count('id', filter=~Q(comment__in=ONLYOFFICE_COMMENTS)),
+            edits=Count('id', filter=Q(comment__in=ONLYOFFICE_COMMENTS))
+        )
+        .order_by()
+    )
+    for row in version_counts:
+        add(row['day'], row['file__department_id'], row['file__file_type'], row['file__status'],
+            versions=row['versions'], edits=row['edits'])
+
+    for version in versions.iterator(chunk_size=500):
+        add(timezone.localdate(version.created_at), version.file.department_id,
+            version.file.file_type, version.file.status, bytes_added=_version_size(version))
+
+    with transaction.atomic():
+        existing = FileActivity.objects.all()
+        if since:
+            existing = existing.filter(day__gte=since)
+        existing.delete()
+        FileActivity.objects.bulk_create([
+            FileActivity(
+                day=day, department_id=department_id, file_type=file_type, status=status, **values
+            )
+            for (day, department_id, file_type, status), values in rows.items()
+        ], batch_size=1000)
+    return len(rows)
@@ -0,0 +1,133 @@
+"""Streamed ZIP downloads of file selections and department folders.
+
+The archive is written by zipfile into a buffer that is drained after
+every chunk, so nothing but the current chunk is held in memory and no
+temp file is written. zipfile falls back to data descriptors on an
+unseekable output, which lets each entry be streamed before its CRC is
+known. Stored files are read in CHUNK_SIZE pieces.
+
+A manifest.json listing every entry with its version, size and SHA-256 is
+written as the archive's last entry.
+"""
+import hashlib
+import json
+import os
+import zipfile
+
+from django.utils import timezone
+
+from departments.models import DepartmentClosure
+from . import tiering
+
+CHUNK_SIZE = 64 * 1024
+
+MANIFEST_NAME = 'manifest.json'
+
+# Formats that are already compressed are stored as they are
+COMPRESSED_EXTENSIONS = {'.xlsx', '.docx', '.pptx', '.pdf', '.zip'}
+
+
+class _Drain:
+    """Write-only, unseekable sink whose contents are taken after every write"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def folder_paths(department):
+    """Map every department in the subtree to its folder path, starting at ``department``"""
+    subtree = DepartmentClosure.objects.filter(ancestor=department).values('descendant_id')
+    names = {}
+    for department_id, name in DepartmentClosure.objects.filter(
+        descendant_id__in=subtree, ancestor_id__in=subtree
+    ).order_by('descendant_id', '-depth').values_list('descendant_id', 'ancestor__name'):
+        names.setdefault(department_id, []).append(_safe(name))
+    return {department_id: '/'.join(path) for department_id, path in names.items()}
+
+
+def _safe(name):
+    """A path component that cannot climb out of its folder"""
+    name = name.replace('/', '_').replace('\\', '_').strip()
+    return name if name not in ('', '.', '..') else '_'
+
+
+class _Names:
+    """Unique archive names, numbering repeats like 'report (2).xlsx'"""
+
+    def __init__(self):
+        self.used = {MANIFEST_NAME}
+
+    def claim(self, path):
+        stem, ext = os.path.splitext(path)
+        candidate, number = path, 1
+        while candidate.lower() in self.used:
+            number += 1
+            candidate = f'{stem} ({number}){ext}'
+        self.used.add(candidate.lower())
+        return candidate
+
+
+def _entry_info(arcname, file_obj):
+    info = zipfile.ZipInfo(arcname, date_time=timezone.localtime(file_obj.updated_at).timetuple()[:6])
+    ext = os.path.splitext(file_obj.file.name)[1].lower()
+    info.compress_type = zipfile.ZIP_STORED if ext in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_archive(files, folders=None, skipped=()):
+    """Yield a ZIP of ``files`` chunk by chunk
+
+    ``folders`` maps department ids to folder paths, files are placed at the
+    top level without it. ``skipped`` lists requested ids left out of the
+    archive, they are recorded in the manifest.
+    """
+    sink = _Drain()
+    names = _Names()
+    manifest = {'created_at': timezone.now().isoformat(), 'files': [], 'skipped': list(skipped)}
+
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for file_obj in files:
+            entry = {'id': file_obj.id, 'name': file_obj.name, 'version': file_obj.version}
+            manifest['files'].append(entry)
+            if not file_obj.file:
+                entry['error'] = 'File has no stored content.'
+                continue
+
+            folder = (folders or {}).get(file_obj.department_id, '')
+            filename = _safe(file_obj.name) + os.path.splitext(file_obj.file.name)[1].lower()
+            try:
+                # Cold content is streamed out of its pack without moving it
+                source = tiering.open_content(file_obj)
+            except FileNotFoundError:
+                entry['error'] = 'Stored content is missing.'
+                continue
+
+            arcname = names.claim(f'{folder}/{filename}' if folder else filename)
+            digest, size = hashlib.sha256(), 0
+            with source, archive.open(_entry_info(arcname, file_obj), 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if sink.parts:
+                        yield sink.take()
+            entry.update(path=arcname, size=size, sha256=digest.hexdigest())
+            if file_obj.content_hash and file_obj.content_hash != entry['sha256']:
+                entry['error'] = 'Stored content does not match its recorded hash.'
+            yield sink.take()
+
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False))
+    yield sink.take()
@@ -0,0 +1,270 @@
+"""Background processing of OnlyOffice Document Server callbacks.
+
+The callback view only records a job and answers the Document Server, the
+download (files/documentserver.py), new version and sheet analysis run in
+the run_onlyoffice_workers pool. Jobs are claimed with a conditional
+UPDATE, so any number of worker threads and processes can share the
+table, and a claim is a lease: a job
+whose worker died is picked up again once ``run_after`` passes. Failed jobs
+are retried with exponential backoff up to ONLYOFFICE_CALLBACK_MAX_ATTEMPTS.
+
+Every received callback is recorded as an OnlyOfficeCallbackReceipt by
+(document key, payload hash), so a resent one is never processed again.
+Force-saves within ONLYOFFICE_FORCESAVE_WINDOW are committed as one
+version, and a download identical to the current content creates no
+version. Jobs are applied in the order they were recorded: a final save
+supersedes every unfinished force-save, and a job that finishes after a
+later one was applied (``File.last_callback_job_id``) is skipped.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import activity, documentkeys, documentserver, workbooks
+from .models import File, OnlyOfficeCallbackJob, OnlyOfficeCallbackReceipt
+
+logger = logging.getLogger(__name__)
+
+# Callback statuses that carry a document to save
+SAVE_STATUS = 2
+FORCESAVE_STATUS = 6
+
+# A claimed job is handed to another worker if not finished within this
+LEASE = timedelta(minutes=10)
+
+
+def payload_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def enqueue(file_obj, payload, user=None):
+    """Record a callback for the workers, returns its job or None if there is nothing to do
+
+    A resent callback returns the job already recorded for it. Force-saves
+    wait ONLYOFFICE_FORCESAVE_WINDOW, and later ones arriving meanwhile only
+    replace the document the waiting job will save.
+    """
+    status_code = payload.get('status')
+    if status_code not in (SAVE_STATUS, FORCESAVE_STATUS) or not payload.get('url'):
+        return None
+    values = {
+        'file': file_obj,
+        'user': user if user is not None and user.is_authenticated else None,
+        'document_key': str(payload.get('key', ''))[:255],
+        'callback_status': status_code,
+        'payload': payload,
+        'payload_hash': payload_hash(payload),
+    }
+    receipt = {'document_key': values['document_key'], 'payload_hash': values['payload_hash']}
+    seen = OnlyOfficeCallbackReceipt.objects.select_related('job').filter(**receipt).first()
+    if seen is not None:
+        return _resent(seen.job)
+
+    try:
+        with transaction.atomic():
+            job = _record(file_obj, values)
+            OnlyOfficeCallbackReceipt.objects.create(job=job, **receipt)
+            return job
+    except IntegrityError:
+        # Recorded by a concurrent delivery of the same callback
+        return _resent(OnlyOfficeCallbackReceipt.objects.select_related('job').get(**receipt).job)
+
+
+def _newer(payload, than):
+    """Whether ``payload`` was saved after ``than``, by their lastsave times if both have one"""
+    saved, other = payload.get('lastsave'), than.get('lastsave')
+    return not (saved and other) or str(saved) >= str(other)
+
+
+def _record(file_obj, values):
+    """The job that handles a callback not received before, creating it if needed"""
+    force_saves = OnlyOfficeCallbackJob.objects.filter(file=file_obj, callback_status=FORCESAVE_STATUS)
+    if values['callback_status'] == SAVE_STATUS:
+        # The final save includes everything force-saved before it, whether
+        # still waiting, being downloaded or retried after a failure
+        force_saves.filter(state__in=['pending', 'running', 'failed']).update(
+            state='skipped', updated_at=timezone.now()
+        )
+        return OnlyOfficeCallbackJob.objects.create(**values)
+
+    waiting = force_saves.filter(state='pending', attempts=0)
+
+    job = waiting.order_by('run_after').first()
+    if job is not None:
+        if not _newer(values['payload'], job.payload):
+            # Delivered late, the waiting job already saves a later document
+            return job
+        if waiting.filter(id=job.id).update(payload=values['payload'], updated_at=timezone.now()):
+            return job
+    return OnlyOfficeCallbackJob.objects.create(
+        run_after=timezone.now() + timedelta(seconds=settings.ONLYOFFICE_FORCESAVE_WINDOW), **values
+    )
+
+
+def _resent(job):
+    """A callback delivered again, a job that gave up gets another round of attempts
+
+    Unless a later callback for the file was recorded since, which saves a
+    newer document.
+    """
+    if job.state == 'failed' and not OnlyOfficeCallbackJob.objects.filter(
+        file_id=job.file_id, id__gt=job.id
+    ).exists():
+        OnlyOfficeCallbackJob.objects.filter(id=job.id, state='failed').update(
+            state='pending', attempts=0, run_after=timezone.now(), updated_at=timezone.now()
+        )
+    return job
+
+
+def claim():
+    """Take the next due job, or None when there is none"""
+    now = timezone.now()
+    due = OnlyOfficeCallbackJob.objects.filter(state__in=['pending', 'running'], run_after__lte=now)
+    for job_id in due.order_by('run_after').values_list('id', flat=True)[:10]:
+        claimed = OnlyOfficeCallbackJob.objects.filter(
+            id=job_id, state__in=['pending', 'running'], run_after__lte=now
+        ).update(state='running', run_after=now + LEASE, attempts=F('attempts') + 1)
+        if claimed:
+            return OnlyOfficeCallbackJob.objects.select_related('file', 'user').get(id=job_id)
+    return None
+
+
+def _author(job):
+    """Who the new version is recorded for: the caller, else the first editor, else the owner"""
+    if job.user is not None:
+        return job.user
+    user_ids = [user_id for user_id in job.payload.get('users', []) if str(user_id).isdigit()]
+    if user_ids:
+        user = get_user_model().objects.filter(id__in=user_ids).first()
+        if user is not None:
+            return user
+    return job.file.uploaded_by
+
+
+def save_document(job):
+    """Download the edited document and commit it as the file's new version
+
+    Returns False when the document is identical to the current version, or
+    when a job recorded after this one has been applied already.
+    """
+    name = os.path.basename(job.file.file.name) if job.file.file else job.file.name
+    download = documentserver.download(job.payload['url'], name)
+    OnlyOfficeCallbackJob.objects.filter(id=job.id).update(
+        download_bytes=download.size,
+        first_byte_seconds=download.first_byte_seconds,
+        download_seconds=download.seconds
+    )
+    logger.info(
+        'Downloaded %s bytes for file %s in %.3fs (%.0f bytes/s)',
+        download.size, job.file_id, download.seconds, download.throughput
+    )
+
+    upload = download.upload
+    try:
+        with transaction.atomic():
+            file_obj = File.objects.select_for_update().select_related('blob').get(id=job.file_id)
+            if file_obj.last_callback_job_id and file_obj.last_callback_job_id > job.id:
+                # Finished late, the file already holds a later document
+                return False
+            current_hash = file_obj.blob.sha256 if file_obj.blob_id else file_obj.content_hash
+            if job.callback_status == FORCESAVE_STATUS:
+                # Editing goes on, so the session keeps the key it was opened with
+                forcesave_key, forcesave_hash = documentkeys.document_key(file_obj), download.sha256
+            else:
+                forcesave_key = forcesave_hash = ''
+            if download.sha256 == current_hash:
+                values = {'last_callback_job_id': job.id}
+                if not forcesave_key and file_obj.forcesave_key:
+                    values.update(forcesave_key='', forcesave_hash='')
+                File.objects.filter(id=file_obj.id).update(**values)
+                return False
+
+            # Stored once in the blob store, by renaming the temporary file into place
+            file_obj.file = upload
+            file_obj.version += 1
+            file_obj.forcesave_key, file_obj.forcesave_hash = forcesave_key, forcesave_hash
+            file_obj.last_callback_job_id = job.id
+
+            # If it's an Excel file, read the sheet information straight from the download
+            if file_obj.file_type == 'excel':
+                try:
+                    info = workbooks.sheet_info(upload.temporary_file_path(), content_hash=upload.sha256)
+                    workbooks.apply(file_obj, info, track_active=True)
+                except workbooks.WorkbookError as e:
+                    logger.warning('Error analyzing Excel sheets of file %s on callback: %s', file_obj.id, e)
+
+            file_obj.save()
+            if job.callback_status == FORCESAVE_STATUS:
+                comment = activity.ONLYOFFICE_FORCESAVE_COMMENT
+            else:
+                comment = activity.ONLYOFFICE_COMMENT
+            file_obj.create_version(_author(job), comment=comment)
+            activity.record(file_obj, edits=1, bytes_added=download.size)
+    finally:
+        upload.close()
+    return True
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after ``attempts`` failed ones"""
+    delay = settings.ONLYOFFICE_CALLBACK_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.ONLYOFFICE_CALLBACK_MAX_RETRY_DELAY))
+
+
+def run(job):
+    """Process a claimed job and record the outcome"""
+    try:
+        saved = save_document(job)
+    except Exception as e:
+        logger.warning('OnlyOffice callback job %s failed (attempt %s): %s', job.id, job.attempts, e)
+        if job.attempts >= settings.ONLYOFFICE_CALLBACK_MAX_ATTEMPTS:
+            values = {'state': 'failed'}
+        else:
+            values = {'state': 'pending', 'run_after': timezone.now() + retry_delay(job.attempts)}
+        # A job superseded while it ran stays skipped
+        OnlyOfficeCallbackJob.objects.filter(id=job.id, state='running').update(
+            last_error=str(e), updated_at=timezone.now(), **values
+        )
+        return False
+    OnlyOfficeCallbackJob.objects.filter(id=job.id).update(
+        state='done' if saved else 'skipped', last_error='', updated_at=timezone.now()
+    )
+    return True
+
+
+def work(stop, poll_interval=1, drain=False):
+    """Process jobs until ``stop`` is set, or until none is due when ``drain``"""
+    try:
+        while not stop.is_set():
+            job = claim()
+            if job is None:
+                if drain:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run(job)
+    finally:
+        connection.close()
+
+
+def start_workers(concurrency, poll_interval=1, drain=False):
+    """Start ``concurrency`` worker threads, returns (stop event, threads)"""
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=work, args=(stop, poll_interval, drain), name=f'onlyoffice-worker-{number}', daemon=True
+        )
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop, threads
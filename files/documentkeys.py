@@ -0,0 +1,96 @@
+"""OnlyOffice document keys.
+
+The Document Server caches conversions and joins editors into one
+co-editing session by document key, so the key of a file is derived from
+(file id, version, content hash) instead of being random per open. Every
+editor of a version gets the same key, and it changes only when a saved
+edit or upload commits a new version or new content. Force-saves commit
+versions while the editing session goes on, so the session's key is kept
+on the file (``forcesave_key``) until the final save or other new content.
+The HMAC keeps keys unguessable from a file's id and version.
+
+Each open is counted per day in DocumentKeyUse, together with whether the
+key had already been handed out, which is when the Document Server can
+serve it from its cache.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .extraction import hash_file
+from .models import DocumentKeyUse, File, OnlyOfficeSession
+
+KEY_SALT = 'files.documentkeys'
+
+
+def content_hash(file_obj):
+    """The SHA-256 of a file's current content, hashing and saving it if still unknown"""
+    if file_obj.blob_id:
+        return file_obj.blob.sha256
+    if not file_obj.content_hash and file_obj.file:
+        file_obj.content_hash = hash_file(file_obj.file)
+        # update() keeps the save signals out of it
+        File.objects.filter(id=file_obj.id).update(content_hash=file_obj.content_hash)
+    return file_obj.content_hash
+
+
+def document_key(file_obj):
+    """Stable Document Server key of a file's current version"""
+    if file_obj.forcesave_key and file_obj.forcesave_hash == content_hash(file_obj):
+        return file_obj.forcesave_key
+    digest = salted_hmac(
+        KEY_SALT, f'{file_obj.id}:{file_obj.version}:{content_hash(file_obj)}', algorithm='sha256'
+    ).hexdigest()
+    # Keys are limited to 128 characters of [0-9a-zA-Z.=_-]
+    return f'{file_obj.id}-{file_obj.version}-{digest[:32]}'
+
+
+def record_open(reused, day=None):
+    """Count one editor open in today's key use, ``reused`` if the key was handed out before"""
+    key = {'day': day or timezone.localdate()}
+    values = {'opens': F('opens') + 1, 'reused': F('reused') + int(reused)}
+    with transaction.atomic():
+        if DocumentKeyUse.objects.filter(**key).update(**values):
+            return
+        try:
+            with transaction.atomic():
+                DocumentKeyUse.objects.create(**key, opens=1, reused=int(reused))
+        except IntegrityError:
+            DocumentKeyUse.objects.filter(**key).update(**values)
+
+
+def open_session(file_obj, user, session_key, is_editor):
+    """Point the user's editing session at the file's current key, returns the key"""
+    key = document_key(file_obj)
+    reused = OnlyOfficeSession.objects.filter(document_key=key).exists()
+    OnlyOfficeSession.objects.update_or_create(
+        file=file_obj,
+        user=user,
+        defaults={
+            'session_key': session_key,
+            'document_key': key,
+            'is_editor': is_editor,
+            'is_active': True
+        }
+    )
+    record_open(reused)
+    return key
+
+
+def report(since=None):
+    """Editor opens and key reuse per day and in total"""
+    uses = DocumentKeyUse.objects.order_by('day')
+    if since:
+        uses = uses.filter(day__gte=since)
+    totals = uses.aggregate(opens=Sum('opens'), reused=Sum('reused'))
+    opens, reused = totals['opens'] or 0, totals['reused'] or 0
+    return {
+        'days': [
+            {'day': use.day, 'opens': use.opens, 'reused': use.reused, 'hit_ratio': use.reused / use.opens}
+            for use in uses if use.opens
+        ],
+        'opens': opens,
+        'reused': reused,
+        'hit_ratio': reused / opens if opens else 0,
+    }
@@ -0,0 +1,112 @@
+"""HTTP client for the OnlyOffice Document Server.
+
+Edited documents are fetched over a keep-alive connection pool, one
+``requests.Session`` per worker thread, with connect and read timeouts. The
+body is streamed in chunks to a temporary file on the media volume and
+hashed as it is written, so storing it in the blob store is a rename, and
+a download is abandoned as soon as it passes the size limit.
+"""
+import hashlib
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Sum
+from requests.adapters import HTTPAdapter
+
+from .models import OnlyOfficeCallbackJob
+from .uploadhandlers import HashedTemporaryUploadedFile
+
+CHUNK_SIZE = 256 * 1024
+
+_local = threading.local()
+
+
+class DownloadError(Exception):
+    pass
+
+
+class Download:
+    """A fetched document and how long it took"""
+
+    def __init__(self, upload, first_byte_seconds, seconds):
+        self.upload = upload
+        self.size = upload.size
+        self.sha256 = upload.sha256
+        self.first_byte_seconds = first_byte_seconds
+        self.seconds = seconds
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        return self.size / self.seconds if self.seconds else 0
+
+
+def session():
+    """This thread's pooled session"""
+    current = getattr(_local, 'session', None)
+    if current is None:
+        current = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.ONLYOFFICE_DOWNLOAD_POOL_SIZE)
+        current.mount('http://', adapter)
+        current.mount('https://', adapter)
+        _local.session = current
+    return current
+
+
+def download(url, name, max_size=None):
+    """Stream ``url`` into a hashed temporary upload named ``name``, returns a Download"""
+    max_size = max_size or settings.ONLYOFFICE_DOWNLOAD_MAX_SIZE
+    timeout = (settings.ONLYOFFICE_DOWNLOAD_CONNECT_TIMEOUT, settings.ONLYOFFICE_DOWNLOAD_READ_TIMEOUT)
+    started = time.monotonic()
+    upload = HashedTemporaryUploadedFile(name, None, 0, None)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with session().get(url, stream=True, timeout=timeout) as response:
+            first_byte_seconds = time.monotonic() - started
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_size:
+                raise DownloadError(f'Document is larger than {max_size} bytes')
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise DownloadError(f'Document is larger than {max_size} bytes')
+                upload.write(chunk)
+                digest.update(chunk)
+    except requests.RequestException as e:
+        upload.close()
+        raise DownloadError(str(e))
+    except BaseException:
+        upload.close()
+        raise
+    upload.flush()
+    upload.seek(0)
+    upload.size = size
+    upload.sha256 = digest.hexdigest()
+    return Download(upload, first_byte_seconds, time.monotonic() - started)
+
+
+def report(since=None):
+    """Count, bytes, latency and throughput of the document downloads made by the workers"""
+    jobs = OnlyOfficeCallbackJob.objects.filter(download_seconds__isnull=False)
+    if since:
+        jobs = jobs.filter(created_at__gte=since)
+    totals = jobs.aggregate(
+        downloads=Count('id'),
+        bytes=Sum('download_bytes'),
+        seconds=Sum('download_seconds'),
+        average_first_byte=Avg('first_byte_seconds'),
+        slowest=Max('download_seconds'),
+    )
+    seconds = totals['seconds'] or 0
+    return {
+        'downloads': totals['downloads'],
+        'bytes': totals['bytes'] or 0,
+        'average_first_byte_seconds': totals['average_first_byte'] or 0,
+        'average_seconds': seconds / totals['downloads'] if totals['downloads'] else 0,
+        'slowest_seconds': totals['slowest'] or 0,
+        'throughput': (totals['bytes'] or 0) / seconds if seconds else 0,
+    }
@@ -0,0 +1,243 @@
+"""Permission-checked serving of stored file content.
+
+Responses carry a strong ETag built from the content hash and version, so
+clients revalidate with If-None-Match and get a 304 for unchanged files.
+Single byte ranges are answered with 206 Partial Content; the file is
+positioned at the range start and handed to FileResponse, which the WSGI
+server's file wrapper sends with sendfile() limited to Content-Length.
+
+With FILES_SERVE_MODE set to 'nginx' or 'sendfile' the bytes are left to
+the front proxy instead, through X-Accel-Redirect or X-Sendfile, and the
+proxy answers ranges itself.
+
+Cold content is moved back to the hot tier before it is served, and the
+time that takes is recorded per tier.
+
+Signed URLs carry the stored path, download name, ETag and expiry of a
+file in an HMAC-signed token, so they are checked without a database hit.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from . import tiering
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Files are permission checked, caches must revalidate every time
+CACHE_CONTROL = 'private, no-cache'
+
+SIGNING_SALT = 'files.downloads'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def file_etag(file_obj):
+    """Strong ETag of a file's current content"""
+    content_hash = file_obj.content_hash or hashlib.sha256(
+        f'{file_obj.file.name}:{file_obj.file_size}'.encode()
+    ).hexdigest()
+    return f'"{content_hash}-{file_obj.version}"'
+
+
+def download_name(file_obj):
+    """The file's name with the extension of its stored content"""
+    return file_obj.name + os.path.splitext(file_obj.file.name)[1].lower()
+
+
+def parse_range(header, size):
+    """(start, end) of a single byte range, end inclusive
+
+    Returns None when there is no usable range, so the whole file is sent,
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed headers and multiple ranges get the whole file
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Only strong validators may match
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and last_modified is not None and int(last_modified) <= date
+
+
+def _with_headers(response, headers):
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+class FileRange:
+    """``length`` bytes of an open file from ``start``, for FileResponse
+
+    fileno() is kept so the file wrapper can still sendfile() from the
+    current offset, bounded by the response's Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def signed_token(file_obj, max_age=None):
+    """HMAC-signed token granting a download of the file's current content"""
+    max_age = max_age or settings.FILES_SIGNED_URL_TTL
+    return signing.dumps({
+        'p': file_obj.file.name,
+        'n': download_name(file_obj),
+        'e': file_etag(file_obj),
+        'x': int(time.time() + max_age),
+    }, salt=SIGNING_SALT, compress=True)
+
+
+def signed_url(file_obj, request=None, max_age=None):
+    """Short-lived URL that downloads the file without authentication"""
+    # Signed downloads never hit the database, so cold content is brought back now
+    tiering.ensure_hot(file_obj)
+    url = reverse('files:signed_download', args=[signed_token(file_obj, max_age)])
+    return request.build_absolute_uri(url) if request else url
+
+
+def unsign(token):
+    """The (path, name, etag) a token grants, raises InvalidToken if forged or expired"""
+    try:
+        payload = signing.loads(token, salt=SIGNING_SALT)
+    except signing.BadSignature:
+        raise InvalidToken('Invalid download link.')
+    if payload['x'] < time.time():
+        raise InvalidToken('Download link has expired.')
+    return payload['p'], payload['n'], payload['e']
+
+
+def _offloaded(path, filename, mode):
+    """Empty response telling the front proxy which file to send"""
+    locate = getattr(default_storage, 'locate', None)
+    if locate:
+        # Signed URLs may name a path the rebalancer has moved since
+        path = locate(path)
+    response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if mode == 'nginx':
+        # nginx maps the internal location onto MEDIA_ROOT, and volumes/<name>/ onto each volume
+        response['X-Accel-Redirect'] = settings.FILES_ACCEL_REDIRECT_PREFIX + quote(path)
+    else:
+        response['X-Sendfile'] = default_storage.path(path)
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
+
+
+def serve_path(request, path, filename, etag, last_modified=None, prepare=None):
+    """Respond with stored content, honouring conditional and range headers
+
+    ``prepare`` is called once no conditional response applies, before the
+    content is opened. Returns None when the stored content is missing.
+    """
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': CACHE_CONTROL,
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified) if last_modified is not None else None
+    )
+    if conditional is not None:
+        return _with_headers(conditional, headers)
+
+    if prepare is not None:
+        prepare()
+
+    mode = settings.FILES_SERVE_MODE
+    if mode in ('nginx', 'sendfile'):
+        return _with_headers(_offloaded(path, filename, mode), headers)
+
+    try:
+        stored = default_storage.open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    size = stored.size
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            stored.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return _with_headers(response, headers)
+
+    if byte_range is None:
+        response = FileResponse(stored, filename=filename)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(stored, start, end - start + 1), status=206, filename=filename)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _with_headers(response, headers)
+
+
+def serve(request, file_obj):
+    """Respond with a file's current content, bringing it back from the cold tier first"""
+    opened = {}
+
+    def prepare():
+        started = time.monotonic()
+        opened['tier'] = tiering.ensure_hot(file_obj)
+        opened['started'] = started
+
+    response = serve_path(
+        request, file_obj.file.name, download_name(file_obj), file_etag(file_obj),
+        file_obj.updated_at.timestamp(), prepare=prepare
+    )
+    if response is not None and opened:
+        tiering.record_access(opened['tier'], time.monotonic() - opened['started'])
+    return response
@@ -0,0 +1,255 @@
+"""Text extraction from stored documents.
+
+Each stored file or version is hashed once (streamed uploads arrive
+hashed by the upload handler) and its text is extracted once per
+distinct hash into FileContent, which feeds the content search index. The
+extractors stream: text files are decoded chunk by chunk, and OOXML parts
+are read with iterparse straight out of the zip. A document's full text is
+never held in memory beyond MAX_TEXT_LENGTH.
+"""
+import codecs
+import hashlib
+import logging
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from . import tiering
+from .models import File, FileContent, FileVersion
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Longer documents are indexed up to this many characters
+MAX_TEXT_LENGTH = 500_000
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def _local(tag):
+    return tag.rpartition('}')[2]
+
+
+def _seekable(fileobj):
+    """Zip readers need to seek, spool non-seekable storage streams to disk first"""
+    if fileobj.seekable():
+        return fileobj
+    spooled = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _plain_text(fileobj):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def _xml_members(archive, prefix):
+    return sorted(name for name in archive.namelist() if name.startswith(prefix) and name.endswith('.xml'))
+
+
+def _xlsx(fileobj):
+    with zipfile.ZipFile(_seekable(fileobj)) as archive:
+        if 'xl/workbook.xml' in archive.namelist():
+            with archive.open('xl/workbook.xml') as stream:
+                for _, element in iterparse(stream):
+                    if _local(element.tag) == 'sheet':
+                        yield element.get('name', '') + '\n'
+
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as stream:
+                for _, element in iterparse(stream):
+                    tag = _local(element.tag)
+                    if tag == 't' and element.text:
+                        yield element.text
+                    elif tag == 'si':
+                        yield '\n'
+                        element.clear()
+
+        # Numbers, formula results and inline strings live in the sheets,
+        # shared string cells only hold an index into the table above
+        for name in _xml_members(archive, 'xl/worksheets/'):
+            with archive.open(name) as stream:
+                for _, element in iterparse(stream):
+                    tag = _local(element.tag)
+                    if tag == 'c':
+                        cell_type = element.get('t')
+                        if cell_type == 'inlineStr':
+                            yield ''.join(
+                                node.text or '' for node in element.iter() if _local(node.tag) == 't'
+                            ) + ' '
+                        elif cell_type != 's':
+                            for node in element:
+                                if _local(node.tag) == 'v' and node.text:
+                                    yield node.text + ' '
+                    elif tag == 'row':
+                        yield '\n'
+                        element.clear()
+
+
+def _docx(fileobj):
+    with zipfile.ZipFile(_seekable(fileobj)) as archive:
+        members = ['word/document.xml'] + [
+            name for name in _xml_members(archive, 'word/')
+            if name.startswith(('word/header', 'word/footer'))
+        ]
+        for name in members:
+            if name not in archive.namelist():
+                continue
+            with archive.open(name) as stream:
+                for _, element in iterparse(stream):
+                    tag = _local(element.tag)
+                    if tag == 't' and element.text:
+                        yield element.text
+                    elif tag == 'tab':
+                        yield ' '
+                    elif tag == 'p':
+                        yield '\n'
+                        element.clear()
+
+
+def _pdf(fileobj):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError('pypdf is not installed')
+    reader = PdfReader(_seekable(fileobj))
+    for page in reader.pages:
+        yield (page.extract_text() or '') + '\n'
+
+
+EXTRACTORS = {
+    'txt': _plain_text,
+    'csv': _plain_text,
+    'xlsx': _xlsx,
+    'docx': _docx,
+    'pdf': _pdf,
+}
+
+
+def hash_file(field_file, blob=None):
+    """SHA-256 of a stored file, read in chunks from whichever tier ``blob`` is on"""
+    digest = hashlib.sha256()
+    with tiering.open_stored(field_file.name, blob) as fileobj:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_text(field_file, blob=None):
+    """Extract up to MAX_TEXT_LENGTH characters, returns (text, truncated)
+
+    Cold content is streamed out of its pack. Returns None for formats
+    without an extractor.
+    """
+    extractor = EXTRACTORS.get(field_file.name.rsplit('.', 1)[-1].lower())
+    if extractor is None:
+        return None
+
+    parts, length = [], 0
+    with tiering.open_stored(field_file.name, blob) as fileobj:
+        chunks = extractor(fileobj)
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                length += len(chunk)
+                if length >= MAX_TEXT_LENGTH:
+                    return ''.join(parts)[:MAX_TEXT_LENGTH], True
+        except (zipfile.BadZipFile, SyntaxError) as e:
+            # iterparse raises ParseError, a SyntaxError subclass
+            raise ExtractionError(str(e))
+        finally:
+            chunks.close()
+    return ''.join(parts), False
+
+
+def index_content(content_hash, field_file, blob=None):
+    """Extract the text of a stored file unless its hash is already indexed"""
+    if FileContent.objects.filter(content_hash=content_hash).exists():
+        return False
+
+    values = {}
+    try:
+        extracted = extract_text(field_file, blob)
+        if extracted is None:
+            values['status'] = 'unsupported'
+        else:
+            values['text'], values['truncated'] = extracted
+    except Exception as e:
+        logger.warning('Text extraction failed for %s: %s', field_file.name, e)
+        values.update(status='failed', error=str(e))
+
+    try:
+        with transaction.atomic():
+            FileContent.objects.create(content_hash=content_hash, **values)
+    except IntegrityError:
+        # Another worker indexed the same content first
+        return False
+    return True
+
+
+def process_file(file_id):
+    """Hash a file's current content and index its text"""
+    file_obj = File.objects.select_related('blob__pack').filter(id=file_id).first()
+    if file_obj is None or not file_obj.file:
+        return
+    content_hash = file_obj.content_hash or hash_file(file_obj.file, file_obj.blob)
+    if content_hash != file_obj.content_hash:
+        # update() keeps the save signals out of it
+        File.objects.filter(id=file_id).update(content_hash=content_hash)
+    index_content(content_hash, file_obj.file, file_obj.blob)
+
+
+def process_version(version_id):
+    """Hash a stored version and index its text"""
+    version = FileVersion.objects.select_related('blob__pack').filter(id=version_id).first()
+    if version is None or not version.file_data:
+        return
+    content_hash = version.content_hash or hash_file(version.file_data, version.blob)
+    if content_hash != version.content_hash:
+        FileVersion.objects.filter(id=version_id).update(content_hash=content_hash)
+    index_content(content_hash, version.file_data, version.blob)
+
+
+_executor = None
+
+
+def _run(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Background text extraction failed')
+    finally:
+        connection.close()
+
+
+def _submit(task, *args):
+    global _executor
+    workers = getattr(settings, 'FILE_EXTRACTION_WORKERS', 0)
+    if workers <= 0:
+        task(*args)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-extraction')
+    _executor.submit(_run, task, *args)
+
+
+def schedule_file(file_id):
+    """Process a file once the current transaction commits"""
+    transaction.on_commit(lambda: _submit(process_file, file_id))
+
+
+def schedule_version(version_id):
+    """Process a version once the current transaction commits"""
+    transaction.on_commit(lambda: _submit(process_version, version_id))
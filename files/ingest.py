@@ -0,0 +1,210 @@
+"""Bulk ingest of many files in one request.
+
+Entries are either the files of a multipart request, which the upload
+handler has already streamed to disk and hashed, or the members of one ZIP
+archive. Archive members are checked, unpacked into FILES_UPLOAD_TEMP_DIR
+and hashed in a thread pool; zlib and hashlib release the GIL, so this
+scales with cores. Prepared entries are stored in the blob store and
+inserted with bulk_create a batch at a time. Only a bounded window of
+entries is in flight, so memory use does not grow with the entry count.
+
+bulk_create skips File.save() and the post_save receivers, so every batch
+applies their effects itself: blob references, visibility and search
+entries, department counters, activity rollups and text extraction.
+"""
+import hashlib
+import mimetypes
+import os
+import zipfile
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from departments import counters
+from . import activity, extraction, search, visibility
+from .models import Blob, File
+from .uploadhandlers import HashedTemporaryUploadedFile, extension_error, size_error
+
+BATCH_SIZE = 100
+
+READ_SIZE = 256 * 1024
+
+
+class IngestError(Exception):
+    pass
+
+
+def _bounded(executor, tasks, window):
+    """Run ``tasks`` on ``executor`` with at most ``window`` pending, yielding results in order"""
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _skipped(info):
+    """Directories and the metadata files archivers add along the way"""
+    base = os.path.basename(info.filename.rstrip('/'))
+    return info.is_dir() or info.filename.startswith('__MACOSX/') or base.startswith('.')
+
+
+def archive_members(archive):
+    """The members of an open ZipFile worth ingesting, checked against the bulk limits"""
+    members = [info for info in archive.infolist() if not _skipped(info)]
+    if len(members) > settings.FILES_BULK_MAX_ENTRIES:
+        raise IngestError(f'Archives may contain at most {settings.FILES_BULK_MAX_ENTRIES} files.')
+    # ZipExtFile never returns more than the declared size, so declared sizes are safe to trust
+    if sum(info.file_size for info in members) > settings.FILES_BULK_MAX_UNPACKED_SIZE:
+        raise IngestError(
+            f'Archive unpacks to more than {settings.FILES_BULK_MAX_UNPACKED_SIZE / (1024 * 1024):g}MB.'
+        )
+    return members
+
+
+def _member_error(name, info):
+    error = extension_error(name) or size_error(info.file_size)
+    if error:
+        return error
+    if info.flag_bits & 0x1:
+        return 'Encrypted archive entries are not supported.'
+    ratio = settings.FILES_BULK_MAX_COMPRESSION_RATIO
+    if info.file_size > info.compress_size * ratio and info.file_size > READ_SIZE:
+        return f'Entry is compressed more than {ratio}:1.'
+    return None
+
+
+def unpack_member(archive, info):
+    """Unpack one archive member to a hashed temporary upload, returns (name, upload, error)"""
+    # Only the base name is kept, entry paths never reach the storage
+    name = os.path.basename(info.filename)
+    error = _member_error(name, info)
+    if error:
+        return name, None, error
+
+    upload = HashedTemporaryUploadedFile(name, mimetypes.guess_type(name)[0], 0, None)
+    digest = hashlib.sha256()
+    try:
+        with archive.open(info) as stream:
+            for chunk in iter(lambda: stream.read(READ_SIZE), b''):
+                upload.write(chunk)
+                digest.update(chunk)
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        upload.close()
+        return name, None, f'Corrupt archive entry: {e}'
+    upload.flush()
+    upload.seek(0)
+    upload.size = info.file_size
+    upload.sha256 = digest.hexdigest()
+    return name, upload, None
+
+
+class BulkIngest:
+    """Create File rows for a stream of prepared uploads, a batch at a time
+
+    ``results`` holds one {'name', 'status', 'id' | 'error'} dict per entry,
+    in the order the entries were given.
+    """
+
+    def __init__(self, user, department=None, status='draft', description=''):
+        self.user = user
+        self.department = department
+        self.status = status
+        self.description = description
+        self.results = []
+        self.batch = []
+
+    @property
+    def created(self):
+        return sum(1 for result in self.results if result['status'] == 'created')
+
+    def reject(self, name, error):
+        self.results.append({'name': name, 'status': 'rejected', 'error': error})
+
+    def add(self, name, upload):
+        """Store one upload's content and queue its File row"""
+        try:
+            blob = Blob.objects.store(upload, name)
+        finally:
+            upload.close()
+        self.batch.append(File(
+            name=os.path.splitext(name)[0][:255] or name[:255],
+            description=self.description,
+            file=blob.path,
+            blob=blob,
+            content_hash=blob.sha256,
+            file_size=blob.size,
+            file_type=File.type_for(name),
+            status=self.status,
+            uploaded_by=self.user,
+            department=self.department
+        ))
+        self.results.append({'name': name, 'status': 'created', 'id': None})
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued files and do what their post_save receivers would have"""
+        if not self.batch:
+            return
+        with transaction.atomic():
+            files = File.objects.bulk_create(self.batch)
+            file_ids = [file_obj.id for file_obj in files]
+
+            for blob_id, count in Counter(file_obj.blob_id for file_obj in files).items():
+                Blob.objects.acquire(blob_id, count)
+            visibility.refresh_files(file_ids)
+            search.index_files(file_ids)
+            counters.files_added(
+                self.department.id if self.department else None,
+                len(files),
+                sum(file_obj.file_size for file_obj in files),
+                files[-1].created_at
+            )
+            by_type = {}
+            for file_obj in files:
+                by_type.setdefault(file_obj.file_type, []).append(file_obj)
+            for same_type in by_type.values():
+                activity.record(
+                    same_type[0],
+                    uploads=len(same_type),
+                    bytes_added=sum(file_obj.file_size for file_obj in same_type)
+                )
+            for file_id in file_ids:
+                extraction.schedule_file(file_id)
+
+        # The batch's results are the last created ones still missing an id
+        pending = [result for result in self.results if result['status'] == 'created' and result['id'] is None]
+        for result, file_id in zip(pending, file_ids):
+            result['id'] = file_id
+        self.batch = []
+
+    def add_uploads(self, uploads):
+        """Ingest uploads the upload handler already streamed and hashed"""
+        for upload in uploads:
+            self.add(upload.name, upload)
+        self.flush()
+
+    def add_archive(self, path):
+        """Unpack and ingest the members of the ZIP archive at ``path``"""
+        try:
+            archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile:
+            raise IngestError('Archive is not a valid ZIP file.')
+
+        workers = max(settings.FILES_BULK_WORKERS, 1)
+        with archive, ThreadPoolExecutor(max_workers=workers, thread_name_prefix='file-ingest') as executor:
+            members = archive_members(archive)
+            # Readers of one ZipFile share its handle under a lock, decompression runs in parallel
+            tasks = (lambda info=info: unpack_member(archive, info) for info in members)
+            for name, upload, error in _bounded(executor, tasks, workers * 2):
+                if error:
+                    self.reject(name, error)
+                else:
+                    self.add(name, upload)
+        self.flush()
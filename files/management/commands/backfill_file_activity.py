@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from files import activity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily file activity rollups from file and version history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='Only rebuild days from this date on (YYYY-MM-DD)'
+        )
+
+    def handle(self, *args, **options):
+        written = activity.backfill(since=options['since'])
+        self.stdout.write(self.style.SUCCESS(f'File activity rollups rebuilt: {written} rows'))
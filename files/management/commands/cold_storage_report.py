@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from files import tiering
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Report bytes per storage tier, bytes saved and read latency per tier'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Latency over this many days'
+        )
+
+    def handle(self, *args, **options):
+        result = tiering.report(since=timezone.localdate() - timedelta(days=options['days']))
+
+        for tier, sizes in sorted(result['tiers'].items()):
+            self.stdout.write(f'{tier}: {_mb(sizes["bytes"])} of content in {_mb(sizes["stored_bytes"])}')
+        self.stdout.write(self.style.SUCCESS(f'Saved by compression: {_mb(result["bytes_saved"])}'))
+
+        for tier, buckets in sorted(result['latency'].items()):
+            total = sum(bucket['count'] for bucket in buckets)
+            self.stdout.write(f'{tier} reads ({total}):')
+            for bucket in buckets:
+                bound = f'<= {bucket["le_ms"]}ms' if bucket['le_ms'] else 'slower'
+                self.stdout.write(f'  {bound:>10}  {bucket["count"]:>8}  {bucket["count"] / total:6.1%}')
@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from files import sweeper
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Quarantine, then delete, stored media no file, version or blob references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Check this many paths per batch, progress is saved after each'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Threads used to stat paths'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop each volume after this many batches, the next run resumes there'
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Leave files modified more recently than this alone'
+        )
+        parser.add_argument(
+            '--quarantine-days',
+            type=int,
+            default=7,
+            help='Delete quarantined files after this many days'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the orphans and the space they take'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and sweep every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = sweeper.sweep(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                grace=timedelta(minutes=options['grace_minutes']),
+                quarantine_for=timedelta(days=options['quarantine_days']),
+                dry_run=options['dry_run'],
+                max_batches=options['max_batches'],
+                log=self.stdout.write if options['verbosity'] > 1 or options['dry_run'] else None
+            )
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{result.scanned} files scanned, {result.orphans} orphans, '
+                    f'{_mb(result.orphan_bytes)} would be reclaimed'
+                ))
+            else:
+                progress = 'sweep complete' if result.complete else 'sweep paused, the next run resumes'
+                self.stdout.write(self.style.SUCCESS(
+                    f'{result.scanned} files scanned, {result.orphans} orphans ({_mb(result.orphan_bytes)}) '
+                    f'quarantined, {_mb(result.purged_bytes)} of old quarantine deleted; {progress}'
+                ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
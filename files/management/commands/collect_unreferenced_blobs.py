@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from files.models import Blob
+
+
+class Command(BaseCommand):
+    help = 'Delete blobs no file or version has referenced for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Keep unreferenced blobs this long, so in-flight uploads can still reuse them'
+        )
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        collected = Blob.objects.collect(older_than)
+        self.stdout.write(self.style.SUCCESS(f'{collected} unreferenced blobs deleted'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+
+from files import extraction
+from files.models import File, FileContent, FileVersion
+
+
+class Command(BaseCommand):
+    help = 'Hash stored files and versions and extract the text of content not indexed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Extract the text of every file and version again, not only content not indexed yet'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Extract content that previously failed again'
+        )
+
+    def handle(self, *args, **options):
+        # Hashes stay as they are, ETags, document keys and dedup depend on them;
+        # content is extracted again by dropping its FileContent row
+        if options['all']:
+            FileContent.objects.all().delete()
+        elif options['retry_failed']:
+            FileContent.objects.filter(status='failed').delete()
+
+        # Pending: not hashed yet, or hashed without extracted content
+        pending = Q(content_hash='') | ~Q(Exists(FileContent.objects.filter(content_hash=OuterRef('content_hash'))))
+        files = File.objects.exclude(file='').exclude(file__isnull=True).filter(pending)
+        versions = FileVersion.objects.exclude(file_data='').filter(pending)
+
+        indexed_before = FileContent.objects.count()
+        file_ids = list(files.values_list('id', flat=True))
+        version_ids = list(versions.values_list('id', flat=True))
+        for file_id in file_ids:
+            extraction.process_file(file_id)
+        for version_id in version_ids:
+            extraction.process_version(version_id)
+
+        extracted = FileContent.objects.count() - indexed_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(file_ids)} files and {len(version_ids)} versions: {extracted} new documents extracted'
+        ))
@@ -0,0 +1,104 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from files.models import Blob, File, FileVersion, blob_path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stored(name):
+    """(sha256, size) of a stored file, None if it is missing"""
+    if not default_storage.exists(name):
+        return None
+    digest, size = hashlib.sha256(), 0
+    with default_storage.open(name, 'rb') as stored:
+        for chunk in iter(lambda: stored.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def move_stored(source, target):
+    """Move a stored file, renaming it when the storage is a local filesystem"""
+    try:
+        source_path, target_path = default_storage.path(source), default_storage.path(target)
+    except NotImplementedError:
+        with default_storage.open(source, 'rb') as stored:
+            default_storage.save(target, stored)
+        default_storage.delete(source)
+        return
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    file_move_safe(source_path, target_path)
+
+
+class Command(BaseCommand):
+    help = 'Move existing media into the content-addressed blob store, storing identical files once'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of files hashed in parallel'
+        )
+
+    def handle(self, *args, **options):
+        names = set(
+            File.objects.filter(blob__isnull=True).exclude(file='').exclude(file__isnull=True)
+            .values_list('file', flat=True)
+        ) | set(
+            FileVersion.objects.filter(blob__isnull=True).exclude(file_data='')
+            .values_list('file_data', flat=True)
+        )
+        names = sorted(names)
+
+        moved = deduplicated = missing = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for name, hashed in zip(names, pool.map(hash_stored, names)):
+                if hashed is None:
+                    self.stdout.write(self.style.WARNING(f'Missing from storage, skipped: {name}'))
+                    missing += 1
+                    continue
+                if self.migrate(name, *hashed):
+                    moved += 1
+                else:
+                    deduplicated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} files moved to the blob store, {deduplicated} duplicates removed, {missing} missing'
+        ))
+
+    def migrate(self, name, sha256, size):
+        """Point every row using ``name`` at its blob, returns whether the file was moved"""
+        path = blob_path(sha256, os.path.splitext(name)[1].lower())
+        blob = Blob.objects.filter(path=path).first()
+        move = blob is None and not default_storage.exists(path)
+        if move:
+            move_stored(name, path)
+
+        try:
+            with transaction.atomic():
+                if blob is None:
+                    blob, _ = Blob.objects.get_or_create(path=path, defaults={'sha256': sha256, 'size': size})
+                references = File.objects.filter(file=name, blob__isnull=True).update(
+                    file=path, blob=blob, content_hash=sha256
+                ) + FileVersion.objects.filter(file_data=name, blob__isnull=True).update(
+                    file_data=path, blob=blob, content_hash=sha256
+                )
+                Blob.objects.filter(id=blob.id).update(ref_count=F('ref_count') + references)
+        except Exception:
+            if move:
+                move_stored(path, name)
+            raise
+
+        if not move:
+            # Same bytes are already in the blob store
+            default_storage.delete(name)
+        return move
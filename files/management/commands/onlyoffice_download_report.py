@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from files import documentserver
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Report latency and throughput of edited document downloads from the Document Server'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Report over this many days'
+        )
+
+    def handle(self, *args, **options):
+        result = documentserver.report(since=timezone.now() - timedelta(days=options['days']))
+
+        self.stdout.write(f'Downloads: {result["downloads"]} ({_mb(result["bytes"])})')
+        self.stdout.write(f'Time to first byte: {result["average_first_byte_seconds"] * 1000:.0f}ms on average')
+        self.stdout.write(
+            f'Download time: {result["average_seconds"] * 1000:.0f}ms on average, '
+            f'{result["slowest_seconds"] * 1000:.0f}ms at most'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Throughput: {_mb(result["throughput"])}/s'))
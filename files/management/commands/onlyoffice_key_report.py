@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from files import documentkeys
+
+
+class Command(BaseCommand):
+    help = 'Report OnlyOffice editor opens per day and how many reused a cached document key'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Report over this many days'
+        )
+
+    def handle(self, *args, **options):
+        result = documentkeys.report(since=timezone.localdate() - timedelta(days=options['days']))
+
+        for day in result['days']:
+            self.stdout.write(f'{day["day"]}  {day["opens"]:>8} opens  {day["reused"]:>8} reused  {day["hit_ratio"]:6.1%}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["opens"]} opens, {result["reused"]} reused a document key the Document Server '
+            f'already had ({result["hit_ratio"]:.1%})'
+        ))
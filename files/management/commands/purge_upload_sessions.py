@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from files import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete expired resumable upload sessions and their partial data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and purge every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = uploads.purge_expired()
+            self.stdout.write(self.style.SUCCESS(f'{purged} expired upload sessions purged'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
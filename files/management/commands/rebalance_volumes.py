@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from files import volumes
+
+
+class Command(BaseCommand):
+    help = 'Move blobs between storage volumes until they are filled evenly'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=50,
+            help='Copy at most this many MB per second, 0 for no limit'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.05,
+            help='Stop once the fill ratios of all volumes are within this of each other'
+        )
+        parser.add_argument(
+            '--max-gb',
+            type=float,
+            help='Move at most this many GB in this run'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report which blobs would be moved'
+        )
+
+    def handle(self, *args, **options):
+        for volume, (used, total) in volumes.usage().items():
+            self.stdout.write(f'{volume}: {used / total:.1%} full' if total else f'{volume}: unknown size')
+
+        max_gb = options['max_gb']
+        moved, moved_bytes = volumes.rebalance(
+            rate=int(options['rate'] * 1024 * 1024),
+            tolerance=options['tolerance'],
+            max_bytes=int(max_gb * 1024 ** 3) if max_gb is not None else None,
+            dry_run=options['dry_run'],
+            log=self.stdout.write if options['verbosity'] > 1 or options['dry_run'] else None
+        )
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(f'{moved} blobs ({moved_bytes / (1024 * 1024):.1f}MB) {verb}'))
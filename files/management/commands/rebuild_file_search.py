@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from files import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the file search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search.BATCH_SIZE,
+            help='Number of files processed per batch'
+        )
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'File search index rebuilt: {indexed} files'))
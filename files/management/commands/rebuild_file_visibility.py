@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from files import visibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user file visibility index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=visibility.BATCH_SIZE,
+            help='Number of files processed per batch'
+        )
+
+    def handle(self, *args, **options):
+        written = visibility.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'File visibility index rebuilt: {written} rows'))
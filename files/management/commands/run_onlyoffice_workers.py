@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from files import callbacks
+
+
+class Command(BaseCommand):
+    help = 'Process queued OnlyOffice callbacks: download, version and analyze edited documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of worker threads'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Seconds an idle worker waits before looking for jobs again'
+        )
+        parser.add_argument(
+            '--drain',
+            action='store_true',
+            help='Exit once no job is due instead of running as a background worker'
+        )
+
+    def handle(self, *args, **options):
+        stop, threads = callbacks.start_workers(
+            options['concurrency'], poll_interval=options['poll_interval'], drain=options['drain']
+        )
+        self.stdout.write(f'{len(threads)} OnlyOffice workers started')
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # Let the running jobs finish, an interrupted one is retried after its lease
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS('OnlyOffice workers stopped'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from files import tiering
+
+
+class Command(BaseCommand):
+    help = 'Pack archived files and old versions into compressed cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Pack at most this many blobs in this run'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be packed'
+        )
+
+    def handle(self, *args, **options):
+        blobs = tiering.eligible().order_by('id')
+        if options['limit']:
+            blobs = blobs[:options['limit']]
+
+        if options['dry_run']:
+            totals = blobs.aggregate(total=Sum('size'))
+            count = blobs.count()
+            self.stdout.write(self.style.SUCCESS(
+                f'{count} blobs ({(totals["total"] or 0) / (1024 * 1024):.1f}MB) would be packed'
+            ))
+            return
+
+        packed = original = stored = 0
+        for blob in blobs.iterator(chunk_size=100):
+            try:
+                length = tiering.freeze(blob)
+            except FileNotFoundError:
+                self.stderr.write(f'{blob.path}: stored content is missing')
+                continue
+            if length:
+                packed += 1
+                original += blob.size
+                stored += length
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{packed} blobs packed, {original / (1024 * 1024):.1f}MB stored in {stored / (1024 * 1024):.1f}MB'
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_file_is_onedrive_embed_file_onedrive_direct_link_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('access_level', models.CharField(choices=[('department', 'Department Member'), ('read', 'Read Only'), ('write', 'Read & Write'), ('admin', 'Full Access')], max_length=20)),
+                ('is_owner', models.BooleanField(default=False)),
+                ('is_shared', models.BooleanField(default=False)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='files.file')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_visibility', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'File Visibility',
+                'verbose_name_plural': 'File Visibility',
+                'unique_together': {('user', 'file')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_departmentcounters'),
+        ('files', '0005_filevisibility'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['department', 'created_at'], name='files_file_dept_created'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_departmentcounters'),
+        ('files', '0006_file_department_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('file_type', models.CharField(choices=[('excel', 'Excel'), ('word', 'Word'), ('pdf', 'PDF'), ('other', 'Other')], max_length=20)),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('review', 'Under Review'), ('approved', 'Approved'), ('archived', 'Archived')], max_length=20)),
+                ('uploads', models.PositiveIntegerField(default=0)),
+                ('versions', models.PositiveIntegerField(default=0)),
+                ('edits', models.PositiveIntegerField(default=0)),
+                ('bytes_added', models.BigIntegerField(default=0)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='file_activity', to='departments.department')),
+            ],
+            options={
+                'verbose_name': 'File Activity',
+                'verbose_name_plural': 'File Activity',
+                'indexes': [models.Index(fields=['department', 'day'], name='files_activity_dept_day')],
+                'unique_together': {('day', 'department', 'file_type', 'status')},
+            },
+        ),
+    ]
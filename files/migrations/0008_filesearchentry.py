@@ -0,0 +1,116 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE files_filesearch_fts USING fts5(
+        name, description, uploader, department_path,
+        content='files_filesearchentry', content_rowid='file_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER files_filesearch_ai AFTER INSERT ON files_filesearchentry BEGIN
+        INSERT INTO files_filesearch_fts(rowid, name, description, uploader, department_path)
+        VALUES (new.file_id, new.name, new.description, new.uploader, new.department_path);
+    END""",
+    """CREATE TRIGGER files_filesearch_ad AFTER DELETE ON files_filesearchentry BEGIN
+        INSERT INTO files_filesearch_fts(files_filesearch_fts, rowid, name, description, uploader, department_path)
+        VALUES ('delete', old.file_id, old.name, old.description, old.uploader, old.department_path);
+    END""",
+    """CREATE TRIGGER files_filesearch_au AFTER UPDATE ON files_filesearchentry BEGIN
+        INSERT INTO files_filesearch_fts(files_filesearch_fts, rowid, name, description, uploader, department_path)
+        VALUES ('delete', old.file_id, old.name, old.description, old.uploader, old.department_path);
+        INSERT INTO files_filesearch_fts(rowid, name, description, uploader, department_path)
+        VALUES (new.file_id, new.name, new.description, new.uploader, new.department_path);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS files_filesearch_au',
+    'DROP TRIGGER IF EXISTS files_filesearch_ad',
+    'DROP TRIGGER IF EXISTS files_filesearch_ai',
+    'DROP TABLE IF EXISTS files_filesearch_fts',
+]
+
+POSTGRESQL_INDEX = [
+    """ALTER TABLE files_filesearchentry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(uploader, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(department_path, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED""",
+    'CREATE INDEX files_filesearch_document ON files_filesearchentry USING GIN (document)',
+]
+
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS files_filesearch_document',
+    'ALTER TABLE files_filesearchentry DROP COLUMN IF EXISTS document',
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP})
+
+
+def populate_entries(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    FileSearchEntry = apps.get_model('files', 'FileSearchEntry')
+    DepartmentClosure = apps.get_model('departments', 'DepartmentClosure')
+
+    paths = {}
+    for department_id, name in DepartmentClosure.objects.order_by('descendant_id', '-depth').values_list(
+        'descendant_id', 'ancestor__name'
+    ):
+        paths.setdefault(department_id, []).append(name)
+
+    rows = [
+        FileSearchEntry(
+            file_id=file_id,
+            name=name,
+            description=description or '',
+            uploader=' '.join(part for part in (first_name, last_name, username) if part),
+            department_path=' / '.join(paths.get(department_id, []))
+        )
+        for file_id, name, description, first_name, last_name, username, department_id in File.objects.values_list(
+            'id', 'name', 'description', 'uploaded_by__first_name', 'uploaded_by__last_name',
+            'uploaded_by__username', 'department_id'
+        )
+    ]
+    FileSearchEntry.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_departmentcounters'),
+        ('files', '0007_fileactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileSearchEntry',
+            fields=[
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='files.file')),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, default='')),
+                ('uploader', models.CharField(blank=True, default='', max_length=455)),
+                ('department_path', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'File Search Entry',
+                'verbose_name_plural': 'File Search Entries',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:31
+
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE files_filecontent_fts USING fts5(
+        text, content='files_filecontent', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER files_filecontent_ai AFTER INSERT ON files_filecontent BEGIN
+        INSERT INTO files_filecontent_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER files_filecontent_ad AFTER DELETE ON files_filecontent BEGIN
+        INSERT INTO files_filecontent_fts(files_filecontent_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER files_filecontent_au AFTER UPDATE ON files_filecontent BEGIN
+        INSERT INTO files_filecontent_fts(files_filecontent_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO files_filecontent_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS files_filecontent_au',
+    'DROP TRIGGER IF EXISTS files_filecontent_ad',
+    'DROP TRIGGER IF EXISTS files_filecontent_ai',
+    'DROP TABLE IF EXISTS files_filecontent_fts',
+]
+
+POSTGRESQL_INDEX = [
+    """ALTER TABLE files_filecontent ADD COLUMN document tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED""",
+    'CREATE INDEX files_filecontent_document ON files_filecontent USING GIN (document)',
+]
+
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS files_filecontent_document',
+    'ALTER TABLE files_filecontent DROP COLUMN IF EXISTS document',
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_content_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX})
+
+
+def drop_content_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_filesearchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('extracted', 'Extracted'), ('unsupported', 'Unsupported Format'), ('failed', 'Failed')], default='extracted', max_length=20)),
+                ('truncated', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True, default='')),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'File Content',
+                'verbose_name_plural': 'File Contents',
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='fileversion',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(create_content_index, drop_content_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_departmentcounters'),
+        ('files', '0009_filecontent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['created_at', 'id'], name='files_file_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['uploaded_by', 'created_at', 'id'], name='files_file_owner_created'),
+        ),
+        migrations.AddIndex(
+            model_name='fileversion',
+            index=models.Index(fields=['file', 'created_at', 'id'], name='files_version_file_created'),
+        ),
+    ]
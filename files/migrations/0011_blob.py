@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='files_blob_unreferenced')],
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='files', to='files.blob'),
+        ),
+        migrations.AddField(
+            model_name='fileversion',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='files.blob'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0012_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='volume',
+            field=models.CharField(db_index=True, default='default', max_length=64),
+        ),
+    ]
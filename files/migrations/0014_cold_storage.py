@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0013_blob_volume'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdPack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('codec', models.CharField(max_length=10)),
+                ('size', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cold Pack',
+                'verbose_name_plural': 'Cold Packs',
+            },
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='pack_length',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='pack_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='rehydrated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='tier',
+            field=models.CharField(choices=[('hot', 'Hot'), ('cold', 'Cold')], db_index=True, default='hot', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='pack',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='blobs', to='files.coldpack'),
+        ),
+        migrations.CreateModel(
+            name='TierAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tier', models.CharField(choices=[('hot', 'Hot'), ('cold', 'Cold')], max_length=10)),
+                ('bucket_ms', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Tier Access',
+                'verbose_name_plural': 'Tier Accesses',
+                'unique_together': {('day', 'tier', 'bucket_ms')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_cold_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaSweepState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('volume', models.CharField(max_length=64, unique=True)),
+                ('position', models.TextField(blank=True, default='')),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Media Sweep State',
+                'verbose_name_plural': 'Media Sweep States',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0015_mediasweepstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentKeyUse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('opens', models.PositiveIntegerField(default=0)),
+                ('reused', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Document Key Use',
+                'verbose_name_plural': 'Document Key Uses',
+            },
+        ),
+        migrations.AlterField(
+            model_name='onlyofficesession',
+            name='document_key',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
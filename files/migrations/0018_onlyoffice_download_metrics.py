@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0017_onlyoffice_callback_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onlyofficecallbackjob',
+            name='download_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='onlyofficecallbackjob',
+            name='download_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='onlyofficecallbackjob',
+            name='first_byte_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0018_onlyoffice_download_metrics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onlyofficecallbackjob',
+            name='payload_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='onlyofficecallbackjob',
+            name='state',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='onlyofficecallbackjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('payload_hash', ''), _negated=True), fields=('document_key', 'payload_hash'), name='files_oojob_unique_callback'),
+        ),
+    ]
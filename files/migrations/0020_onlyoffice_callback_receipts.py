@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_receipts(apps, schema_editor):
+    OnlyOfficeCallbackJob = apps.get_model('files', 'OnlyOfficeCallbackJob')
+    OnlyOfficeCallbackReceipt = apps.get_model('files', 'OnlyOfficeCallbackReceipt')
+    OnlyOfficeCallbackReceipt.objects.bulk_create([
+        OnlyOfficeCallbackReceipt(job_id=job_id, document_key=document_key, payload_hash=payload_hash)
+        for job_id, document_key, payload_hash in OnlyOfficeCallbackJob.objects.exclude(
+            payload_hash=''
+        ).values_list('id', 'document_key', 'payload_hash')
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0019_onlyoffice_callback_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OnlyOfficeCallbackReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_key', models.CharField(blank=True, default='', max_length=255)),
+                ('payload_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='files.onlyofficecallbackjob')),
+            ],
+            options={
+                'verbose_name': 'OnlyOffice Callback Receipt',
+                'verbose_name_plural': 'OnlyOffice Callback Receipts',
+                'constraints': [models.UniqueConstraint(fields=('document_key', 'payload_hash'), name='files_ooreceipt_unique')],
+            },
+        ),
+        migrations.RunPython(record_receipts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0020_onlyoffice_callback_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='forcesave_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='forcesave_key',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0021_file_forcesave_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='last_callback_job_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
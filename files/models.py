@@ -1,7 +1,13 @@
+import hashlib
 import os
 import uuid
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
+from audit_system.tracking import LoadedValuesMixin
+from .storage import DEFAULT_VOLUME, volume_name
 
 
 def file_upload_path(instance, filename):
@@ -11,7 +17,148 @@ def file_upload_path(instance, filename):
     return os.path.join('uploads', str(instance.department.id) if instance.department else 'general', filename)
 
 
-class FilePermission(models.Model):
+def blob_path(sha256, ext):
+    """Storage path of a blob, fanned out over two directory levels"""
+    return os.path.join('blobs', sha256[:2], sha256[2:4], f'{sha256}{ext}')
+
+
+class BlobManager(models.Manager):
+    """Content-addressed storage of file contents"""
+
+    def store(self, content, name):
+        """Store ``content`` once per SHA-256 and extension, returns its Blob"""
+        sha256 = getattr(content, 'sha256', None)
+        if not sha256:
+            digest = hashlib.sha256()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+
+        logical_path = blob_path(sha256, os.path.splitext(name)[1].lower())
+        # The path ends in the logical path, prefixed by the volume it was placed on
+        blob = self.filter(sha256=sha256, path__endswith=logical_path).first()
+        if blob is not None:
+            if blob.tier == 'cold' and not default_storage.exists(blob.path):
+                # The upload is the cheapest way back to the hot tier
+                default_storage.save(blob.path, content)
+                self.filter(id=blob.id).update(
+                    tier='hot', pack=None, pack_offset=None, pack_length=None, rehydrated_at=timezone.now()
+                )
+                blob.tier = 'hot'
+            return blob
+
+        place = getattr(default_storage, 'place', None)
+        path = place(logical_path, getattr(content, 'size', 0) or 0) if place else logical_path
+        if not default_storage.exists(path):
+            # Temporary uploads are renamed into place
+            saved = default_storage.save(path, content)
+            if saved != path:
+                # Another request stored the same content first
+                default_storage.delete(saved)
+        try:
+            with transaction.atomic():
+                return self.create(
+                    sha256=sha256, path=path, volume=volume_name(path)[0], size=default_storage.size(path)
+                )
+        except IntegrityError:
+            return self.get(path=path)
+
+    def acquire(self, blob_id, count=1):
+        self.filter(id=blob_id).update(ref_count=F('ref_count') + count, updated_at=timezone.now())
+
+    def release(self, blob_id):
+        self.filter(id=blob_id).update(ref_count=F('ref_count') - 1, updated_at=timezone.now())
+
+    def collect(self, older_than):
+        """Delete blobs unreferenced since before ``older_than``, returns how many"""
+        collected = 0
+        for blob_id in self.filter(ref_count__lte=0, updated_at__lt=older_than).values_list('id', flat=True):
+            with transaction.atomic():
+                blob = self.select_for_update().filter(
+                    id=blob_id, ref_count__lte=0, updated_at__lt=older_than
+                ).first()
+                if blob is None:
+                    continue
+                blob.delete()
+                transaction.on_commit(lambda path=blob.path: default_storage.delete(path))
+                collected += 1
+        return collected
+
+
+class ColdPack(models.Model):
+    """Append-only file on the cold volume holding compressed blobs back to back"""
+
+    path = models.CharField(max_length=255, unique=True)  # relative to FILES_COLD_ROOT
+    codec = models.CharField(max_length=10)
+    size = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Cold Pack'
+        verbose_name_plural = 'Cold Packs'
+
+    def __str__(self):
+        return self.path
+
+
+class Blob(models.Model):
+    """Stored file content shared by every File and FileVersion with the same bytes
+
+    ``ref_count`` is kept by the receivers in files/signals.py; blobs nobody
+    references any more are deleted by ``collect_unreferenced_blobs``. Cold
+    blobs live compressed in a ColdPack instead of at ``path`` until they are
+    read again (files/tiering.py).
+    """
+
+    TIER_CHOICES = [
+        ('hot', 'Hot'),
+        ('cold', 'Cold'),
+    ]
+
+    sha256 = models.CharField(max_length=64, db_index=True)
+    path = models.CharField(max_length=255, unique=True)
+    volume = models.CharField(max_length=64, default=DEFAULT_VOLUME, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    tier = models.CharField(max_length=10, choices=TIER_CHOICES, default='hot', db_index=True)
+    pack = models.ForeignKey(ColdPack, on_delete=models.PROTECT, null=True, blank=True, related_name='blobs')
+    pack_offset = models.BigIntegerField(null=True, blank=True)
+    pack_length = models.BigIntegerField(null=True, blank=True)
+    rehydrated_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BlobManager()
+
+    class Meta:
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='files_blob_unreferenced'),
+        ]
+
+    def __str__(self):
+        return self.path
+
+
+class TierAccess(models.Model):
+    """Daily histogram of file read latency per storage tier"""
+
+    day = models.DateField()
+    tier = models.CharField(max_length=10, choices=Blob.TIER_CHOICES)
+    bucket_ms = models.PositiveIntegerField()  # upper bound of the bucket, 0 for slower than every bound
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Tier Access'
+        verbose_name_plural = 'Tier Accesses'
+        unique_together = ('day', 'tier', 'bucket_ms')
+
+    def __str__(self):
+        return f"{self.day} {self.tier} <={self.bucket_ms}ms: {self.count}"
+
+
+class FilePermission(LoadedValuesMixin, models.Model):
     """File permission model for granular access control"""
     
     PERMISSION_CHOICES = [
@@ -45,7 +192,7 @@ class OnlyOfficeSession(models.Model):
     file = models.ForeignKey('File', on_delete=models.CASCADE, related_name='editing_sessions')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     session_key = models.CharField(max_length=255, unique=True)
-    document_key = models.CharField(max_length=255, unique=True)
+    document_key = models.CharField(max_length=255, db_index=True)  # shared by every session on the same version
     is_editor = models.BooleanField(default=False)  # True for edit, False for view
     started_at = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
@@ -59,7 +206,130 @@ class OnlyOfficeSession(models.Model):
         return f"{self.user.username} - {self.file.name} ({'Edit' if self.is_editor else 'View'})"
 
 
-class File(models.Model):
+class DocumentKeyUse(models.Model):
+    """Daily count of editor opens and how many reused a document key the Document Server already knew"""
+
+    day = models.DateField(unique=True)
+    opens = models.PositiveIntegerField(default=0)
+    reused = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Document Key Use'
+        verbose_name_plural = 'Document Key Uses'
+
+    def __str__(self):
+        return f"{self.day}: {self.reused}/{self.opens} reused"
+
+
+class OnlyOfficeCallbackJob(models.Model):
+    """A Document Server callback queued for the run_onlyoffice_workers pool"""
+
+    STATE_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('skipped', 'Skipped'),  # unchanged content, or superseded by a later save
+        ('failed', 'Failed'),
+    ]
+
+    file = models.ForeignKey('File', on_delete=models.CASCADE, related_name='callback_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    document_key = models.CharField(max_length=255, blank=True, default='')
+    callback_status = models.PositiveSmallIntegerField()
+    payload = models.JSONField(default=dict)
+    payload_hash = models.CharField(max_length=64, blank=True, default='')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # retry time, or lease expiry while running
+    last_error = models.TextField(blank=True, default='')
+    # Metrics of the document download, see files/documentserver.py
+    download_bytes = models.BigIntegerField(null=True, blank=True)
+    first_byte_seconds = models.FloatField(null=True, blank=True)
+    download_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'OnlyOffice Callback Job'
+        verbose_name_plural = 'OnlyOffice Callback Jobs'
+        indexes = [
+            models.Index(fields=['state', 'run_after'], name='files_oojob_state_run_after'),
+        ]
+        constraints = [
+            # A resent callback is the same job
+            models.UniqueConstraint(
+                fields=['document_key', 'payload_hash'],
+                condition=~models.Q(payload_hash=''),
+                name='files_oojob_unique_callback'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.file_id} status {self.callback_status} ({self.state})"
+
+
+class OnlyOfficeCallbackReceipt(models.Model):
+    """A callback payload received once, pointing at the job that handles it
+
+    Coalesced force-saves share one job, so every payload they delivered is
+    recorded here rather than on the job.
+    """
+
+    job = models.ForeignKey(OnlyOfficeCallbackJob, on_delete=models.CASCADE, related_name='receipts')
+    document_key = models.CharField(max_length=255, blank=True, default='')
+    payload_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'OnlyOffice Callback Receipt'
+        verbose_name_plural = 'OnlyOffice Callback Receipts'
+        constraints = [
+            models.UniqueConstraint(fields=['document_key', 'payload_hash'], name='files_ooreceipt_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_key} {self.payload_hash[:12]}"
+
+
+class FileQuerySet(models.QuerySet):
+    """File queryset with set-based permission helpers"""
+
+    def for_listing(self):
+        """Load everything FileSerializer touches in a constant number of queries"""
+        return self.select_related('department', 'uploaded_by', 'locked_by').prefetch_related(
+            models.Prefetch(
+                'file_permissions',
+                queryset=FilePermission.objects.select_related('user', 'granted_by')
+            )
+        )
+
+    def with_access(self, user):
+        """Annotate user_can_view and user_can_edit for the given user in SQL"""
+        queryset = self.annotate(access_user_id=models.Value(user.id, output_field=models.BigIntegerField()))
+        if user.role == 'admin':
+            return queryset.annotate(
+                user_can_view=models.Value(True, output_field=models.BooleanField()),
+                user_can_edit=models.Value(True, output_field=models.BooleanField())
+            )
+
+        granted = FilePermission.objects.filter(file=models.OuterRef('pk'), user=user)
+        return queryset.annotate(
+            user_can_view=models.Case(
+                models.When(uploaded_by=user, then=models.Value(True)),
+                models.When(models.Exists(granted), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField()
+            ),
+            user_can_edit=models.Case(
+                models.When(uploaded_by=user, then=models.Value(True)),
+                models.When(models.Exists(granted.filter(permission_type__in=['write', 'admin'])), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField()
+            )
+        )
+
+
+class File(LoadedValuesMixin, models.Model):
     """File model for document management"""
     
     FILE_TYPE_CHOICES = [
@@ -119,33 +389,73 @@ class File(models.Model):
     )
     lock_time = models.DateTimeField(null=True, blank=True)
     
+    # Content is stored once per hash, ``file`` names the blob's path
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    
+    # Document key kept across force-saves while the content hash is still forcesave_hash
+    forcesave_key = models.CharField(max_length=128, blank=True, default='')
+    forcesave_hash = models.CharField(max_length=64, blank=True, default='')
+    # Id of the latest OnlyOffice callback job applied, jobs recorded before it are stale
+    last_callback_job_id = models.PositiveBigIntegerField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = FileQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'File'
         verbose_name_plural = 'Files'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['department', 'created_at'], name='files_file_dept_created'),
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='files_file_created_id'),
+            models.Index(fields=['uploaded_by', 'created_at', 'id'], name='files_file_owner_created'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         if self.file:
-            self.file_size = self.file.size
-            # Determine file type based on extension
-            ext = self.file.name.split('.')[-1].lower()
-            if ext in ['xlsx', 'xls']:
-                self.file_type = 'excel'
-            elif ext in ['docx', 'doc']:
-                self.file_type = 'word'
-            elif ext == 'pdf':
-                self.file_type = 'pdf'
-            else:
-                self.file_type = 'other'
+            if not self.file._committed:
+                # New content goes to the blob store instead of a file of its own
+                self.blob = Blob.objects.store(self.file.file, self.file.name)
+                self.file = self.blob.path
+                self.content_hash = self.blob.sha256
+            if self.has_changed('file', 'blob_id'):
+                # Saves that keep the content skip loading the blob for its size
+                self.file_size = self.blob.size if self.blob_id else self.file.size
+                self.file_type = self.type_for(self.file.name)
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def type_for(file_name):
+        """Determine file type based on extension"""
+        ext = file_name.split('.')[-1].lower()
+        if ext in ['xlsx', 'xls']:
+            return 'excel'
+        elif ext in ['docx', 'doc']:
+            return 'word'
+        elif ext == 'pdf':
+            return 'pdf'
+        return 'other'
+
+    def create_version(self, created_by, comment=''):
+        """Record the current content as a version, sharing its blob"""
+        return FileVersion.objects.create(
+            file=self,
+            version_number=self.version,
+            file_data=self.file.name,
+            blob_id=self.blob_id,
+            content_hash=self.content_hash,
+            created_by=created_by,
+            comment=comment
+        )
+
     def get_file_url(self):
         """Get the file URL"""
         if self.file:
@@ -154,37 +464,32 @@ class File(models.Model):
 
     def can_edit(self, user):
         """Check if user can edit this file"""
-        # Admin can edit all files
-        if user.role == 'admin':
-            return True
-        
-        # Owner can edit
-        if self.uploaded_by == user:
+        # Prefer the flag computed by FileQuerySet.with_access
+        if getattr(self, 'access_user_id', None) == user.id:
+            return self.user_can_edit
+
+        # Admin and owner can edit
+        if user.role == 'admin' or self.uploaded_by_id == user.id:
             return True
             
         # Check permissions
-        try:
-            permission = self.file_permissions.get(user=user)
-            return permission.permission_type in ['write', 'admin']
-        except:
-            return False
+        return self.file_permissions.filter(
+            user=user, permission_type__in=['write', 'admin']
+        ).exists()
 
     def can_view(self, user):
         """Check if user can view this file"""
-        # Admin can view all files
-        if user.role == 'admin':
-            return True
-        
-        # Owner can view
-        if self.uploaded_by == user:
+        if getattr(self, 'access_user_id', None) == user.id:
+            return self.user_can_view
+
+        # Admin and owner can view
+        if user.role == 'admin' or self.uploaded_by_id == user.id:
             return True
             
         # Check permissions
-        try:
-            permission = self.file_permissions.get(user=user)
-            return permission.permission_type in ['read', 'write', 'admin']
-        except:
-            return False
+        return self.file_permissions.filter(
+            user=user, permission_type__in=['read', 'write', 'admin']
+        ).exists()
 
 
 class FileVersion(models.Model):
@@ -193,16 +498,235 @@ class FileVersion(models.Model):
     file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='versions')
     version_number = models.PositiveIntegerField()
     file_data = models.FileField(upload_to='versions/')
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='versions')
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
     created_at = models.DateTimeField(auto_now_add=True)
     comment = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
 
     class Meta:
         unique_together = ('file', 'version_number')
         ordering = ['-version_number']
+        indexes = [
+            models.Index(fields=['file', 'created_at', 'id'], name='files_version_file_created'),
+        ]
 
     def __str__(self):
         return f"{self.file.name} - v{self.version_number}"
+
+    def save(self, *args, **kwargs):
+        if self.file_data and not self.file_data._committed:
+            self.blob = Blob.objects.store(self.file_data.file, self.file_data.name)
+            self.file_data = self.blob.path
+            self.content_hash = self.blob.sha256
+        super().save(*args, **kwargs)
+
+
+class FileVisibility(models.Model):
+    """Materialized (user, file) visibility index
+
+    One row per file a non-admin user can see, kept up to date by the
+    receivers in files/signals.py. Rebuild with ``rebuild_file_visibility``.
+    """
+
+    ACCESS_CHOICES = [
+        ('department', 'Department Member'),
+        ('read', 'Read Only'),
+        ('write', 'Read & Write'),
+        ('admin', 'Full Access'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='file_visibility'
+    )
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='visibility')
+    access_level = models.CharField(max_length=20, choices=ACCESS_CHOICES)
+    is_owner = models.BooleanField(default=False)
+    is_shared = models.BooleanField(default=False)  # Granted explicitly to the user
+
+    class Meta:
+        unique_together = ('user', 'file')
+        verbose_name = 'File Visibility'
+        verbose_name_plural = 'File Visibility'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.file_id} ({self.access_level})"
+
+
+class FileActivity(models.Model):
+    """Daily rollup of file write activity
+
+    One row per (day, department, file type, status), incremented from the
+    upload, version and OnlyOffice save paths by files/activity.py.
+    """
+
+    day = models.DateField()
+    department = models.ForeignKey(
+        'departments.Department',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='file_activity'
+    )
+    file_type = models.CharField(max_length=20, choices=File.FILE_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=File.STATUS_CHOICES)
+    uploads = models.PositiveIntegerField(default=0)
+    versions = models.PositiveIntegerField(default=0)
+    edits = models.PositiveIntegerField(default=0)
+    bytes_added = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'department', 'file_type', 'status')
+        indexes = [
+            models.Index(fields=['department', 'day'], name='files_activity_dept_day'),
+        ]
+        verbose_name = 'File Activity'
+        verbose_name_plural = 'File Activity'
+
+    def __str__(self):
+        return f"{self.day} - {self.department_id} ({self.file_type}/{self.status})"
+
+
+class FileSearchEntry(models.Model):
+    """Searchable text of a file
+
+    Kept in step with the file, its uploader and its department by
+    files/search.py. The full-text index over these columns is database
+    specific (FTS5 on SQLite, a tsvector column on PostgreSQL) and is created
+    by migration 0008.
+    """
+
+    file = models.OneToOneField(
+        File,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry'
+    )
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default='')
+    uploader = models.CharField(max_length=455, blank=True, default='')
+    department_path = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'File Search Entry'
+        verbose_name_plural = 'File Search Entries'
+
+    def __str__(self):
+        return self.name
+
+
+class FileContent(models.Model):
+    """Text extracted from a stored document
+
+    Keyed by the SHA-256 of the document, so identical files and versions
+    are extracted and indexed once. Written by files/extraction.py; the
+    full-text index over ``text`` is created by migration 0009.
+    """
+
+    STATUS_CHOICES = [
+        ('extracted', 'Extracted'),
+        ('unsupported', 'Unsupported Format'),
+        ('failed', 'Failed'),
+    ]
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    text = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='extracted')
+    truncated = models.BooleanField(default=False)
+    error = models.TextField(blank=True, default='')
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'File Content'
+        verbose_name_plural = 'File Contents'
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a new file, or of a new version of ``file``
+
+    Chunks are written at their offsets into a sparse part file under
+    FILES_UPLOAD_TEMP_DIR, see files/uploads.py. Sessions are deleted once
+    completed, aborted or expired.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    file = models.ForeignKey(
+        File,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+
+    # Fields of the File created on completion
+    name = models.CharField(max_length=255, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    department = models.ForeignKey(
+        'departments.Department',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    status = models.CharField(max_length=20, choices=File.STATUS_CHOICES, default='draft')
+    comment = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"{self.filename} ({self.user_id})"
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.FILES_UPLOAD_TEMP_DIR, 'sessions', f'{self.id}.part')
+
+
+class UploadChunk(models.Model):
+    """Chunk of an UploadSession written to its part file"""
+
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    offset = models.BigIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('session', 'offset')
+        ordering = ['offset']
+
+    def __str__(self):
+        return f"{self.session_id} @ {self.offset}"
+
+
+class MediaSweepState(models.Model):
+    """Where the orphaned media sweep of a storage volume got to, so it can resume"""
+
+    volume = models.CharField(max_length=64, unique=True)
+    position = models.TextField(blank=True, default='')  # last path checked, empty once a pass is complete
+    passes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Media Sweep State'
+        verbose_name_plural = 'Media Sweep States'
+
+    def __str__(self):
+        return f"{self.volume} @ {self.position or 'start'}"
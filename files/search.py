@@ -0,0 +1,289 @@
+"""Full-text search over file metadata.
+
+FileSearchEntry rows hold the searchable text of each file: its name,
+description, uploader name and department path. The full-text index over
+them is database specific, so queries go through the backend matching the
+connection: FTS5 on SQLite, a tsvector column with a GIN index on
+PostgreSQL, and plain icontains lookups on anything else.
+
+Document bodies extracted into FileContent are searched the same way
+through ``search_content``, which also annotates a highlighted snippet.
+
+Every search term is matched as a prefix, and all terms must match.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import CharField, Count, FloatField, Q, Value
+from django.db.models.functions import TruncMonth
+from django.db.models.expressions import RawSQL
+
+from departments.models import DepartmentClosure
+from .models import File, FileContent, FileSearchEntry
+
+BATCH_SIZE = 500
+
+# Longer queries are truncated, every term costs a posting list lookup
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r'\w+')
+
+# Snippet highlight markers, replaced by <mark> tags after HTML escaping
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+FILE_TABLE = File._meta.db_table
+
+
+def terms(query):
+    """Split a user query into lowercase search terms"""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Filters a File queryset by search terms and annotates ``search_rank``"""
+
+    def search(self, queryset, query):
+        words = terms(query)
+        if not words:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return self.filter(queryset, words)
+
+    def search_content(self, queryset, query):
+        words = terms(query)
+        if not words:
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField()),
+                snippet=Value('', output_field=CharField())
+            )
+        return self.filter_content(queryset, words)
+
+    def filter(self, queryset, words):
+        raise NotImplementedError
+
+    def filter_content(self, queryset, words):
+        """Match the extracted text of each file's current content, annotating ``snippet`` too"""
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 external-content table kept in step by triggers on FileSearchEntry"""
+
+    table = 'files_filesearch_fts'
+
+    content_table = 'files_filecontent_fts'
+
+    # bm25() column weights: name, description, uploader, department_path
+    weights = (10.0, 1.0, 4.0, 2.0)
+
+    def match(self, words):
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def filter(self, queryset, words):
+        match = self.match(words)
+        matches = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,))
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            f'SELECT -bm25({self.table}, {", ".join(map(str, self.weights))}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {FILE_TABLE}.id',
+            (match,),
+            output_field=FloatField()
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    def filter_content(self, queryset, words):
+        match = self.match(words)
+        contents = FileContent._meta.db_table
+        matching = (
+            f'FROM {self.content_table} JOIN {contents} ON {contents}.id = {self.content_table}.rowid '
+            f'WHERE {self.content_table} MATCH %s'
+        )
+        current = f'{matching} AND {contents}.content_hash = {FILE_TABLE}.content_hash'
+        return queryset.filter(
+            content_hash__in=RawSQL(f'SELECT {contents}.content_hash {matching}', (match,))
+        ).annotate(
+            search_rank=RawSQL(f'SELECT -bm25({self.content_table}) {current}', (match,), output_field=FloatField()),
+            snippet=RawSQL(
+                f"SELECT snippet({self.content_table}, 0, %s, %s, '…', 24) {current}",
+                (HIGHLIGHT_START, HIGHLIGHT_END, match),
+                output_field=CharField()
+            )
+        )
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """Generated ``document`` tsvector column with a GIN index"""
+
+    table = FileSearchEntry._meta.db_table
+
+    content_table = FileContent._meta.db_table
+
+    headline_options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2, MaxWords=24, MinWords=8'
+
+    def tsquery(self, words):
+        return ' & '.join(f'{word}:*' for word in words)
+
+    def filter(self, queryset, words):
+        tsquery = self.tsquery(words)
+        matches = RawSQL(
+            f"SELECT file_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)",
+            (tsquery,)
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {self.table} "
+            f"WHERE file_id = {FILE_TABLE}.id",
+            (tsquery,),
+            output_field=FloatField()
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    def filter_content(self, queryset, words):
+        tsquery = self.tsquery(words)
+        current = f'FROM {self.content_table} WHERE content_hash = {FILE_TABLE}.content_hash'
+        return queryset.filter(content_hash__in=RawSQL(
+            f"SELECT content_hash FROM {self.content_table} WHERE document @@ to_tsquery('simple', %s)",
+            (tsquery,)
+        )).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank(document, to_tsquery('simple', %s)) {current}",
+                (tsquery,),
+                output_field=FloatField()
+            ),
+            snippet=RawSQL(
+                f"SELECT ts_headline('simple', text, to_tsquery('simple', %s), %s) {current}",
+                (tsquery, self.headline_options),
+                output_field=CharField()
+            )
+        )
+
+
+class FallbackSearchBackend(SearchBackend):
+    """Unranked icontains lookups on the entries, for databases without an index"""
+
+    fields = ('name', 'description', 'uploader', 'department_path')
+
+    def filter(self, queryset, words):
+        for word in words:
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'search_entry__{field}__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def filter_content(self, queryset, words):
+        contents = FileContent.objects.all()
+        for word in words:
+            contents = contents.filter(text__icontains=word)
+        return queryset.filter(content_hash__in=contents.values('content_hash')).annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            snippet=Value('', output_field=CharField())
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend():
+    """The search backend of the default database"""
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search(queryset, query):
+    """Filter a File queryset by ``query``, annotating ``search_rank``"""
+    return get_backend().search(queryset, query)
+
+
+def search_content(queryset, query):
+    """Filter a File queryset by the text of its documents, annotating ``search_rank`` and ``snippet``"""
+    return get_backend().search_content(queryset, query)
+
+
+def facets(queryset):
+    """Count a filtered File queryset per file type, status, department and month
+
+    One GROUP BY over all four columns, folded into per-facet counts here.
+    """
+    counts = {'file_type': {}, 'status': {}, 'department': {}, 'month': {}}
+    department_names = {}
+    rows = (
+        queryset.order_by()
+        .annotate(month=TruncMonth('created_at'))
+        .values('file_type', 'status', 'department_id', 'department__name', 'month')
+        .annotate(count=Count('id'))
+    )
+    for row in rows:
+        department_names[row['department_id']] = row['department__name']
+        month = row['month'].strftime('%Y-%m') if row['month'] else None
+        for facet, value in (
+            ('file_type', row['file_type']),
+            ('status', row['status']),
+            ('department', row['department_id']),
+            ('month', month),
+        ):
+            counts[facet][value] = counts[facet].get(value, 0) + row['count']
+
+    def ranked(facet):
+        return sorted(counts[facet].items(), key=lambda item: -item[1])
+
+    return {
+        'file_type': [{'value': value, 'count': count} for value, count in ranked('file_type')],
+        'status': [{'value': value, 'count': count} for value, count in ranked('status')],
+        'department': [
+            {'id': value, 'name': department_names[value], 'count': count}
+            for value, count in ranked('department')
+        ],
+        'month': [
+            {'value': value, 'count': count}
+            for value, count in sorted(counts['month'].items(), key=lambda item: item[0] or '', reverse=True)
+        ],
+    }
+
+
+def _department_paths(department_ids):
+    """Map each department to its 'Root / ... / Department' path"""
+    names = {}
+    for department_id, name in DepartmentClosure.objects.filter(
+        descendant_id__in=department_ids
+    ).order_by('descendant_id', '-depth').values_list('descendant_id', 'ancestor__name'):
+        names.setdefault(department_id, []).append(name)
+    return {department_id: ' / '.join(path) for department_id, path in names.items()}
+
+
+def _entries(file_ids):
+    files = list(File.objects.filter(id__in=file_ids).values_list(
+        'id', 'name', 'description', 'uploaded_by__first_name', 'uploaded_by__last_name',
+        'uploaded_by__username', 'department_id'
+    ))
+    paths = _department_paths({row[-1] for row in files if row[-1]})
+    return [
+        FileSearchEntry(
+            file_id=file_id,
+            name=name,
+            description=description or '',
+            uploader=' '.join(part for part in (first_name, last_name, username) if part),
+            department_path=paths.get(department_id, '')
+        )
+        for file_id, name, description, first_name, last_name, username, department_id in files
+    ]
+
+
+def index_files(file_ids, batch_size=BATCH_SIZE):
+    """Rewrite the search entries of the given files"""
+    file_ids = list(file_ids)
+    with transaction.atomic():
+        for start in range(0, len(file_ids), batch_size):
+            batch = file_ids[start:start + batch_size]
+            FileSearchEntry.objects.filter(file_id__in=batch).delete()
+            FileSearchEntry.objects.bulk_create(_entries(batch), batch_size=1000)
+
+
+def rebuild_index(batch_size=BATCH_SIZE):
+    """Rebuild every search entry, returns the number of entries written"""
+    with transaction.atomic():
+        FileSearchEntry.objects.all().delete()
+        file_ids = list(File.objects.order_by('id').values_list('id', flat=True))
+        index_files(file_ids, batch_size=batch_size)
+    return len(file_ids)
@@ -1,5 +1,11 @@
+from django.urls import reverse
+from django.utils.html import escape
 from rest_framework import serializers
-from .models import File, FileVersion, FilePermission, OnlyOfficeSession
+from .search import HIGHLIGHT_END, HIGHLIGHT_START
+from .uploadhandlers import extension_error, size_error
+from django.conf import settings
+from departments.models import Department
+from .models import File, FileVersion, FilePermission, OnlyOfficeSession, UploadSession
 
 
 class FilePermissionSerializer(serializers.ModelSerializer):
@@ -25,6 +31,7 @@ class FileSerializer(serializers.ModelSerializer):
     department_name = serializers.CharField(source='department.name', read_only=True)
     locked_by_name = serializers.CharField(source='locked_by.get_full_name', read_only=True)
     file_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
     file_size_mb = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
     can_view = serializers.SerializerMethodField()
@@ -33,7 +40,7 @@ class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
         fields = (
-            'id', 'name', 'description', 'file', 'file_url', 'file_type',
+            'id', 'name', 'description', 'file', 'file_url', 'download_url', 'file_type',
             'status', 'uploaded_by', 'uploaded_by_name', 'department',
             'department_name', 'file_size', 'file_size_mb', 'version',
             'is_locked', 'locked_by', 'locked_by_name', 'lock_time',
@@ -54,12 +61,22 @@ class FileSerializer(serializers.ModelSerializer):
             return obj.file.url
         return None
 
+    def get_download_url(self, obj):
+        """Get the permission-checked download URL"""
+        if not obj.file:
+            return None
+        url = reverse('files:download_file', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_file_size_mb(self, obj):
         """Get file size in MB"""
         if obj.file_size:
             return round(obj.file_size / (1024 * 1024), 2)
         return 0
 
+    # can_edit/can_view read the flags annotated by File.objects.with_access
+    # and only fall back to per-row queries for unannotated instances
     def get_can_edit(self, obj):
         """Check if current user can edit the file"""
         request = self.context.get('request')
@@ -75,6 +92,20 @@ class FileSerializer(serializers.ModelSerializer):
         return False
 
 
+class FileContentMatchSerializer(FileSerializer):
+    """File matched by its document text, with a highlighted snippet"""
+    
+    snippet = serializers.SerializerMethodField()
+    
+    class Meta(FileSerializer.Meta):
+        fields = FileSerializer.Meta.fields + ('snippet',)
+
+    def get_snippet(self, obj):
+        """Get the HTML-escaped snippet with matches wrapped in <mark> tags"""
+        snippet = getattr(obj, 'snippet', None) or ''
+        return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+
 class FileUploadSerializer(serializers.ModelSerializer):
     """File upload serializer"""
     
@@ -84,24 +115,90 @@ class FileUploadSerializer(serializers.ModelSerializer):
 
     def validate_file(self, value):
         """Validate file upload"""
-        # Check file size (50MB limit)
-        if value.size > 50 * 1024 * 1024:
-            raise serializers.ValidationError("File size cannot exceed 50MB.")
+        # The upload handler enforces the same limits while streaming
+        error = size_error(value.size, self.context.get('max_size')) or extension_error(value.name)
+        if error:
+            raise serializers.ValidationError(error)
         
-        # Check file extension
-        allowed_extensions = [
-            '.xlsx', '.xls', '.docx', '.doc', '.pdf',
-            '.txt', '.csv', '.ppt', '.pptx'
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Resumable upload session serializer"""
+    
+    chunk_size = serializers.SerializerMethodField()
+    received = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id', 'file', 'filename', 'size', 'sha256', 'name', 'description',
+            'department', 'status', 'comment', 'chunk_size', 'received',
+            'created_at', 'expires_at'
+        )
+        read_only_fields = ('id', 'created_at', 'expires_at')
+
+    def get_chunk_size(self, obj):
+        """Get the largest chunk the server accepts"""
+        return settings.FILES_UPLOAD_CHUNK_SIZE
+
+    def get_received(self, obj):
+        """Get the chunks received so far"""
+        return [
+            {'offset': offset, 'size': size}
+            for offset, size in obj.chunks.values_list('offset', 'size')
         ]
-        ext = value.name.lower().split('.')[-1]
-        if f'.{ext}' not in allowed_extensions:
-            raise serializers.ValidationError(
-                f"File type '{ext}' is not allowed. "
-                f"Allowed types: {', '.join(allowed_extensions)}"
-            )
-        
+
+    def validate_filename(self, value):
+        """Validate file extension"""
+        error = extension_error(value)
+        if error:
+            raise serializers.ValidationError(error)
+        return value
+
+    def validate_size(self, value):
+        """Validate file size"""
+        error = size_error(value, settings.FILES_MAX_RESUMABLE_UPLOAD_SIZE)
+        if value <= 0 or error:
+            raise serializers.ValidationError(error or "File is empty.")
         return value
 
+    def validate_sha256(self, value):
+        """Validate whole-file checksum"""
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value)):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('file') and not attrs.get('name'):
+            attrs['name'] = attrs['filename'].rsplit('.', 1)[0]
+        return attrs
+
+
+class BulkUploadSerializer(serializers.Serializer):
+    """Fields shared by every file of a bulk upload"""
+    
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    department = serializers.PrimaryKeyRelatedField(
+        queryset=Department.objects.all(), required=False, allow_null=True, default=None
+    )
+    status = serializers.ChoiceField(choices=File.STATUS_CHOICES, default='draft')
+
+
+class ArchiveDownloadSerializer(serializers.Serializer):
+    """Files to put in a ZIP download, by id or by department"""
+    
+    file_ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=1000
+    )
+    department = serializers.PrimaryKeyRelatedField(queryset=Department.objects.all(), required=False)
+
+    def validate(self, attrs):
+        if ('file_ids' in attrs) == ('department' in attrs):
+            raise serializers.ValidationError('Give either file_ids or department.')
+        return attrs
+
 
 class FileUpdateSerializer(serializers.ModelSerializer):
     """File update serializer"""
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from authentication.models import Permission
+from departments.models import Department
+from departments.signals import department_moved
+from . import extraction, search, visibility
+from .models import Blob, File, FilePermission, FileVersion
+
+
+@receiver(post_save, sender=File)
+def file_saved(sender, instance, created, **kwargs):
+    """Reindex a file when its owner or department changes"""
+    if created or instance.has_changed('uploaded_by_id', 'department_id'):
+        visibility.refresh_files([instance.id])
+
+
+@receiver(post_save, sender=File)
+def file_search_changed(sender, instance, created, **kwargs):
+    """Rewrite the search entry of a file whose searchable text changed"""
+    if created or instance.has_changed('name', 'description', 'uploaded_by_id', 'department_id'):
+        search.index_files([instance.id])
+
+
+@receiver(post_save, sender=File)
+def file_content_changed(sender, instance, created, **kwargs):
+    """Hash and extract the text of newly stored file content"""
+    if instance.file and (created or instance.has_changed('file')):
+        extraction.schedule_file(instance.id)
+
+
+@receiver(post_save, sender=FileVersion)
+def file_version_saved(sender, instance, created, **kwargs):
+    if created and instance.file_data:
+        extraction.schedule_version(instance.id)
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=FileVersion)
+def blob_reference_saved(sender, instance, created, **kwargs):
+    """Count references to the blob a file or version points to"""
+    if created:
+        if instance.blob_id:
+            Blob.objects.acquire(instance.blob_id)
+    elif sender is File and instance.has_changed('blob_id'):
+        if instance.blob_id:
+            Blob.objects.acquire(instance.blob_id)
+        if instance.previous_value('blob_id'):
+            Blob.objects.release(instance.previous_value('blob_id'))
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=FileVersion)
+def blob_reference_deleted(sender, instance, **kwargs):
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
+@receiver(post_save, sender=FilePermission)
+@receiver(post_delete, sender=FilePermission)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def permission_changed(sender, instance, created=False, **kwargs):
+    """Reindex the (user, file) pair of a granted or revoked permission"""
+    visibility.refresh_pair(instance.user_id, instance.file_id)
+    if kwargs['signal'] is post_save and not created and instance.has_changed('user_id', 'file_id'):
+        # A reassigned permission no longer grants the pair it was loaded with
+        visibility.refresh_pair(
+            instance.previous_value('user_id', instance.user_id),
+            instance.previous_value('file_id', instance.file_id)
+        )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Reindex a user moved to another department or given another role"""
+    if created or instance.has_changed('department_id', 'role'):
+        visibility.refresh_user(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_renamed(sender, instance, created, **kwargs):
+    """Rewrite the search entries of files uploaded by a renamed user"""
+    if not created and instance.has_changed('first_name', 'last_name', 'username'):
+        search.index_files(instance.uploaded_files.values_list('id', flat=True))
+
+
+def _subtree_file_ids(department):
+    return File.objects.filter(department__ancestor_links__ancestor=department).values_list('id', flat=True)
+
+
+@receiver(department_moved)
+def department_moved_handler(sender, department, **kwargs):
+    """Reindex the files of a subtree moved under another parent"""
+    file_ids = list(_subtree_file_ids(department))
+    visibility.refresh_files(file_ids)
+    search.index_files(file_ids)
+
+
+@receiver(post_save, sender=Department)
+def department_renamed(sender, instance, created, **kwargs):
+    """Rewrite the department paths of the subtree's files"""
+    if not created and instance.has_changed('name'):
+        search.index_files(_subtree_file_ids(instance))
+
+
+@receiver(pre_delete, sender=Department)
+def department_deleting(sender, instance, **kwargs):
+    # File.department is SET_NULL with a plain UPDATE, remember what to reindex
+    instance._file_ids = list(
+        File.objects.filter(department=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Department)
+def department_deleted(sender, instance, **kwargs):
+    file_ids = getattr(instance, '_file_ids', [])
+    visibility.refresh_files(file_ids)
+    search.index_files(file_ids)
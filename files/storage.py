@@ -0,0 +1,170 @@
+"""Media storage spread over several filesystem volumes.
+
+MEDIA_ROOT is the 'default' volume and keeps its names unprefixed, so
+existing paths stay valid. Every volume in FILES_STORAGE_VOLUMES stores its
+files under names prefixed with ``volumes/<name>/``, which is how the
+volume of a File or FileVersion is recorded in its path. A volume's files
+are served from its FILES_STORAGE_VOLUME_URLS entry, or from
+MEDIA_URL + ``volumes/<name>/`` when it has none.
+
+New blobs are placed with ``place()``, which picks a volume at random
+weighted by the free space it has above FILES_VOLUME_RESERVE. A name that
+is missing from its volume is looked up on the others, so readers that
+loaded a path just before ``rebalance_volumes`` moved it still find it.
+"""
+import os
+import random
+import shutil
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+
+DEFAULT_VOLUME = 'default'
+
+VOLUME_PREFIX = 'volumes'
+
+# Free space is sampled at most this often per volume
+USAGE_TTL = 10
+
+
+def volume_name(name):
+    """The name's volume and its path inside the volume"""
+    parts = name.replace('\\', '/').split('/', 2)
+    if len(parts) == 3 and parts[0] == VOLUME_PREFIX and parts[1] in settings.FILES_STORAGE_VOLUMES:
+        return parts[1], parts[2]
+    return DEFAULT_VOLUME, name
+
+
+def on_volume(volume, relative):
+    """Storage name of ``relative`` on ``volume``"""
+    if volume == DEFAULT_VOLUME:
+        return relative
+    return f'{VOLUME_PREFIX}/{volume}/{relative}'
+
+
+@deconstructible(path='files.storage.MultiVolumeStorage')
+class MultiVolumeStorage(Storage):
+    """FileSystemStorage per volume, chosen by the storage name's prefix"""
+
+    def __init__(self):
+        self._storages = {}
+        self._usage = {}
+
+    def volumes(self):
+        """{volume: root directory} of every configured volume"""
+        return {DEFAULT_VOLUME: str(settings.MEDIA_ROOT), **settings.FILES_STORAGE_VOLUMES}
+
+    def base_url(self, volume):
+        """Public URL the volume's files are served from"""
+        if volume == DEFAULT_VOLUME:
+            return settings.MEDIA_URL
+        return settings.FILES_STORAGE_VOLUME_URLS.get(volume, settings.MEDIA_URL + on_volume(volume, ''))
+
+    def volume_storage(self, volume):
+        key = (self.volumes()[volume], self.base_url(volume))
+        cached = self._storages.get(volume)
+        if cached is None or cached[0] != key:
+            cached = self._storages[volume] = (key, FileSystemStorage(location=key[0], base_url=key[1]))
+        return cached[1]
+
+    def _locate(self, name):
+        """(storage, path inside it) holding ``name``, falling back to the other volumes"""
+        volume, relative = volume_name(name)
+        storage = self.volume_storage(volume)
+        if storage.exists(relative):
+            return storage, relative
+        for other in self.volumes():
+            if other != volume and self.volume_storage(other).exists(relative):
+                return self.volume_storage(other), relative
+        return storage, relative
+
+    def locate(self, name):
+        """Storage name under which ``name`` currently exists, after a move by the rebalancer"""
+        storage, relative = self._locate(name)
+        for volume in self.volumes():
+            if self.volume_storage(volume) is storage:
+                return on_volume(volume, relative)
+        return name
+
+    # Capacity-aware placement
+
+    def free_space(self, volume):
+        """Bytes free on a volume above the reserve, sampled at most every USAGE_TTL seconds"""
+        sampled_at, free = self._usage.get(volume, (0, 0))
+        if time.monotonic() - sampled_at > USAGE_TTL:
+            root = self.volumes()[volume]
+            os.makedirs(root, exist_ok=True)
+            free = shutil.disk_usage(root).free
+            self._usage[volume] = (time.monotonic(), free)
+        return max(free - settings.FILES_VOLUME_RESERVE, 0)
+
+    def choose_volume(self, size=0):
+        """A volume with room for ``size`` bytes, picked at random weighted by free space"""
+        weights = {volume: self.free_space(volume) for volume in self.volumes()}
+        candidates = {volume: free for volume, free in weights.items() if free > size}
+        if not candidates:
+            # Everything is at its reserve, the emptiest volume gets it
+            return max(weights, key=weights.get)
+        volumes = list(candidates)
+        return random.choices(volumes, weights=[candidates[volume] for volume in volumes])[0]
+
+    def place(self, name, size=0):
+        """Storage name for a new file, on a volume chosen by free space"""
+        volume = self.choose_volume(size)
+        # Sampled usage lags behind, account for this file straight away
+        sampled_at, free = self._usage.get(volume, (0, 0))
+        self._usage[volume] = (sampled_at, free - size)
+        return on_volume(volume, name)
+
+    # Storage API
+
+    def _open(self, name, mode='rb'):
+        storage, relative = self._locate(name)
+        return storage.open(relative, mode)
+
+    def _save(self, name, content):
+        volume, relative = volume_name(name)
+        return on_volume(volume, self.volume_storage(volume).save(relative, content))
+
+    def get_available_name(self, name, max_length=None):
+        volume, relative = volume_name(name)
+        return on_volume(volume, self.volume_storage(volume).get_available_name(relative, max_length))
+
+    def delete(self, name):
+        volume, relative = volume_name(name)
+        self.volume_storage(volume).delete(relative)
+
+    def exists(self, name):
+        # Strict, a copy on another volume does not count
+        volume, relative = volume_name(name)
+        return self.volume_storage(volume).exists(relative)
+
+    def listdir(self, path):
+        volume, relative = volume_name(path)
+        return self.volume_storage(volume).listdir(relative)
+
+    def size(self, name):
+        storage, relative = self._locate(name)
+        return storage.size(relative)
+
+    def path(self, name):
+        storage, relative = self._locate(name)
+        return storage.path(relative)
+
+    def url(self, name):
+        volume, relative = volume_name(name)
+        return self.volume_storage(volume).url(relative)
+
+    def get_accessed_time(self, name):
+        storage, relative = self._locate(name)
+        return storage.get_accessed_time(relative)
+
+    def get_created_time(self, name):
+        storage, relative = self._locate(name)
+        return storage.get_created_time(relative)
+
+    def get_modified_time(self, name):
+        storage, relative = self._locate(name)
+        return storage.get_modified_time(relative)
@@ -0,0 +1,192 @@
+"""Sweep of media no File, FileVersion or Blob references.
+
+Each volume is walked in a fixed order, one batch of paths at a time, and
+the last path checked is saved in MediaSweepState after every batch so an
+interrupted sweep resumes where it stopped. Paths are stat()ed in a thread
+pool and checked against an in-memory set of 8-byte digests of every
+referenced storage name. A digest collision can only make an orphan look
+referenced, never the reverse, and candidates are checked against the
+database once more before they are touched.
+
+Orphans older than the grace period are moved to ``.quarantine/<date>/``
+on their own volume, and quarantined days older than the quarantine period
+are deleted by later sweeps.
+"""
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Blob, File, FileVersion, MediaSweepState
+from .storage import on_volume
+
+QUARANTINE_DIR = '.quarantine'
+
+DATE_FORMAT = '%Y%m%d'
+
+
+def _key(name):
+    return hashlib.blake2b(name.encode(), digest_size=8).digest()
+
+
+def referenced_names():
+    """Digests of every storage name a blob, file or version points to"""
+    keys = set()
+    for queryset in (
+        Blob.objects.values_list('path', flat=True),
+        File.objects.exclude(file='').exclude(file__isnull=True).values_list('file', flat=True),
+        FileVersion.objects.exclude(file_data='').values_list('file_data', flat=True),
+    ):
+        for name in queryset.iterator(chunk_size=5000):
+            keys.add(_key(name))
+    return keys
+
+
+def still_referenced(names):
+    """The names the database references, checked exactly"""
+    return (
+        set(Blob.objects.filter(path__in=names).values_list('path', flat=True))
+        | set(File.objects.filter(file__in=names).values_list('file', flat=True))
+        | set(FileVersion.objects.filter(file_data__in=names).values_list('file_data', flat=True))
+    )
+
+
+def _excluded(root):
+    """Directories inside a volume that hold no stored files"""
+    excluded = {os.path.join(root, QUARANTINE_DIR)}
+    # Other volumes and the cold root may be mounted inside this one
+    others = [path for path in default_storage.volumes().values() if os.path.abspath(path) != root]
+    for path in (settings.FILES_UPLOAD_TEMP_DIR, settings.FILES_COLD_ROOT, *others):
+        excluded.add(os.path.abspath(path))
+    return excluded
+
+
+def walk(root, after=''):
+    """Relative paths of the files under ``root`` in component order, starting after ``after``"""
+    after_parts = tuple(after.split('/')) if after else ()
+    excluded = _excluded(root)
+
+    def visit(directory, parts):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path_parts = parts + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.abspath(entry.path) in excluded:
+                    continue
+                # Skip subtrees that sort entirely before the resume point
+                if path_parts < after_parts[:len(path_parts)]:
+                    continue
+                yield from visit(entry.path, path_parts)
+            elif entry.is_file(follow_symlinks=False) and path_parts > after_parts:
+                yield '/'.join(path_parts)
+
+    yield from visit(root, ())
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def quarantine(root, relative, today):
+    target = os.path.join(root, QUARANTINE_DIR, today, relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(os.path.join(root, relative), target)
+
+
+def purge_quarantine(root, older_than):
+    """Delete quarantined days before ``older_than``, returns the bytes freed"""
+    quarantine_root = os.path.join(root, QUARANTINE_DIR)
+    freed = 0
+    if not os.path.isdir(quarantine_root):
+        return freed
+    for day in os.listdir(quarantine_root):
+        try:
+            if datetime.strptime(day, DATE_FORMAT).date() >= older_than:
+                continue
+        except ValueError:
+            continue
+        for directory, _, filenames in os.walk(os.path.join(quarantine_root, day)):
+            freed += sum(os.path.getsize(os.path.join(directory, name)) for name in filenames)
+        shutil.rmtree(os.path.join(quarantine_root, day))
+    return freed
+
+
+class SweepResult:
+    def __init__(self):
+        self.scanned = 0
+        self.orphans = 0
+        self.orphan_bytes = 0
+        self.purged_bytes = 0
+        self.complete = True
+
+
+def sweep(batch_size=1000, workers=8, grace=timedelta(hours=1), quarantine_for=timedelta(days=7),
+          dry_run=False, max_batches=None, log=None):
+    """Sweep every volume once, resuming each from its saved position"""
+    result = SweepResult()
+    references = referenced_names()
+    cutoff = (timezone.now() - grace).timestamp()
+    today = timezone.localdate()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-sweep') as executor:
+        for volume, root in default_storage.volumes().items():
+            root = os.path.abspath(root)
+            state, _ = MediaSweepState.objects.get_or_create(volume=volume)
+            # Dry runs always look at the whole volume and leave the saved position alone
+            paths = walk(root, after='' if dry_run else state.position)
+            batches = 0
+            while True:
+                batch = list(islice(paths, batch_size))
+                if not batch:
+                    if not dry_run:
+                        state.position = ''
+                        state.passes += 1
+                        state.save()
+                    break
+
+                stats = executor.map(_stat, [os.path.join(root, relative) for relative in batch])
+                candidates = {}
+                for relative, stat in zip(batch, stats):
+                    result.scanned += 1
+                    name = on_volume(volume, relative)
+                    if stat is None or stat.st_mtime > cutoff or _key(name) in references:
+                        continue
+                    candidates[name] = (relative, stat.st_size)
+
+                referenced = still_referenced(list(candidates)) if candidates else set()
+                for name, (relative, size) in candidates.items():
+                    if name in referenced:
+                        continue
+                    result.orphans += 1
+                    result.orphan_bytes += size
+                    if log:
+                        log(f'{name} ({size} bytes)')
+                    if not dry_run:
+                        try:
+                            quarantine(root, relative, today.strftime(DATE_FORMAT))
+                        except FileNotFoundError:
+                            pass
+
+                if not dry_run:
+                    state.position = batch[-1]
+                    state.save(update_fields=['position', 'updated_at'])
+                batches += 1
+                if max_batches and batches >= max_batches:
+                    result.complete = False
+                    break
+
+            if not dry_run:
+                result.purged_bytes += purge_quarantine(root, today - quarantine_for)
+    return result
@@ -1,3 +1,1146 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopUpload
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from departments.models import Department
+
+from . import (
+    activity, callbacks, documentserver, downloads, sweeper, tiering, uploadhandlers, visibility, volumes,
+    workbooks
+)
+from .models import (
+    Blob, ColdPack, File, FileActivity, FileContent, FilePermission, FileVersion, FileVisibility,
+    MediaSweepState, OnlyOfficeCallbackJob
+)
+
+
+class MediaTestCase(TestCase):
+    """Stores files under a temporary MEDIA_ROOT removed after each test"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(
+            SECURE_SSL_REDIRECT=False,
+            FILE_EXTRACTION_WORKERS=0,
+            MEDIA_ROOT=self.media_root,
+            FILES_UPLOAD_TEMP_DIR=f'{self.media_root}/tmp',
+            FILES_STORAGE_VOLUMES={},
+            FILES_COLD_ROOT=f'{self.media_root}/cold',
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.department = Department.objects.create(name='Audit')
+        self.user = get_user_model().objects.create_user(
+            username='editor', email='editor@example.com', password='password', department=self.department
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **fields):
+        return self.client.post('/api/files/', {'name': name, 'file': SimpleUploadedFile(name, content), **fields})
+
+
+class FileVisibilityTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outsider = get_user_model().objects.create_user(
+            username='outsider', email='outsider@example.com', password='password',
+            department=Department.objects.create(name='Legal')
+        )
+        self.file = File.objects.create(
+            name='Report', file_type='other', uploaded_by=self.user, department=self.department
+        )
+
+    def listed(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/files/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_department_members_and_grantees_see_files(self):
+        colleague = get_user_model().objects.create_user(
+            username='colleague', email='colleague@example.com', password='password', department=self.department
+        )
+        self.assertEqual(self.listed(self.user), [self.file.id])
+        self.assertEqual(self.listed(colleague), [self.file.id])
+        self.assertEqual(self.listed(self.outsider), [])
+
+        permission = FilePermission.objects.create(
+            file=self.file, user=self.outsider, permission_type='read', granted_by=self.user
+        )
+        self.assertEqual(self.listed(self.outsider), [self.file.id])
+
+        permission.delete()
+        self.assertEqual(self.listed(self.outsider), [])
+
+    def test_reassigned_permissions_drop_the_old_pair(self):
+        permission = FilePermission.objects.create(
+            file=self.file, user=self.outsider, permission_type='read', granted_by=self.user
+        )
+        other = File.objects.create(name='Other', file_type='other', uploaded_by=self.user, department=self.department)
+
+        permission = FilePermission.objects.get(id=permission.id)
+        permission.file = other
+        permission.save()
+
+        self.assertEqual(self.listed(self.outsider), [other.id])
+
+    def test_department_members_cannot_change_files_they_only_see(self):
+        colleague = get_user_model().objects.create_user(
+            username='colleague', email='colleague@example.com', password='password', department=self.department
+        )
+        self.client.force_authenticate(colleague)
+
+        self.assertEqual(self.client.get(f'/api/files/{self.file.id}/').status_code, 200)
+        self.assertEqual(self.client.patch(f'/api/files/{self.file.id}/', {'name': 'Renamed'}).status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/files/{self.file.id}/').status_code, 404)
+        self.assertTrue(File.objects.filter(id=self.file.id, name='Report').exists())
+
+        FilePermission.objects.create(file=self.file, user=colleague, permission_type='write', granted_by=self.user)
+        self.assertEqual(self.client.patch(f'/api/files/{self.file.id}/', {'name': 'Renamed'}).status_code, 200)
+
+    def test_rebuilt_index_matches_incremental_one(self):
+        FilePermission.objects.create(file=self.file, user=self.outsider, permission_type='write', granted_by=self.user)
+        rows = set(FileVisibility.objects.values_list('user_id', 'file_id', 'access_level', 'is_owner', 'is_shared'))
+
+        visibility.rebuild_index()
+
+        self.assertEqual(
+            set(FileVisibility.objects.values_list('user_id', 'file_id', 'access_level', 'is_owner', 'is_shared')),
+            rows
+        )
+
+
+class FileAccessAnnotationTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='password'
+        )
+
+    def access(self, file_obj, user):
+        annotated = File.objects.with_access(user).get(id=file_obj.id)
+        return annotated.user_can_view, annotated.user_can_edit
+
+    def test_access_levels(self):
+        file_obj = File.objects.create(name='Report', file_type='other', uploaded_by=self.user)
+        self.assertEqual(self.access(file_obj, self.user), (True, True))
+        self.assertEqual(self.access(file_obj, self.other), (False, False))
+
+        for level, expected in (('read', (True, False)), ('write', (True, True)), ('admin', (True, True))):
+            FilePermission.objects.update_or_create(
+                file=file_obj, user=self.other, defaults={'permission_type': level, 'granted_by': self.user}
+            )
+            self.assertEqual(self.access(file_obj, self.other), expected, level)
+
+    def test_listing_queries_do_not_grow_with_files(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/api/files/').status_code, 200)
+            return len(queries)
+
+        for number in range(2):
+            File.objects.create(name=f'Report {number}', file_type='other', uploaded_by=self.user)
+        few = list_queries()
+        for number in range(2, 6):
+            File.objects.create(name=f'Report {number}', file_type='other', uploaded_by=self.user)
+
+        self.assertEqual(list_queries(), few)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ManagerVisibilityTests(TestCase):
+    def setUp(self):
+        self.parent = Department.objects.create(name='Audit')
+        self.child = Department.objects.create(name='Team', parent=self.parent)
+        self.grandchild = Department.objects.create(name='Unit', parent=self.child)
+        self.manager = get_user_model().objects.create_user(
+            username='manager', email='manager@example.com', password='password',
+            role='manager', department=self.parent
+        )
+        owner = get_user_model().objects.create_user(
+            username='owner', email='owner@example.com', password='password', department=self.grandchild
+        )
+        self.child_file = File.objects.create(name='Child', file_type='other', uploaded_by=owner, department=self.child)
+        self.grandchild_file = File.objects.create(
+            name='Grandchild', file_type='other', uploaded_by=owner, department=self.grandchild
+        )
+
+    def visible(self):
+        return set(FileVisibility.objects.filter(user=self.manager).values_list('file_id', flat=True))
+
+    def test_managers_see_direct_child_departments_only(self):
+        self.assertEqual(self.visible(), {self.child_file.id})
+
+        visibility.refresh_user(self.manager)
+        self.assertEqual(self.visible(), {self.child_file.id})
+
+    def test_moving_a_department_updates_manager_visibility(self):
+        self.grandchild.parent = self.parent
+        self.grandchild.save()
+
+        self.assertEqual(self.visible(), {self.child_file.id, self.grandchild_file.id})
+
+
+class FileActivityStatsTests(MediaTestCase):
+    def test_uploads_are_rolled_up(self):
+        self.assertEqual(self.upload('report.txt', b'content', department=self.department.id).status_code, 201)
+
+        response = self.client.get('/api/files/stats/activity/?days=7')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['uploads'], 1)
+
+    def test_days_must_be_positive(self):
+        for days in ('0', '-5', 'week'):
+            response = self.client.get(f'/api/files/stats/activity/?days={days}')
+            self.assertEqual(response.status_code, 400, days)
+
+    def test_managers_roll_up_direct_child_departments_only(self):
+        child = Department.objects.create(name='Team', parent=self.department)
+        grandchild = Department.objects.create(name='Unit', parent=child)
+        today = timezone.localdate()
+        for department in (self.department, child, grandchild):
+            FileActivity.objects.create(day=today, department=department, file_type='other', status='draft', uploads=1)
+        self.user.role = 'manager'
+        self.user.save()
+
+        response = self.client.get('/api/files/stats/activity/?days=7')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['uploads'], 2)
+
+
+class MetadataSearchTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = File.objects.create(
+            name='Quarterly report', description='Revenue figures', file_type='other',
+            uploaded_by=self.user, department=self.department
+        )
+        File.objects.create(name='Minutes', file_type='other', uploaded_by=self.user, department=self.department)
+
+    def search(self, query):
+        response = self.client.get('/api/files/search/', {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_terms_match_prefixes_of_every_field(self):
+        for query in ('quart', 'Quarterly REPORT', 'revenue fig', 'audit', 'editor'):
+            self.assertIn(self.report.id, self.search(query), query)
+        self.assertEqual(self.search('quarterly minutes'), [])
+
+    def test_index_follows_renames(self):
+        self.report.name = 'Annual summary'
+        self.report.save()
+
+        self.assertEqual(self.search('quarterly'), [])
+        self.assertEqual(self.search('annual'), [self.report.id])
+
+
+class ContentSearchTests(MediaTestCase):
+    def search(self, query):
+        response = self.client.get('/api/files/content-search/', {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_uploaded_text_is_searchable(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload('notes.txt', b'The <b>reconciliation</b> of ledger balances', department=self.department.id)
+
+        results = self.search('reconcil ledger')
+
+        self.assertEqual([item['name'] for item in results], ['notes.txt'])
+        self.assertIn('<mark>reconciliation</mark>', results[0]['snippet'])
+        self.assertNotIn('<b>', results[0]['snippet'])
+        self.assertEqual(self.search('payroll'), [])
+
+    def extract(self, *args):
+        call_command('extract_file_contents', *args, stdout=io.StringIO())
+
+    def test_lost_extractions_are_recovered_without_rehashing(self):
+        # No on_commit callbacks run, so the upload is hashed but never extracted
+        self.upload('notes.txt', b'Ledger reconciliation', department=self.department.id)
+        content_hash = File.objects.get().content_hash
+        self.assertEqual(self.search('ledger'), [])
+
+        self.extract()
+
+        self.assertEqual([item['name'] for item in self.search('ledger')], ['notes.txt'])
+
+        self.extract('--all')
+
+        self.assertEqual(File.objects.get().content_hash, content_hash)
+        self.assertEqual([item['name'] for item in self.search('ledger')], ['notes.txt'])
+
+    def test_cold_content_is_extracted_from_its_pack(self):
+        self.upload('notes.txt', b'Archived ledger balances', department=self.department.id, status='archived')
+        file_obj = File.objects.select_related('blob').get()
+        with self.captureOnCommitCallbacks(execute=True):
+            tiering.freeze(file_obj.blob)
+
+        self.extract()
+
+        self.assertEqual(FileContent.objects.get(content_hash=file_obj.content_hash).text, 'Archived ledger balances')
+        self.assertEqual(Blob.objects.get(id=file_obj.blob_id).tier, 'cold')
+
+
+class SearchFacetTests(MediaTestCase):
+    def test_facets_count_the_filtered_results(self):
+        legal = Department.objects.create(name='Legal')
+        for name, department, file_status in (
+            ('Budget draft', self.department, 'draft'),
+            ('Budget final', self.department, 'approved'),
+            ('Budget review', legal, 'draft'),
+            ('Minutes', self.department, 'draft'),
+        ):
+            File.objects.create(
+                name=name, file_type='other', status=file_status, uploaded_by=self.user, department=department
+            )
+
+        response = self.client.get('/api/files/search/', {'query': 'budget'})
+
+        self.assertEqual(response.status_code, 200)
+        facets = response.data['facets']
+        self.assertEqual(facets['status'], [{'value': 'draft', 'count': 2}, {'value': 'approved', 'count': 1}])
+        self.assertEqual(facets['department'], [
+            {'id': self.department.id, 'name': 'Audit', 'count': 2},
+            {'id': legal.id, 'name': 'Legal', 'count': 1},
+        ])
+        self.assertEqual(sum(month['count'] for month in facets['month']), 3)
+
+
+class CursorPaginationTests(MediaTestCase):
+    def test_my_files_pages_carry_exact_count(self):
+        for number in range(3):
+            self.upload(f'report-{number}.txt', b'content', department=self.department.id)
+
+        response = self.client.get('/api/files/my-files/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([item['name'] for item in response.data['results']], ['report-2.txt', 'report-1.txt'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['name'] for item in response.data['results']], ['report-0.txt'])
+        self.assertIsNone(response.data['next'])
+
+    def test_estimated_count(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+
+        response = self.client.get('/api/files/my-files/?count=estimate')
+
+        self.assertEqual(response.data['count'], 1)
+
+    def test_versions_are_paginated(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        file_obj = File.objects.get(name='report.txt')
+        for _ in range(2):
+            file_obj.version += 1
+            file_obj.save()
+            file_obj.create_version(self.user)
+
+        response = self.client.get(f'/api/files/{file_obj.id}/versions/?page_size=1')
+
+        self.assertEqual(response.data['count'], FileVersion.objects.filter(file=file_obj).count())
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+
+@override_settings(FILES_MAX_UPLOAD_SIZE=1024)
+class UploadHandlerTests(MediaTestCase):
+    def new_file(self, handler, name, size):
+        handler.new_file('file', name, 'application/octet-stream', size)
+
+    def test_rejected_upload_stops_the_request(self):
+        handler = uploadhandlers.StreamingHashUploadHandler(RequestFactory().post('/api/files/'))
+
+        with self.assertRaises(StopUpload) as raised:
+            self.new_file(handler, 'large.txt', 2048)
+
+        self.assertTrue(raised.exception.connection_reset)
+        self.assertEqual(handler.request.upload_rejections[0][1], 'large.txt')
+
+    def test_bulk_upload_skips_rejected_files(self):
+        handler = uploadhandlers.BulkUploadHandler(RequestFactory().post('/api/files/bulk/'))
+
+        with self.assertRaises(SkipFile):
+            self.new_file(handler, 'script.exe', 10)
+
+    def test_rejected_upload(self):
+        for name, content in (('large.txt', b'x' * 2048), ('script.exe', b'x')):
+            response = self.upload(name, content)
+            self.assertEqual(response.status_code, 400, name)
+            self.assertIn('error', response.data)
+        self.assertFalse(File.objects.exists())
+
+    def test_bulk_upload_reports_each_file(self):
+        response = self.client.post('/api/files/bulk/', {'files': [
+            SimpleUploadedFile('script.exe', b'x'),
+            SimpleUploadedFile('report.txt', b'content'),
+        ]})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['rejected']), (1, 1))
+
+
+class BlobStoreTests(MediaTestCase):
+    def references(self, blob):
+        return File.objects.filter(blob=blob).count() + FileVersion.objects.filter(blob=blob).count()
+
+    def test_identical_content_is_stored_once(self):
+        for name in ('report.txt', 'copy.txt'):
+            self.upload(name, b'same content', department=self.department.id)
+        first, second = File.objects.select_related('blob').order_by('id')
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(Blob.objects.count(), 1)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, self.references(blob))
+        self.assertGreaterEqual(blob.ref_count, 2)
+
+    def test_unreferenced_blobs_are_collected(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        file_obj = File.objects.select_related('blob').get()
+        path = default_storage.path(file_obj.blob.path)
+
+        file_obj.delete()
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Blob.objects.collect(older_than=timezone.now() + timedelta(seconds=1)), 1)
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_saves_without_new_content_do_not_load_the_blob(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        file_obj = File.objects.get()
+
+        file_obj.description = 'Checked'
+        with CaptureQueriesContext(connection) as queries:
+            file_obj.save()
+
+        self.assertFalse([query for query in queries if 'files_blob' in query['sql']])
+        self.assertEqual(File.objects.get().file_size, len(b'content'))
+
+
+class ResumableUploadTests(MediaTestCase):
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post('/api/files/uploads/', {
+            'filename': 'report.txt',
+            'size': len(self.content),
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+            'department': self.department.id,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/files/uploads/{response.data['id']}/"
+
+    def put(self, offset, data, sha256=None):
+        headers = {'HTTP_X_CHUNK_SHA256': sha256} if sha256 else {}
+        return self.client.generic(
+            'PUT', f'{self.url}?offset={offset}', data, content_type='application/octet-stream', **headers
+        )
+
+    def test_chunks_in_any_order(self):
+        self.assertEqual(self.put(50, self.content[50:]).data['missing'], [(0, 50)])
+        self.assertEqual(self.put(0, self.content[:50]).data['missing'], [])
+
+        response = self.client.post(f'{self.url}complete/')
+
+        self.assertEqual(response.status_code, 201)
+        with File.objects.get().file.open('rb') as content:
+            self.assertEqual(content.read(), self.content)
+
+    def test_failed_rewrite_is_missing_again(self):
+        self.put(0, self.content[:50])
+
+        response = self.put(0, b'x' * 50, sha256=hashlib.sha256(self.content[:50]).hexdigest())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).data['received'], [])
+        self.put(0, self.content[:50])
+        self.put(50, self.content[50:])
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 201)
+
+
+class BulkUploadTests(MediaTestCase):
+    def archive(self, entries):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in entries.items():
+                archive.writestr(name, content)
+        return SimpleUploadedFile('upload.zip', buffer.getvalue())
+
+    def test_archive_entries_are_ingested(self):
+        response = self.client.post('/api/files/bulk/', {
+            'archive': self.archive({
+                'reports/q1.txt': b'first quarter',
+                '../escape.txt': b'outside',
+                'tool.exe': b'binary',
+                '__MACOSX/._q1.txt': b'metadata',
+            }),
+            'department': self.department.id,
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['rejected']), (2, 1))
+        self.assertEqual(
+            sorted(File.objects.values_list('name', 'department_id')),
+            [('escape', self.department.id), ('q1', self.department.id)]
+        )
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.media_root), 'escape.txt')))
+
+    @override_settings(FILES_BULK_MAX_ENTRIES=2)
+    def test_entry_limit(self):
+        response = self.client.post('/api/files/bulk/', {
+            'archive': self.archive({f'{number}.txt': b'x' for number in range(3)}),
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.exists())
+
+
+class ArchiveDownloadTests(MediaTestCase):
+    def download(self, **data):
+        response = self.client.post('/api/files/archive/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.addCleanup(archive.close)
+        return archive
+
+    def test_department_archive_keeps_names_inside_its_folders(self):
+        child = Department.objects.create(name='../Team', parent=self.department)
+        for name, department, content in (
+            ('Summary', self.department, b'summary'),
+            ('Summary', self.department, b'other summary'),
+            ('../../passwd', child, b'team'),
+        ):
+            File.objects.create(
+                name=name, file=SimpleUploadedFile('upload.txt', content), uploaded_by=self.user, department=department
+            )
+
+        archive = self.download(department=self.department.id)
+
+        names = archive.namelist()
+        self.assertEqual(names, [
+            'Audit/Summary.txt', 'Audit/Summary (2).txt', 'Audit/.._Team/.._.._passwd.txt', 'manifest.json'
+        ])
+        self.assertEqual(archive.read('Audit/.._Team/.._.._passwd.txt'), b'team')
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(
+            {entry['path']: entry['sha256'] for entry in manifest['files']}['Audit/Summary.txt'],
+            hashlib.sha256(b'summary').hexdigest()
+        )
+
+    def test_selection_skips_files_the_user_cannot_view(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='password')
+        hidden = File.objects.create(name='Hidden', file_type='other', uploaded_by=other)
+        report = File.objects.get(name='report.txt')
+
+        archive = self.download(file_ids=[report.id, hidden.id])
+
+        self.assertEqual(archive.namelist(), ['report.txt.txt', 'manifest.json'])
+        self.assertEqual(json.loads(archive.read('manifest.json'))['skipped'], [hidden.id])
+
+    def test_manifest_hashes_the_streamed_bytes(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        File.objects.update(content_hash='0' * 64)
+
+        archive = self.download(department=self.department.id)
+
+        entry, = json.loads(archive.read('manifest.json'))['files']
+        self.assertEqual(entry['sha256'], hashlib.sha256(b'content').hexdigest())
+        self.assertIn('error', entry)
+
+
+class FileDownloadTests(MediaTestCase):
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        super().setUp()
+        self.upload('report.txt', self.content, department=self.department.id)
+        self.url = f"/api/files/{File.objects.get().id}/download/"
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_whole_file_with_etag(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_byte_ranges(self):
+        for header, status_code, body in (
+            ('bytes=10-19', 206, self.content[10:20]),
+            ('bytes=-5', 206, self.content[-5:]),
+            ('bytes=95-', 206, self.content[95:]),
+            ('bytes=0-1,5-6', 200, self.content),
+        ):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, status_code, header)
+            self.assertEqual(b''.join(response.streaming_content), body, header)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=10-19').get('Content-Range'), 'bytes 10-19/100')
+
+        response = self.get(HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale-1"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+
+class SignedDownloadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload('report.txt', b'content', department=self.department.id)
+        self.file = File.objects.get()
+
+    def test_signed_url_downloads_without_authentication(self):
+        url = self.client.get(f'/api/files/{self.file.id}/download-url/').data['url']
+
+        response = APIClient().get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'content')
+
+    def test_forged_and_expired_tokens(self):
+        token = downloads.signed_token(self.file)
+        self.assertEqual(APIClient().get(f'/api/files/signed/{token[:-2]}xx/').status_code, 403)
+
+        with mock.patch('files.downloads.time.time', return_value=time.time() + settings.FILES_SIGNED_URL_TTL + 1):
+            self.assertEqual(APIClient().get(f'/api/files/signed/{token}/').status_code, 403)
+
+    @override_settings(FILES_SERVE_MODE='nginx', FILES_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_proxy_offload(self):
+        response = self.client.get(f'/api/files/{self.file.id}/download/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.file.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+class VolumeRebalanceTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(3):
+            self.upload(f'report-{number}.txt', f'{number}'.encode() * 100, department=self.department.id)
+        # Added after the uploads, so everything starts on the default volume
+        second = self.settings(FILES_STORAGE_VOLUMES={'second': f'{self.media_root}/second'})
+        second.enable()
+        self.addCleanup(second.disable)
+
+    def contents(self):
+        result = {}
+        for file_obj in File.objects.select_related('blob'):
+            with file_obj.file.open('rb') as content:
+                result[file_obj.name] = (file_obj.blob.volume, content.read())
+        return result
+
+    def test_move_blob(self):
+        file_obj = File.objects.select_related('blob').get(name='report-0.txt')
+        old_path = default_storage.path(file_obj.blob.path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(volumes.move_blob(file_obj.blob, 'second'))
+
+        self.assertEqual(self.contents()['report-0.txt'], ('second', b'0' * 100))
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_rebalance_moves_from_the_fullest_volume(self):
+        usage = {'default': (900, 1000), 'second': (100, 1000)}
+        with mock.patch('files.volumes.usage', return_value=usage), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(volumes.rebalance(dry_run=True), (3, 300))
+            self.assertEqual({volume for volume, _ in self.contents().values()}, {'default'})
+
+            self.assertEqual(volumes.rebalance(), (3, 300))
+
+        self.assertEqual(self.contents(), {
+            f'report-{number}.txt': ('second', f'{number}'.encode() * 100) for number in range(3)
+        })
+
+    def test_urls_follow_the_volume(self):
+        file_obj = File.objects.select_related('blob').get(name='report-0.txt')
+        self.assertEqual(file_obj.file.url, f'/media/{file_obj.blob.path}')
+        with self.captureOnCommitCallbacks(execute=True):
+            volumes.move_blob(file_obj.blob, 'second')
+        name = Blob.objects.get(id=file_obj.blob_id).path
+
+        self.assertTrue(name.startswith('volumes/second/'))
+        self.assertEqual(default_storage.url(name), f'/media/{name}')
+        with self.settings(FILES_STORAGE_VOLUME_URLS={'second': 'https://cdn.example.com/second/'}):
+            self.assertEqual(
+                default_storage.url(name),
+                'https://cdn.example.com/second/' + name.removeprefix('volumes/second/')
+            )
+
+
+class ColdTierTests(MediaTestCase):
+    def archived(self, name, content):
+        self.upload(name, content, department=self.department.id, status='archived')
+        return File.objects.select_related('blob').get(name=name)
+
+    def test_freeze_and_rehydrate(self):
+        files = [self.archived(f'report-{number}.txt', f'archived {number} '.encode() * 100) for number in range(2)]
+        self.assertEqual(set(tiering.eligible()), {file_obj.blob for file_obj in files})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for file_obj in files:
+                self.assertGreater(tiering.freeze(file_obj.blob), 0)
+
+        blobs = Blob.objects.filter(id__in=[file_obj.blob_id for file_obj in files]).order_by('pack_offset')
+        self.assertEqual([blob.tier for blob in blobs], ['cold', 'cold'])
+        self.assertEqual(blobs[1].pack_offset, blobs[0].pack_length)
+        self.assertEqual(ColdPack.objects.get().size, blobs[0].pack_length + blobs[1].pack_length)
+        self.assertFalse(os.path.exists(default_storage.path(files[0].blob.path)))
+        with tiering.open_content(File.objects.get(id=files[1].id)) as content:
+            self.assertEqual(content.read(), b'archived 1 ' * 100)
+
+        response = self.client.get(f'/api/files/{files[0].id}/download/')
+
+        self.assertEqual(b''.join(response.streaming_content), b'archived 0 ' * 100)
+        self.assertEqual(Blob.objects.get(id=files[0].blob_id).tier, 'hot')
+        self.assertTrue(os.path.exists(default_storage.path(files[0].blob.path)))
+
+    def test_concurrent_rehydrations_swap_in_one_copy(self):
+        file_obj = self.archived('report.txt', b'archived ' * 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            tiering.freeze(file_obj.blob)
+        read = tiering.ColdReader.read
+        racing = []
+
+        def read_and_race(reader, size=-1):
+            if not racing:
+                # Another reader finishes while this one is still decompressing
+                racing.append(True)
+                tiering.rehydrate(file_obj.blob_id)
+            return read(reader, size)
+
+        with mock.patch.object(tiering.ColdReader, 'read', read_and_race):
+            tiering.rehydrate(file_obj.blob_id)
+
+        hot_path = default_storage.path(file_obj.blob.path)
+        with open(hot_path, 'rb') as content:
+            self.assertEqual(content.read(), b'archived ' * 100)
+        self.assertEqual(Blob.objects.get(id=file_obj.blob_id).tier, 'hot')
+        self.assertEqual(os.listdir(os.path.dirname(hot_path)), [os.path.basename(hot_path)])
+
+
+class MediaSweepTests(MediaTestCase):
+    def write(self, relative, age=timedelta(days=1)):
+        path = os.path.join(self.media_root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as orphan:
+            orphan.write(b'orphan')
+        modified = (timezone.now() - age).timestamp()
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_old_orphans_are_quarantined(self):
+        self.upload('report.txt', b'content', department=self.department.id)
+        stored = default_storage.path(File.objects.get().file.name)
+        old = self.write('blobs/ab/orphan.txt')
+        recent = self.write('blobs/ab/recent.txt', age=timedelta(0))
+        temporary = self.write('tmp/upload.part')
+        expired = self.write(f'{sweeper.QUARANTINE_DIR}/20000101/blobs/old.txt')
+
+        result = sweeper.sweep(workers=2)
+
+        self.assertEqual((result.orphans, result.orphan_bytes), (1, len(b'orphan')))
+        self.assertFalse(os.path.exists(old))
+        today = timezone.localdate().strftime(sweeper.DATE_FORMAT)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.media_root, sweeper.QUARANTINE_DIR, today, 'blobs/ab/orphan.txt')
+        ))
+        self.assertFalse(os.path.exists(expired))
+        for path in (stored, recent, temporary):
+            self.assertTrue(os.path.exists(path), path)
+
+    def test_interrupted_sweep_resumes(self):
+        for name in ('a', 'b', 'c'):
+            self.write(f'blobs/{name}.txt')
+
+        first = sweeper.sweep(batch_size=1, max_batches=1)
+        self.assertFalse(first.complete)
+        self.assertEqual(MediaSweepState.objects.get().position, 'blobs/a.txt')
+
+        rest = sweeper.sweep(batch_size=1)
+        self.assertTrue(rest.complete)
+        self.assertEqual((first.orphans, rest.orphans), (1, 2))
+        self.assertEqual(MediaSweepState.objects.get().passes, 1)
+
+
+class WorkbookSheetInfoTests(TestCase):
+    WORKBOOK = (
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<bookViews><workbookView activeTab="1"/></bookViews>'
+        '<sheets><sheet name="Summary" sheetId="1"/><sheet name="Q1" sheetId="2"/><sheet name="Q2" sheetId="3"/></sheets>'
+        '</workbook>'
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def workbook(self, parts):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in parts.items():
+                archive.writestr(name, content)
+        return buffer.getvalue()
+
+    def test_sheets_and_active_sheet(self):
+        content = self.workbook({'xl/workbook.xml': self.WORKBOOK, 'xl/worksheets/sheet1.xml': 'x' * 10000})
+
+        info = workbooks.sheet_info(content)
+
+        self.assertEqual(info, workbooks.SheetInfo(('Summary', 'Q1', 'Q2'), 'Q1'))
+        with mock.patch('files.workbooks._read') as read:
+            self.assertEqual(workbooks.sheet_info(content), info)
+        read.assert_not_called()
+
+    def test_not_a_workbook(self):
+        for content in (self.workbook({'xl/styles.xml': '<styleSheet/>'}), b'not a zip'):
+            with self.assertRaises(workbooks.WorkbookError):
+                workbooks.sheet_info(content)
+
+    def test_apply_keeps_the_last_active_sheet(self):
+        file_obj = File(last_active_sheet='Q2')
+        info = workbooks.SheetInfo(('Summary', 'Q1', 'Q2'), 'Q1')
+
+        self.assertEqual(workbooks.apply(file_obj, info), ['sheet_count', 'has_multiple_sheets'])
+        self.assertEqual(file_obj.last_active_sheet, 'Q2')
+        self.assertEqual(workbooks.apply(file_obj, info, track_active=True), ['last_active_sheet'])
+        self.assertEqual(file_obj.last_active_sheet, 'Q1')
+
+
+class FakeDocumentServer:
+    """Local HTTP server standing in for the Document Server's document downloads
+
+    ``documents`` maps paths to bytes. Paths starting with /slow/ stall
+    before answering, paths starting with /chunked/ are sent without a
+    Content-Length.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, as it does past the size limit
+                    pass
+
+            def do_GET(self):
+                server.connections.add(self.client_address)
+                if self.path.startswith('/slow/'):
+                    time.sleep(1)
+                body = server.documents.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if self.path.startswith('/chunked/'):
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for start in range(0, len(body), 1024):
+                        chunk = body[start:start + 1024]
+                        self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+                    self.wfile.write(b'0\r\n\r\n')
+                else:
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@override_settings(ONLYOFFICE_DOWNLOAD_READ_TIMEOUT=0.2, ONLYOFFICE_DOWNLOAD_MAX_SIZE=64 * 1024)
+class DocumentServerTestCase(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = FakeDocumentServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+
+class DocumentServerClientTests(DocumentServerTestCase):
+    def test_download_streams_and_hashes(self):
+        body = b'edited document ' * 1000
+        self.server.documents['/chunked/doc.docx'] = body
+
+        download = documentserver.download(self.server.url('/chunked/doc.docx'), 'doc.docx')
+        self.addCleanup(download.upload.close)
+
+        self.assertEqual(download.size, len(body))
+        self.assertEqual(download.sha256, hashlib.sha256(body).hexdigest())
+        self.assertEqual(download.upload.read(), body)
+        self.assertGreater(download.seconds, 0)
+
+    def test_connections_are_reused(self):
+        self.server.documents['/doc.docx'] = b'content'
+
+        for _ in range(3):
+            documentserver.download(self.server.url('/doc.docx'), 'doc.docx').upload.close()
+
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_size_limit(self):
+        self.server.documents['/large.docx'] = b'x' * (65 * 1024)
+        self.server.documents['/chunked/large.docx'] = b'x' * (65 * 1024)
+
+        for path in ('/large.docx', '/chunked/large.docx'):
+            with self.assertRaises(documentserver.DownloadError):
+                documentserver.download(self.server.url(path), 'large.docx')
+
+    def test_read_timeout(self):
+        self.server.documents['/slow/doc.docx'] = b'content'
+
+        with self.assertRaises(documentserver.DownloadError):
+            documentserver.download(self.server.url('/slow/doc.docx'), 'doc.docx')
+
+    def test_missing_document(self):
+        with self.assertRaises(documentserver.DownloadError):
+            documentserver.download(self.server.url('/missing.docx'), 'missing.docx')
+
+
+class OnlyOfficeCallbackTests(DocumentServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file = File.objects.create(
+            name='Report',
+            file=SimpleUploadedFile('report.docx', b'original'),
+            file_type='word',
+            uploaded_by=self.user,
+            department=self.department
+        )
+
+    def callback(self, path, status=2, **payload):
+        return self.client.post(
+            f'/api/files/{self.file.id}/onlyoffice-callback/',
+            {'status': status, 'key': 'key', 'url': self.server.url(path), **payload},
+            format='json'
+        )
+
+    def run_jobs(self):
+        while True:
+            job = callbacks.claim()
+            if job is None:
+                return
+            callbacks.run(job)
+
+    def test_callback_is_saved_by_worker(self):
+        self.server.documents['/edited.docx'] = b'edited'
+
+        response = self.callback('/edited.docx')
+        self.assertEqual(response.data, {'error': 0})
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 1)
+
+        job = callbacks.claim()
+        self.assertTrue(callbacks.run(job))
+
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 2)
+        with self.file.file.open('rb') as content:
+            self.assertEqual(content.read(), b'edited')
+        self.assertTrue(FileVersion.objects.filter(file=self.file, version_number=2).exists())
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.download_bytes, len(b'edited'))
+        self.assertEqual(documentserver.report()['downloads'], 1)
+
+    def test_failed_download_is_retried(self):
+        self.callback('/missing.docx')
+
+        job = callbacks.claim()
+        with self.assertLogs('files.callbacks', 'WARNING'):
+            self.assertFalse(callbacks.run(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'pending')
+        self.assertGreater(job.run_after, job.updated_at)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 1)
+        self.assertEqual(OnlyOfficeCallbackJob.objects.count(), 1)
+
+    def test_resent_callback_is_processed_once(self):
+        self.server.documents['/edited.docx'] = b'edited'
+
+        self.callback('/edited.docx')
+        self.callback('/edited.docx')
+        self.run_jobs()
+        self.callback('/edited.docx')
+        self.run_jobs()
+
+        self.assertEqual(OnlyOfficeCallbackJob.objects.count(), 1)
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 2)
+
+    def test_unchanged_document_is_skipped(self):
+        self.server.documents['/unchanged.docx'] = b'original'
+
+        self.callback('/unchanged.docx')
+        self.run_jobs()
+
+        self.assertEqual(OnlyOfficeCallbackJob.objects.get().state, 'skipped')
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 1)
+        self.assertEqual(FileVersion.objects.filter(file=self.file).count(), 0)
+
+    @override_settings(ONLYOFFICE_FORCESAVE_WINDOW=0)
+    def test_force_saves_are_coalesced(self):
+        for number in range(3):
+            self.server.documents[f'/force-{number}.docx'] = f'draft {number}'.encode()
+            self.callback(f'/force-{number}.docx', status=6)
+        self.run_jobs()
+
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 2)
+        with self.file.file.open('rb') as content:
+            self.assertEqual(content.read(), b'draft 2')
+
+    @override_settings(ONLYOFFICE_FORCESAVE_WINDOW=60)
+    def test_older_force_saves_do_not_replace_a_waiting_one(self):
+        for number in range(3):
+            self.server.documents[f'/force-{number}.docx'] = f'draft {number}'.encode()
+        self.callback('/force-0.docx', status=6, lastsave='2026-10-17T10:00:00.000Z')
+        self.callback('/force-2.docx', status=6, lastsave='2026-10-17T10:02:00.000Z')
+        # A retry of the first and a late delivery of the second force-save
+        self.callback('/force-0.docx', status=6, lastsave='2026-10-17T10:00:00.000Z')
+        self.callback('/force-1.docx', status=6, lastsave='2026-10-17T10:01:00.000Z')
+
+        job = OnlyOfficeCallbackJob.objects.get()
+        self.assertEqual(job.payload['url'], self.server.url('/force-2.docx'))
+        self.assertEqual(job.receipts.count(), 3)
+
+    def test_force_saves_count_as_edits(self):
+        self.server.documents['/force.docx'] = b'draft'
+        self.callback('/force.docx', status=6)
+        OnlyOfficeCallbackJob.objects.update(run_after=timezone.now())
+        self.run_jobs()
+        FileActivity.objects.all().delete()
+
+        activity.backfill()
+
+        totals = FileActivity.objects.aggregate(edits=Sum('edits'), versions=Sum('versions'))
+        self.assertEqual(totals, {'edits': 1, 'versions': 0})
+
+    @override_settings(ONLYOFFICE_FORCESAVE_WINDOW=0)
+    def test_document_key_survives_force_saves(self):
+        def key():
+            response = self.client.post(f'/api/files/{self.file.id}/onlyoffice-config/')
+            self.assertEqual(response.status_code, 200)
+            return response.data['document']['key']
+
+        opened = key()
+        self.assertEqual(key(), opened)
+
+        for number in range(2):
+            self.server.documents[f'/force-{number}.docx'] = f'draft {number}'.encode()
+            self.callback(f'/force-{number}.docx', status=6)
+            self.run_jobs()
+            self.assertEqual(key(), opened)
+
+        self.server.documents['/final.docx'] = b'final'
+        self.callback('/final.docx')
+        self.run_jobs()
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 4)
+        self.assertNotEqual(key(), opened)
+
+    def test_final_save_supersedes_waiting_force_saves(self):
+        self.server.documents['/force.docx'] = b'draft'
+        self.server.documents['/final.docx'] = b'final'
+
+        self.callback('/force.docx', status=6)
+        self.callback('/final.docx')
+        self.run_jobs()
+
+        self.assertEqual(
+            sorted(OnlyOfficeCallbackJob.objects.values_list('callback_status', 'state')),
+            [(2, 'done'), (6, 'skipped')]
+        )
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 2)
+
+    @override_settings(ONLYOFFICE_FORCESAVE_WINDOW=0)
+    def test_force_saves_finishing_after_the_final_save_are_skipped(self):
+        self.server.documents['/force.docx'] = b'draft'
+        self.server.documents['/final.docx'] = b'final'
+
+        # One force-save is being downloaded, another waits for its retry
+        self.callback('/force.docx', status=6, lastsave='2026-10-17T10:00:00.000Z')
+        running = callbacks.claim()
+        self.callback('/missing.docx', status=6, lastsave='2026-10-17T10:01:00.000Z')
+        with self.assertLogs('files.callbacks', 'WARNING'):
+            self.assertFalse(callbacks.run(callbacks.claim()))
+
+        self.callback('/final.docx', lastsave='2026-10-17T10:02:00.000Z')
+        self.run_jobs()
+        self.assertTrue(callbacks.run(running))
+
+        self.assertEqual(
+            sorted(OnlyOfficeCallbackJob.objects.values_list('callback_status', 'state')),
+            [(2, 'done'), (6, 'skipped'), (6, 'skipped')]
+        )
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.version, 2)
+        with self.file.file.open('rb') as content:
+            self.assertEqual(content.read(), b'final')
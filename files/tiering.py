@@ -0,0 +1,277 @@
+"""Cold storage tier for archived files and old versions.
+
+Blobs referenced only by archived files, or by versions older than
+FILES_COLD_VERSION_AGE, are compressed into append-only ColdPack files under
+FILES_COLD_ROOT and their hot copies are deleted. Each blob is a separate
+compressed frame at a known offset, so it can be read back on its own.
+zstd is used when the optional ``zstandard`` package is installed, zlib
+otherwise; the codec is recorded per pack.
+
+Reads of a cold file through the download views move it back to the hot
+tier first (``ensure_hot``), and it stays there for FILES_COLD_REHEAT_PERIOD.
+Archive exports stream cold content straight out of the pack instead.
+Every download's time to open is recorded per tier in TierAccess.
+"""
+import hashlib
+import os
+import uuid
+import zlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Blob, ColdPack, File, FileVersion, TierAccess
+from .storage import volume_name
+
+CHUNK_SIZE = 1024 * 1024
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def default_codec():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return 'zlib'
+    return 'zstd'
+
+
+def _compressor(codec):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=settings.FILES_COLD_ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(9)
+
+
+def _decompressor(codec):
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstandard is not installed, cold blobs packed with zstd cannot be read')
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+def pack_path(pack):
+    return os.path.join(settings.FILES_COLD_ROOT, pack.path)
+
+
+class ColdReader:
+    """Read-only stream of a cold blob's decompressed content"""
+
+    def __init__(self, blob):
+        self.file = open(pack_path(blob.pack), 'rb')
+        self.file.seek(blob.pack_offset)
+        self.remaining = blob.pack_length
+        self.decompressor = _decompressor(blob.pack.codec)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while self.remaining and (size < 0 or len(self.buffer) < size):
+            data = self.file.read(min(CHUNK_SIZE, self.remaining))
+            if not data:
+                break
+            self.remaining -= len(data)
+            self.buffer += self.decompressor.decompress(data)
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_stored(name, blob=None):
+    """Open stored content on whichever tier its blob is, without moving it"""
+    if blob is not None and blob.tier == 'cold':
+        return ColdReader(blob)
+    return default_storage.open(name, 'rb')
+
+
+def open_content(file_obj):
+    """Open a file's content on whichever tier it is, without moving it"""
+    return open_stored(file_obj.file.name, file_obj.blob)
+
+
+def eligible(now=None):
+    """Hot blobs that every reference allows to go cold"""
+    now = now or timezone.now()
+    active_files = File.objects.filter(blob=OuterRef('pk')).exclude(status='archived')
+    recent_versions = FileVersion.objects.filter(
+        blob=OuterRef('pk'), created_at__gte=now - settings.FILES_COLD_VERSION_AGE
+    ).exclude(file__status='archived')
+    return Blob.objects.filter(tier='hot', ref_count__gt=0).exclude(
+        rehydrated_at__gte=now - settings.FILES_COLD_REHEAT_PERIOD
+    ).exclude(Exists(active_files)).exclude(Exists(recent_versions))
+
+
+def _open_pack(codec):
+    """The pack new blobs are appended to, a new one once it is full"""
+    pack = ColdPack.objects.select_for_update().filter(
+        size__lt=settings.FILES_COLD_PACK_SIZE, codec=codec
+    ).order_by('-id').first()
+    if pack is None:
+        pack = ColdPack.objects.create(path=f'packs/{uuid.uuid4().hex}.pack', codec=codec)
+        os.makedirs(os.path.dirname(pack_path(pack)), exist_ok=True)
+    return pack
+
+
+def _compress(blob, codec):
+    """Compress a blob's hot copy into a temporary frame file, returns (path, length)"""
+    temp_dir = os.path.join(settings.FILES_COLD_ROOT, 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    frame_path = os.path.join(temp_dir, f'{uuid.uuid4().hex}.frame')
+    compressor = _compressor(codec)
+    try:
+        with default_storage.open(blob.path, 'rb') as source, open(frame_path, 'wb') as target:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                target.write(compressor.compress(chunk))
+            target.write(compressor.flush())
+            return frame_path, target.tell()
+    except Exception:
+        os.remove(frame_path)
+        raise
+
+
+def freeze(blob):
+    """Compress a hot blob into the current pack and drop its hot copy, returns the compressed size
+
+    The pack row is only locked to reserve the frame's offset, compression
+    and writing happen without holding it.
+    """
+    codec = default_codec()
+    frame_path, length = _compress(blob, codec)
+    try:
+        with transaction.atomic():
+            pack = _open_pack(codec)
+            offset = pack.size
+            ColdPack.objects.filter(id=pack.id).update(size=offset + length)
+
+        descriptor = os.open(pack_path(pack), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            with open(frame_path, 'rb') as frame:
+                position = offset
+                for chunk in iter(lambda: frame.read(CHUNK_SIZE), b''):
+                    os.pwrite(descriptor, chunk, position)
+                    position += len(chunk)
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    finally:
+        os.remove(frame_path)
+
+    with transaction.atomic():
+        if not Blob.objects.filter(id=blob.id, tier='hot', path=blob.path).update(
+            tier='cold', pack=pack, pack_offset=offset, pack_length=length
+        ):
+            # Moved or collected meanwhile, the frame is left as dead space
+            return 0
+        transaction.on_commit(lambda: default_storage.delete(blob.path))
+    return length
+
+
+def rehydrate(blob_id):
+    """Decompress a cold blob back to its hot path
+
+    The blob is decompressed and verified into a temporary file first, and
+    only locked to move that file into place and mark the blob hot.
+    """
+    blob = Blob.objects.select_related('pack').filter(id=blob_id, tier='cold').first()
+    if blob is None:
+        return
+    volume, relative = volume_name(blob.path)
+    target = default_storage.volume_storage(volume).path(relative)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = f'{target}.{uuid.uuid4().hex}.rehydrating'
+    digest = hashlib.sha256()
+    try:
+        with ColdReader(blob) as source, open(partial, 'wb') as writer:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                writer.write(chunk)
+                digest.update(chunk)
+        if digest.hexdigest() != blob.sha256:
+            raise IOError(f'Cold copy of blob {blob.id} is corrupt')
+
+        with transaction.atomic():
+            # Another reader may have brought it back, or it was moved, meanwhile
+            if not Blob.objects.select_for_update().filter(
+                id=blob.id, tier='cold', path=blob.path, pack=blob.pack, pack_offset=blob.pack_offset
+            ).exists():
+                return
+            os.replace(partial, target)
+            Blob.objects.filter(id=blob.id).update(
+                tier='hot', pack=None, pack_offset=None, pack_length=None, rehydrated_at=timezone.now()
+            )
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def ensure_hot(file_obj):
+    """Bring a file's content back to the hot tier if it is cold, returns the tier it was on"""
+    if not file_obj.blob_id:
+        return 'hot'
+    tier = Blob.objects.filter(id=file_obj.blob_id).values_list('tier', flat=True).first()
+    if tier == 'cold':
+        rehydrate(file_obj.blob_id)
+    return tier or 'hot'
+
+
+def record_access(tier, seconds, day=None):
+    """Count one read of ``tier`` taking ``seconds`` in today's latency histogram"""
+    milliseconds = seconds * 1000
+    bucket = next((bound for bound in LATENCY_BUCKETS_MS if milliseconds <= bound), 0)
+    key = {'day': day or timezone.localdate(), 'tier': tier, 'bucket_ms': bucket}
+    with transaction.atomic():
+        if TierAccess.objects.filter(**key).update(count=F('count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                TierAccess.objects.create(**key, count=1)
+        except IntegrityError:
+            TierAccess.objects.filter(**key).update(count=F('count') + 1)
+
+
+def report(since=None):
+    """Bytes per tier, bytes saved by compression and the read latency histogram per tier"""
+    tiers = {}
+    for row in Blob.objects.filter(ref_count__gt=0).values('tier').annotate(
+        original=Sum('size'), stored=Sum('pack_length')
+    ):
+        stored = row['stored'] if row['tier'] == 'cold' else row['original']
+        tiers[row['tier']] = {'bytes': row['original'] or 0, 'stored_bytes': stored or 0}
+
+    accesses = TierAccess.objects.all()
+    if since:
+        accesses = accesses.filter(day__gte=since)
+    latency = {}
+    for row in accesses.values('tier', 'bucket_ms').annotate(count=Sum('count')):
+        latency.setdefault(row['tier'], {})[row['bucket_ms']] = row['count']
+
+    cold = tiers.get('cold', {'bytes': 0, 'stored_bytes': 0})
+    return {
+        'tiers': tiers,
+        'bytes_saved': cold['bytes'] - cold['stored_bytes'],
+        'latency': {
+            tier: [
+                {'le_ms': bucket or None, 'count': buckets[bucket]}
+                for bucket in sorted(buckets, key=lambda bound: bound or float('inf'))
+            ]
+            for tier, buckets in latency.items()
+        },
+    }
@@ -0,0 +1,124 @@
+"""Streaming upload handling.
+
+Uploaded files are written chunk by chunk to FILES_UPLOAD_TEMP_DIR, which
+sits on the media volume, so storing the upload is a rename instead of a
+copy. The SHA-256 and size are computed while the chunks arrive, and the
+size and extension limits are enforced before the rest of the body is
+stored. A rejected upload stops the request without reading the rest of
+the body. Bulk uploads use BulkUploadHandler instead, which skips a
+rejected file and keeps parsing, so each file is reported on its own.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers, StopUpload
+
+
+def extension_error(file_name):
+    """Message for a file name with a disallowed extension, None if allowed"""
+    ext = file_name.lower().rsplit('.', 1)[-1]
+    allowed = settings.FILES_ALLOWED_EXTENSIONS
+    if f'.{ext}' not in allowed:
+        return f"File type '{ext}' is not allowed. Allowed types: {', '.join(allowed)}"
+    return None
+
+
+def size_error(size, limit=None):
+    """Message for a file over the upload size limit, None if within it"""
+    limit = limit or settings.FILES_MAX_UPLOAD_SIZE
+    if size > limit:
+        return f"File size cannot exceed {limit / (1024 * 1024):g}MB."
+    return None
+
+
+# Multipart field of the bulk upload endpoint that carries a ZIP archive
+ARCHIVE_FIELD = 'archive'
+
+
+def archive_error(file_name):
+    """Message for an archive upload that is not a ZIP file, None if it is"""
+    if not file_name.lower().endswith('.zip'):
+        return 'Archives must be ZIP files.'
+    return None
+
+
+def upload_rejections(request):
+    """(field name, file name, error) of every file the upload handler rejected"""
+    # Reading FILES makes sure the body has been parsed
+    request.FILES
+    return getattr(request, 'upload_rejections', [])
+
+
+def upload_rejection(request):
+    """Why the upload handler rejected the request's file, if it did"""
+    rejections = upload_rejections(request)
+    return rejections[0][2] if rejections else None
+
+
+class HashedTemporaryUploadedFile(TemporaryUploadedFile):
+    """Temporary upload in FILES_UPLOAD_TEMP_DIR that knows its SHA-256"""
+
+    sha256 = None
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        temp_dir = settings.FILES_UPLOAD_TEMP_DIR
+        os.makedirs(temp_dir, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + os.path.splitext(name)[1], dir=temp_dir)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class StreamingHashUploadHandler(FileUploadHandler):
+    """Stream uploads to disk, hashing them and enforcing the upload limits"""
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        # Created before any check, a skipped file is closed by the parser
+        self.file = HashedTemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+
+        if field_name == ARCHIVE_FIELD:
+            self.limit = settings.FILES_BULK_MAX_ARCHIVE_SIZE
+            error = archive_error(file_name)
+        else:
+            self.limit = settings.FILES_MAX_UPLOAD_SIZE
+            error = extension_error(file_name)
+        if error is None and content_length is not None:
+            error = size_error(content_length, self.limit)
+        if error:
+            self.reject(error)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        error = size_error(start + len(raw_data), self.limit)
+        if error:
+            self.reject(error)
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def record_rejection(self, error):
+        if not hasattr(self.request, 'upload_rejections'):
+            self.request.upload_rejections = []
+        self.request.upload_rejections.append((self.field_name, self.file_name, error))
+
+    def reject(self, error):
+        self.record_rejection(error)
+        # Nothing else in the request is used, so don't wait for the rest of it
+        raise StopUpload(connection_reset=True)
+
+
+class BulkUploadHandler(StreamingHashUploadHandler):
+    """Streaming upload handler that skips rejected files and parses the rest"""
+
+    def reject(self, error):
+        self.record_rejection(error)
+        # The rest of this file is read and discarded, later files are still parsed
+        raise SkipFile()
@@ -0,0 +1,152 @@
+"""Storage of resumable upload sessions.
+
+Each session owns a sparse part file of its final size. Chunks may arrive
+in any order and in parallel; each is written at its offset with its own
+file descriptor and recorded as an UploadChunk once its checksum is known.
+Completing a session checks that the chunks cover the whole file, verifies
+the whole-file checksum and hands the part file over as an upload that the
+blob store renames into place.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UploadChunk, UploadSession
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class AssembledUpload(UploadedFile):
+    """Completed part file, moved rather than copied by the storage"""
+
+    def __init__(self, path, name, size, sha256):
+        super().__init__(open(path, 'rb'), name, None, size)
+        self.sha256 = sha256
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+def extend_expiry(session):
+    session.expires_at = timezone.now() + settings.FILES_UPLOAD_SESSION_TTL
+
+
+def open_part(session):
+    """Create the session's part file at its final size"""
+    os.makedirs(os.path.dirname(session.part_path), exist_ok=True)
+    with open(session.part_path, 'wb') as part:
+        part.truncate(session.size)
+
+
+def write_chunk(session, offset, length, stream, expected_sha256=''):
+    """Write ``length`` bytes from ``stream`` at ``offset``, returns the chunk"""
+    if length <= 0 or length > settings.FILES_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 byte and {settings.FILES_UPLOAD_CHUNK_SIZE} bytes.')
+    if offset < 0 or offset + length > session.size:
+        raise UploadError('Chunk lies outside the file.')
+    if not os.path.exists(session.part_path):
+        raise UploadError('Upload session has no data, start a new one.')
+
+    digest, written = hashlib.sha256(), 0
+    descriptor = os.open(session.part_path, os.O_WRONLY)
+    try:
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            os.pwrite(descriptor, data, offset + written)
+            digest.update(data)
+            written += len(data)
+    finally:
+        os.close(descriptor)
+
+    sha256 = digest.hexdigest()
+    if written != length or (expected_sha256 and expected_sha256.lower() != sha256):
+        # A resent chunk has already overwritten what was received before
+        discard_range(session, offset, written)
+        if written != length:
+            raise UploadError(f'Expected {length} bytes, received {written}.')
+        raise UploadError('Chunk checksum mismatch.')
+
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, offset=offset, defaults={'size': length, 'sha256': sha256}
+    )
+    extend_expiry(session)
+    UploadSession.objects.filter(pk=session.pk).update(expires_at=session.expires_at)
+    return chunk
+
+
+def discard_range(session, offset, length):
+    """Forget the chunks overlapping [offset, offset + length), so they are sent again"""
+    if length > 0:
+        UploadChunk.objects.filter(session=session, offset__lt=offset + length).annotate(
+            end=F('offset') + F('size')
+        ).filter(end__gt=offset).delete()
+
+
+def missing_ranges(session):
+    """[start, end) byte ranges no chunk has covered yet"""
+    missing, covered = [], 0
+    for offset, size in session.chunks.order_by('offset').values_list('offset', 'size'):
+        if offset > covered:
+            missing.append((covered, offset))
+        covered = max(covered, offset + size)
+    if covered < session.size:
+        missing.append((covered, session.size))
+    return missing
+
+
+def assemble(session):
+    """Check and hash the complete part file, returns it as an upload"""
+    if missing_ranges(session):
+        raise UploadError('Upload is incomplete.')
+
+    digest = hashlib.sha256()
+    with open(session.part_path, 'rb') as part:
+        for data in iter(lambda: part.read(READ_SIZE * 16), b''):
+            digest.update(data)
+    sha256 = digest.hexdigest()
+    if session.sha256 and session.sha256.lower() != sha256:
+        raise UploadError('File checksum mismatch.')
+    return AssembledUpload(session.part_path, session.filename, session.size, sha256)
+
+
+def discard(session):
+    """Delete a session and whatever is left of its part file"""
+    path = session.part_path
+    session.delete()
+    transaction.on_commit(lambda: _remove(path))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired(now=None):
+    """Discard every expired session, returns how many"""
+    expired = UploadSession.objects.filter(expires_at__lt=now or timezone.now())
+    count = 0
+    for session in expired.iterator():
+        with transaction.atomic():
+            discard(session)
+        count += 1
+    return count
@@ -6,9 +6,21 @@ app_name = 'files'
 urlpatterns = [
     # File CRUD endpoints
     path('', views.FileListCreateView.as_view(), name='file_list'),
+    path('search/', views.FileSearchView.as_view(), name='file_search'),
+    path('content-search/', views.FileContentSearchView.as_view(), name='file_content_search'),
     path('<int:pk>/', views.FileDetailView.as_view(), name='file_detail'),
     
+    # Bulk and resumable uploads, archive downloads
+    path('bulk/', views.bulk_upload, name='bulk_upload'),
+    path('archive/', views.download_archive, name='download_archive'),
+    path('signed/<str:token>/', views.signed_download, name='signed_download'),
+    path('uploads/', views.create_upload_session, name='create_upload_session'),
+    path('uploads/<uuid:session_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('uploads/<uuid:session_id>/complete/', views.complete_upload_session, name='complete_upload_session'),
+    
     # File management
+    path('<int:pk>/download/', views.download_file, name='download_file'),
+    path('<int:pk>/download-url/', views.file_download_url, name='file_download_url'),
     path('<int:pk>/versions/', views.file_versions, name='file_versions'),
     path('<int:pk>/upload-version/', views.upload_file_version, name='upload_file_version'),
     path('<int:pk>/lock/', views.toggle_file_lock, name='toggle_file_lock'),
@@ -31,6 +43,9 @@ urlpatterns = [
     path('permissions/', views.file_permissions_list, name='file_permissions_list'),
     path('permissions/<int:pk>/', views.file_permission_delete, name='file_permission_delete'),
     
+    # Dashboard statistics
+    path('stats/activity/', views.file_activity_stats, name='file_activity_stats'),
+    
     # User-specific endpoints
     path('my-files/', views.my_files, name='my_files'),
     path('shared-files/', views.shared_files, name='shared_files'),
@@ -1,107 +1,78 @@
-import os
-import json
-import jwt
-import hashlib
-import requests
+import logging
 import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
-
-
-@api_view(['POST'])
-@permission_classes([permissions.IsAuthenticated])
-def update_sheet_info(request, file_id):
-    """Update Excel sheet information"""
-    file_obj = get_object_or_404(File, id=file_id)
-    user = request.user
-    
-    # Check edit permission
-    if not file_obj.can_edit(user):
-        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-    
-    # Update sheet information
-    sheet_count = request.data.get('sheet_count', 1)
-    has_multiple_sheets = request.data.get('has_multiple_sheets', False)
-    last_active_sheet = request.data.get('last_active_sheet')
-    
-    file_obj.sheet_count = sheet_count
-    file_obj.has_multiple_sheets = has_multiple_sheets
-    if last_active_sheet:
-        file_obj.last_active_sheet = last_active_sheet
-    
-    file_obj.save()
-    
-    return Response({
-        'success': True,
-        'sheet_count': file_obj.sheet_count,
-        'has_multiple_sheets': file_obj.has_multiple_sheets,
-        'last_active_sheet': file_obj.last_active_sheet
-    })
-
-
+from rest_framework.decorators import api_view, authentication_classes, parser_classes, permission_classes
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
-from .models import File, FileVersion, FilePermission, OnlyOfficeSession
+from audit_system.pagination import CreatedAtCursorPagination
+from authentication.models import Permission
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from . import activity, archives, callbacks, documentkeys, downloads, ingest, search, uploads, workbooks
+from .uploadhandlers import ARCHIVE_FIELD, BulkUploadHandler, upload_rejection, upload_rejections
+from .models import File, FileActivity, FileVersion, FilePermission, UploadSession
 from .serializers import (
     FileSerializer,
     FileUploadSerializer,
+    BulkUploadSerializer,
+    ArchiveDownloadSerializer,
     FileUpdateSerializer,
     FileVersionSerializer,
     OnlyOfficeConfigSerializer,
     FileLockSerializer,
     FileSearchSerializer,
+    FileContentMatchSerializer,
+    UploadSessionSerializer,
     OneDriveEmbedSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+
+def save_uploaded_file(serializer, user):
+    """Create a File from a validated FileUploadSerializer"""
+    file_obj = serializer.save(uploaded_by=user)
+    activity.record(file_obj, uploads=1, bytes_added=file_obj.file_size)
+    return file_obj
+
+
+def save_uploaded_version(file_obj, upload, user, comment=''):
+    """Make ``upload`` the current content of ``file_obj`` as its next version"""
+    file_obj.file = upload
+    file_obj.version += 1
+    file_obj.save()
+    file_obj.create_version(user, comment=comment)
+    activity.record(file_obj, versions=1, bytes_added=file_obj.file_size)
+    return file_obj
+
 
 class FileListCreateView(generics.ListCreateAPIView):
     """List and create files"""
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         
-        # Base queryset
-        queryset = File.objects.select_related('department', 'uploaded_by').prefetch_related('file_permissions')
+        # Base queryset with can_view/can_edit computed in SQL
+        queryset = File.objects.for_listing().with_access(user)
         
-        # Filter based on user permissions
-        if user.role == 'admin':
-            # Admin can see all files
-            pass
-        elif user.role == 'manager' and user.department:
-            # Managers can see department files and files they have permissions for
-            dept_files = Q(department=user.department)
-            subdept_files = Q(department__parent=user.department) if hasattr(user.department, 'parent') else Q()
-            own_files = Q(uploaded_by=user)
-            permission_files = Q(file_permissions__user=user)
-            queryset = queryset.filter(
-                dept_files | subdept_files | own_files | permission_files
-            ).distinct()
-        else:
-            # Regular users can only see their own files and files they have permissions for
-            own_files = Q(uploaded_by=user)
-            permission_files = Q(file_permissions__user=user)
-            dept_files = Q(department=user.department) if user.department else Q()
-            queryset = queryset.filter(
-                own_files | permission_files | dept_files
-            ).distinct()
-        
-        # Apply search filters if provided
-        search = self.request.query_params.get('search', '')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(uploaded_by__first_name__icontains=search) |
-                Q(uploaded_by__last_name__icontains=search)
-            )
+        # Admin can see all files, everyone else goes through the visibility index
+        if user.role != 'admin':
+            queryset = queryset.filter(visibility__user=user)
+        
+        # Apply search filters if provided, pages stay in created_at order
+        query = self.request.query_params.get('search', '')
+        if query:
+            queryset = search.search(queryset, query)
         
         department_id = self.request.query_params.get('department', '')
         if department_id:
@@ -122,8 +93,70 @@ class FileListCreateView(generics.ListCreateAPIView):
             return FileUploadSerializer
         return FileSerializer
 
+    def create(self, request, *args, **kwargs):
+        rejection = upload_rejection(request)
+        if rejection:
+            return Response({'error': rejection}, status=status.HTTP_400_BAD_REQUEST)
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        serializer.save(uploaded_by=self.request.user)
+        save_uploaded_file(serializer, self.request.user)
+
+
+class FileSearchView(generics.ListAPIView):
+    """Search files by name, description, uploader and department, with facet counts"""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = FileSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        params = FileSearchSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        
+        queryset = File.objects.for_listing().with_access(user)
+        if user.role != 'admin':
+            queryset = queryset.filter(visibility__user=user)
+        
+        if filters.get('file_type'):
+            queryset = queryset.filter(file_type=filters['file_type'])
+        if filters.get('status'):
+            queryset = queryset.filter(status=filters['status'])
+        if filters.get('department_id'):
+            queryset = queryset.filter(department_id=filters['department_id'])
+        if filters.get('date_from'):
+            queryset = queryset.filter(created_at__gte=filters['date_from'])
+        if filters.get('date_to'):
+            queryset = queryset.filter(created_at__lte=filters['date_to'])
+        
+        if filters.get('query'):
+            queryset = self.apply_query(queryset, filters['query'])
+        return queryset
+
+    def apply_query(self, queryset, query):
+        return search.search(queryset, query).order_by('-search_rank', '-created_at')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = search.facets(queryset)
+        
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            serializer = self.get_serializer(queryset, many=True)
+            return Response({'results': serializer.data, 'facets': facets})
+        
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'] = facets
+        return response
+
+
+class FileContentSearchView(FileSearchView):
+    """Search files by the text inside their documents"""
+    serializer_class = FileContentMatchSerializer
+
+    def apply_query(self, queryset, query):
+        return search.search_content(queryset, query).order_by('-search_rank', '-created_at')
 
 
 class FileDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -132,13 +165,20 @@ class FileDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = File.objects.for_listing().with_access(user)
         if user.role == 'admin':
-            return File.objects.all()
+            return queryset
+        
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Changes stay limited to files users own or have permissions to
+            return queryset.filter(
+                Q(uploaded_by=user)
+                | Exists(Permission.objects.filter(file=OuterRef('pk'), user=user))
+                | Exists(FilePermission.objects.filter(file=OuterRef('pk'), user=user))
+            )
         
-        # Users can access files they own or have permissions to
-        own_files = Q(uploaded_by=user)
-        permission_files = Q(permissions__user=user)
-        return File.objects.filter(own_files | permission_files)
+        # Users can view files listed for them in the visibility index
+        return queryset.filter(visibility__user=user)
 
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -159,7 +199,7 @@ class FileDetailView(generics.RetrieveUpdateDestroyAPIView):
         user = self.request.user
         
         # Only file owner or admin can delete
-        if instance.uploaded_by != user and user.role != 'admin':
+        if instance.uploaded_by_id != user.id and user.role != 'admin':
             raise permissions.PermissionDenied("You can only delete files you uploaded.")
         
         instance.delete()
@@ -169,68 +209,312 @@ class FileDetailView(generics.RetrieveUpdateDestroyAPIView):
 @permission_classes([permissions.IsAuthenticated])
 def upload_file_version(request, pk):
     """Upload a new version of an existing file"""
-    file_obj = get_object_or_404(File, pk=pk)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), pk=pk)
     
     # Check permissions
-    if not file_obj.can_edit(user):
+    if not file_obj.user_can_edit:
         return Response(
             {'error': 'You don\'t have permission to edit this file.'},
             status=status.HTTP_403_FORBIDDEN
         )
     
+    rejection = upload_rejection(request)
+    if rejection:
+        return Response({'error': rejection}, status=status.HTTP_400_BAD_REQUEST)
+    
     if 'file' not in request.FILES:
         return Response(
             {'error': 'No file provided'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Create new version
-    new_version = file_obj.version + 1
-    FileVersion.objects.create(
-        file=file_obj,
-        version_number=new_version,
-        file_data=request.FILES['file'],
-        created_by=user,
-        comment=request.data.get('comment', '')
-    )
-    
-    # Update main file
-    file_obj.file = request.FILES['file']
-    file_obj.version = new_version
-    file_obj.save()
+    # Update main file, the version shares its blob
+    save_uploaded_version(file_obj, request.FILES['file'], user, request.data.get('comment', ''))
     
     return Response({
         'message': 'New file version uploaded successfully',
-        'version': new_version
+        'version': file_obj.version
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_upload_session(request):
+    """Start a resumable upload of a new file or of a new version of ``file``"""
+    user = request.user
+    serializer = UploadSessionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    target = serializer.validated_data.get('file')
+    if target and not File.objects.with_access(user).filter(pk=target.pk, user_can_edit=True).exists():
+        return Response(
+            {'error': 'You don\'t have permission to edit this file.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    session = UploadSession(user=user, **serializer.validated_data)
+    uploads.extend_expiry(session)
+    session.save()
+    uploads.open_part(session)
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def upload_session_detail(request, session_id):
+    """Get progress, upload a chunk (PUT ?offset=, raw body) or abort an upload"""
+    session = get_object_or_404(UploadSession, pk=session_id, user=request.user)
+    
+    if request.method == 'GET':
+        serializer = UploadSessionSerializer(session)
+        return Response(serializer.data)
+    
+    if request.method == 'DELETE':
+        uploads.discard(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    try:
+        offset = int(request.query_params.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({'error': 'offset must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Read the raw body, never request.data, so the chunk is not buffered
+        chunk = uploads.write_chunk(
+            session, offset, length, request.stream,
+            expected_sha256=request.META.get('HTTP_X_CHUNK_SHA256', '')
+        )
+    except uploads.UploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'offset': chunk.offset,
+        'size': chunk.size,
+        'sha256': chunk.sha256,
+        'missing': uploads.missing_ranges(session)
+    })
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def complete_upload_session(request, session_id):
+    """Assemble a finished upload into a new file or file version"""
+    user = request.user
+    
+    with transaction.atomic():
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update(), pk=session_id, user=user
+        )
+        try:
+            upload = uploads.assemble(session)
+        except uploads.UploadError as e:
+            return Response(
+                {'error': str(e), 'missing': uploads.missing_ranges(session)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            if session.file_id:
+                file_obj = get_object_or_404(File.objects.with_access(user), pk=session.file_id)
+                if not file_obj.user_can_edit:
+                    return Response(
+                        {'error': 'You don\'t have permission to edit this file.'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                save_uploaded_version(file_obj, upload, user, session.comment)
+                response_status = status.HTTP_200_OK
+            else:
+                serializer = FileUploadSerializer(
+                    data={
+                        'name': session.name,
+                        'description': session.description,
+                        'department': session.department_id,
+                        'status': session.status,
+                        'file': upload,
+                    },
+                    context={'max_size': settings.FILES_MAX_RESUMABLE_UPLOAD_SIZE}
+                )
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                file_obj = save_uploaded_file(serializer, user)
+                response_status = status.HTTP_201_CREATED
+        finally:
+            upload.close()
+        
+        uploads.discard(session)
+    
+    file_obj = File.objects.for_listing().with_access(user).get(pk=file_obj.pk)
+    serializer = FileSerializer(file_obj, context={'request': request})
+    return Response(serializer.data, status=response_status)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def bulk_upload(request):
+    """Upload many files, or one ZIP archive of files, in one request"""
+    request._request.upload_handlers = [BulkUploadHandler(request._request)]
+    serializer = BulkUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    files = request.FILES.getlist('files')
+    archive = request.FILES.get(ARCHIVE_FIELD)
+    rejections = upload_rejections(request)
+    for field_name, name, error in rejections:
+        if field_name == ARCHIVE_FIELD:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    if archive is not None and files:
+        return Response({'error': 'Send either files or an archive, not both.'}, status=status.HTTP_400_BAD_REQUEST)
+    if archive is None and not files and not rejections:
+        return Response({'error': 'No files were uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(files) + len(rejections) > settings.FILES_BULK_MAX_ENTRIES:
+        return Response(
+            {'error': f'At most {settings.FILES_BULK_MAX_ENTRIES} files can be uploaded at once.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    bulk = ingest.BulkIngest(request.user, **serializer.validated_data)
+    for field_name, name, error in rejections:
+        bulk.reject(name, error)
+    try:
+        if archive is not None:
+            bulk.add_archive(archive.temporary_file_path())
+        else:
+            bulk.add_uploads(files)
+    except ingest.IngestError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    finally:
+        for upload in [archive, *files]:
+            if upload is not None:
+                upload.close()
+    
+    created = bulk.created
+    return Response(
+        {'created': created, 'rejected': len(bulk.results) - created, 'results': bulk.results},
+        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+    )
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def download_archive(request):
+    """Stream a ZIP of selected files, or of a department and its subdepartments"""
+    serializer = ArchiveDownloadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Only files the user can view go into the archive
+    queryset = File.objects.with_access(request.user).filter(user_can_view=True)
+    department = serializer.validated_data.get('department')
+    skipped, folders = [], None
+    if department is not None:
+        queryset = queryset.filter(department__ancestor_links__ancestor=department)
+        folders = archives.folder_paths(department)
+        filename = f'{department.name}.zip'
+    else:
+        file_ids = set(serializer.validated_data['file_ids'])
+        queryset = queryset.filter(id__in=file_ids)
+        skipped = sorted(file_ids - set(queryset.values_list('id', flat=True)))
+        filename = 'files.zip'
+    
+    if not queryset.exists():
+        return Response({'error': 'No files you can view were found.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    files = queryset.select_related('blob__pack').order_by('department_id', 'name', 'id').iterator(chunk_size=200)
+    response = StreamingHttpResponse(
+        archives.stream_archive(files, folders=folders, skipped=skipped),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([permissions.IsAuthenticated])
+def download_file(request, pk):
+    """Download file content, with Range and conditional request support"""
+    user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), pk=pk)
+    
+    if not file_obj.user_can_view:
+        return Response(
+            {'error': 'You don\'t have permission to view this file.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    response = downloads.serve(request, file_obj) if file_obj.file else None
+    if response is None:
+        return Response({'error': 'File has no stored content.'}, status=status.HTTP_404_NOT_FOUND)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def file_download_url(request, pk):
+    """Issue a short-lived signed download URL"""
+    user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), pk=pk)
+    
+    if not file_obj.user_can_view:
+        return Response(
+            {'error': 'You don\'t have permission to view this file.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if not file_obj.file:
+        return Response({'error': 'File has no stored content.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'url': downloads.signed_url(file_obj, request),
+        'expires_in': settings.FILES_SIGNED_URL_TTL
+    })
+
+
+@api_view(['GET', 'HEAD'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])  # The signature is the credential
+def signed_download(request, token):
+    """Download file content through a signed URL, without a database hit"""
+    try:
+        path, filename, etag = downloads.unsign(token)
+    except downloads.InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+    
+    response = downloads.serve_path(request, path, filename, etag)
+    if response is None:
+        return Response({'error': 'File has no stored content.'}, status=status.HTTP_404_NOT_FOUND)
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def file_versions(request, pk):
     """Get file version history"""
-    file_obj = get_object_or_404(File, pk=pk)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), pk=pk)
     
     # Check permissions
-    if not file_obj.can_view(user):
+    if not file_obj.user_can_view:
         return Response(
             {'error': 'You don\'t have permission to view this file.'},
             status=status.HTTP_403_FORBIDDEN
         )
     
-    versions = file_obj.versions.all()
+    paginator = CreatedAtCursorPagination()
+    versions = paginator.paginate_queryset(file_obj.versions.all(), request)
     serializer = FileVersionSerializer(versions, many=True)
-    return Response(serializer.data)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_file_lock(request, pk):
     """Lock or unlock a file"""
-    file_obj = get_object_or_404(File, pk=pk)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user).select_related('locked_by'), pk=pk)
     
     serializer = FileLockSerializer(data=request.data)
     if not serializer.is_valid():
@@ -239,13 +523,13 @@ def toggle_file_lock(request, pk):
     action = serializer.validated_data['action']
     
     if action == 'lock':
-        if file_obj.is_locked and file_obj.locked_by != user:
+        if file_obj.is_locked and file_obj.locked_by_id != user.id:
             return Response(
                 {'error': f'File is already locked by {file_obj.locked_by.full_name}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not file_obj.can_edit(user):
+        if not file_obj.user_can_edit:
             return Response(
                 {'error': 'You don\'t have permission to lock this file.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -265,7 +549,7 @@ def toggle_file_lock(request, pk):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if file_obj.locked_by != user and user.role != 'admin':
+        if file_obj.locked_by_id != user.id and user.role != 'admin':
             return Response(
                 {'error': 'You can only unlock files you have locked'},
                 status=status.HTTP_403_FORBIDDEN
@@ -279,160 +563,24 @@ def toggle_file_lock(request, pk):
         return Response({'message': 'File unlocked successfully'})
 
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def onlyoffice_config(request, pk):
-    """Generate OnlyOffice configuration for file editing"""
-    file_obj = get_object_or_404(File, pk=pk)
-    user = request.user
-    
-    # Check if user can view the file
-    if not file_obj.can_view(user):
-        return Response(
-            {'error': 'You don\'t have permission to view this file.'},
-            status=status.HTTP_403_FORBIDDEN
-        )
-    
-    # Check if file is suitable for OnlyOffice
-    if file_obj.file_type not in ['excel', 'word']:
-        return Response(
-            {'error': 'File type not supported for online editing'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Generate document key (unique identifier for the document)
-    document_key = hashlib.md5(
-        f"{file_obj.id}_{file_obj.updated_at}_{user.id}".encode()
-    ).hexdigest()
-    
-    # Determine document type
-    doc_type = 'spreadsheet' if file_obj.file_type == 'excel' else 'text'
-    
-    # Build file URL
-    file_url = request.build_absolute_uri(file_obj.get_file_url())
-    
-    # Build callback URL for saving changes
-    callback_url = request.build_absolute_uri(
-        f'/api/files/{pk}/onlyoffice-callback/'
-    )
-    
-    # Determine permissions
-    can_edit = file_obj.can_edit(user) and not file_obj.is_locked
-    
-    config = {
-        'document': {
-            'fileType': file_obj.file.name.split('.')[-1],
-            'key': document_key,
-            'title': file_obj.name,
-            'url': file_url,
-            'permissions': {
-                'comment': can_edit,
-                'download': True,
-                'edit': can_edit,
-                'fillForms': can_edit,
-                'modifyFilter': can_edit,
-                'modifyContentControl': can_edit,
-                'review': can_edit
-            }
-        },
-        'documentType': doc_type,
-        'editorConfig': {
-            'mode': 'edit' if can_edit else 'view',
-            'lang': 'en',
-            'callbackUrl': callback_url,
-            'user': {
-                'id': str(user.id),
-                'name': user.full_name,
-                'email': user.email
-            },
-            'customization': {
-                'about': False,
-                'feedback': False,
-                'goback': {
-                    'url': request.build_absolute_uri('/dashboard/')
-                }
-            }
-        },
-        'type': 'desktop',
-        'width': '100%',
-        'height': '100%'
-    }
-    
-    # Sign the config with JWT if secret is configured
-    if hasattr(settings, 'ONLYOFFICE_JWT_SECRET') and settings.ONLYOFFICE_JWT_SECRET:
-        payload = {
-            'iss': 'audit_system',
-            'aud': 'onlyoffice',
-            'iat': datetime.utcnow(),
-            'exp': datetime.utcnow() + timedelta(hours=1),
-            'document': config['document'],
-            'editorConfig': config['editorConfig']
-        }
-        
-        token = jwt.encode(payload, settings.ONLYOFFICE_JWT_SECRET, algorithm='HS256')
-        config['token'] = token
-    
-    return Response(config)
-
-
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])  # OnlyOffice callback doesn't send auth headers
-def onlyoffice_callback(request, pk):
-    """Handle OnlyOffice callback for saving document changes"""
-    try:
-        data = json.loads(request.body)
-        status_code = data.get('status', 0)
-        
-        file_obj = get_object_or_404(File, pk=pk)
-        
-        # Status 2 means document is ready for saving
-        if status_code == 2:
-            download_url = data.get('url')
-            if download_url:
-                # Download the updated document
-                response = requests.get(download_url)
-                if response.status_code == 200:
-                    # Save the updated file
-                    file_obj.file.save(
-                        file_obj.file.name,
-                        response.content,
-                        save=True
-                    )
-                    
-                    # Create new version
-                    file_obj.version += 1
-                    file_obj.save()
-                    
-                    # Unlock the file if it was locked
-                    if file_obj.is_locked:
-                        file_obj.is_locked = False
-                        file_obj.locked_by = None
-                        file_obj.lock_time = None
-                        file_obj.save()
-        
-        return JsonResponse({'error': 0})
-    
-    except Exception as e:
-        return JsonResponse({'error': 1, 'message': str(e)})
-
-
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def my_files(request):
     """Get current user's files"""
     user = request.user
-    files = File.objects.filter(uploaded_by=user)
+    files = File.objects.for_listing().with_access(user).filter(
+        visibility__user=user, visibility__is_owner=True
+    )
     
     # Apply filters
     search_query = request.query_params.get('search', None)
     if search_query:
-        files = files.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        files = search.search(files, search_query)
     
-    serializer = FileSerializer(files, many=True, context={'request': request})
-    return Response(serializer.data)
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(files, request)
+    serializer = FileSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
@@ -440,10 +588,74 @@ def my_files(request):
 def shared_files(request):
     """Get files shared with current user"""
     user = request.user
-    files = File.objects.filter(file_permissions__user=user)
+    files = File.objects.for_listing().with_access(user).filter(
+        visibility__user=user, visibility__is_shared=True
+    )
+    
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(files, request)
+    serializer = FileSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def file_activity_stats(request):
+    """Get upload/version/edit time series from the daily activity rollups"""
+    user = request.user
+    
+    try:
+        days = min(int(request.query_params.get('days', 30)), 3660)
+    except ValueError:
+        return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if days < 1:
+        return Response({'error': 'days must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    interval = request.query_params.get('interval', 'day')
+    periods = {'day': F('day'), 'week': TruncWeek('day'), 'month': TruncMonth('day')}
+    if interval not in periods:
+        return Response(
+            {'error': f"interval must be one of: {', '.join(periods)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rollups = FileActivity.objects.filter(day__gte=since)
+    
+    # Admin sees everything, managers their department and its direct children, users their department
+    if user.role == 'admin':
+        pass
+    elif user.role == 'manager' and user.department:
+        rollups = rollups.filter(
+            department__ancestor_links__ancestor=user.department,
+            department__ancestor_links__depth__lte=1
+        )
+    elif user.department:
+        rollups = rollups.filter(department=user.department)
+    else:
+        rollups = rollups.none()
+    
+    for param, field in (('department', 'department_id'), ('type', 'file_type'), ('status', 'status')):
+        value = request.query_params.get(param, '')
+        if value:
+            rollups = rollups.filter(**{field: value})
+    
+    totals = {field: Sum(field) for field in activity.ACTIVITY_FIELDS}
+    series = (
+        rollups.annotate(period=periods[interval])
+        .values('period')
+        .annotate(**totals)
+        .order_by('period')
+    )
     
-    serializer = FileSerializer(files, many=True, context={'request': request})
-    return Response(serializer.data)
+    return Response({
+        'interval': interval,
+        'since': since,
+        'series': list(series),
+        'totals': {
+            field: value or 0 for field, value in rollups.aggregate(**totals).items()
+        }
+    })
 
 
 # OnlyOffice Integration Views
@@ -451,61 +663,32 @@ def shared_files(request):
 @permission_classes([permissions.IsAuthenticated])
 def onlyoffice_config(request, file_id):
     """Generate OnlyOffice configuration for file editing/viewing"""
-    file_obj = get_object_or_404(File, id=file_id)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user).select_related('blob'), id=file_id)
     
     # Check permissions
-    can_edit = file_obj.can_edit(user)
-    can_view = file_obj.can_view(user)
+    can_edit = file_obj.user_can_edit
+    can_view = file_obj.user_can_view
     
     if not (can_edit or can_view):
         return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
     
-    # For Excel files, check if we need to analyze sheets
-    if file_obj.file_type == 'excel' and not file_obj.has_multiple_sheets:
+    # Sheet names come from the workbook's index part, cached by content hash
+    if file_obj.file_type == 'excel' and file_obj.file and file_obj.file.name.lower().endswith('.xlsx'):
         try:
-            # Try to detect sheets in Excel file
-            import openpyxl
-            wb = openpyxl.load_workbook(file_obj.file.path, read_only=True)
-            sheet_names = wb.sheetnames
-            sheet_count = len(sheet_names)
-            
-            # Update the file object with sheet information
-            file_obj.has_multiple_sheets = sheet_count > 1
-            file_obj.sheet_count = sheet_count
-            if sheet_count > 0:
-                file_obj.last_active_sheet = sheet_names[0]
-            file_obj.save()
-            
-        except Exception as e:
+            changed = workbooks.apply(file_obj, workbooks.file_sheet_info(file_obj))
+            if changed:
+                # update() keeps the save signals out of it
+                File.objects.filter(id=file_obj.id).update(**{field: getattr(file_obj, field) for field in changed})
+        except (OSError, workbooks.WorkbookError) as e:
             # Log the error but continue with default settings
-            print(f"Error analyzing Excel file sheets: {e}")
-    
-    # Generate unique document key and session key
-    document_key = str(uuid.uuid4())
-    session_key = str(uuid.uuid4())
-    
-    # Create or update OnlyOffice session
-    session, created = OnlyOfficeSession.objects.get_or_create(
-        file=file_obj,
-        user=user,
-        defaults={
-            'session_key': session_key,
-            'document_key': document_key,
-            'is_editor': can_edit,
-            'is_active': True
-        }
-    )
+            logger.warning('Error analyzing Excel file sheets of file %s: %s', file_obj.id, e)
     
-    if not created:
-        session.document_key = document_key
-        session.session_key = session_key
-        session.is_editor = can_edit
-        session.is_active = True
-        session.save()
+    # Every editor of this version shares its document key, sessions stay per user
+    document_key = documentkeys.open_session(file_obj, user, session_key=str(uuid.uuid4()), is_editor=can_edit)
     
-        # Build absolute URLs
-    file_url = request.build_absolute_uri(file_obj.file.url)
+    # Build absolute URLs, the Document Server fetches the file through a signed URL
+    file_url = downloads.signed_url(file_obj, request, max_age=settings.ONLYOFFICE_DOCUMENT_URL_TTL)
     callback_url = request.build_absolute_uri(f'/api/files/{file_id}/onlyoffice-callback/')
     
     # Excel specific headers to ensure proper handling of multiple sheets
@@ -578,62 +761,15 @@ def onlyoffice_callback(request, file_id):
     
     status_code = data.get('status')
     
-    if status_code == 2:  # Document ready for saving
-        download_url = data.get('url')
-        if download_url:
-            # Download the updated file
-            response = requests.get(download_url)
-            if response.status_code == 200:
-                # Create new version
-                version = FileVersion.objects.create(
-                    file=file_obj,
-                    version_number=file_obj.version + 1,
-                    created_by=request.user,
-                    comment='OnlyOffice auto-save'
-                )
-                
-                # Save new file content
-                version.file_data.save(
-                    file_obj.file.name,
-                    response.content
-                )
-                
-                # Update main file version
-                file_obj.version += 1
-                
-                # If it's an Excel file, try to extract sheet information
-                if file_obj.file_type == 'excel':
-                    try:
-                        import openpyxl
-                        from tempfile import NamedTemporaryFile
-                        
-                        # Create temporary file
-                        with NamedTemporaryFile(suffix='.xlsx') as tmp:
-                            tmp.write(response.content)
-                            tmp.flush()
-                            
-                            # Load workbook to extract sheet info
-                            wb = openpyxl.load_workbook(tmp.name, read_only=True)
-                            sheet_names = wb.sheetnames
-                            sheet_count = len(sheet_names)
-                            
-                            # Update sheet information
-                            file_obj.has_multiple_sheets = sheet_count > 1
-                            file_obj.sheet_count = sheet_count
-                            if sheet_count > 0 and wb.active:
-                                file_obj.last_active_sheet = wb.active.title
-                    except Exception as e:
-                        print(f"Error analyzing Excel sheets on callback: {e}")
-                
-                file_obj.save()
+    if status_code in (2, 6):  # Document ready for saving, or force saved while being edited
+        # Saved by the run_onlyoffice_workers pool, the Document Server only waits for the job to be recorded.
+        # Resent callbacks are recognised and rapid force-saves are committed as one version
+        callbacks.enqueue(file_obj, data, user=request.user)
     
     elif status_code == 3:  # Document saving error
         return Response({'error': 1})
     
-    elif status_code == 6:  # Document being edited
-        pass
-    
-    elif status_code == 7:  # Document force saved
+    elif status_code == 7:  # Force save error
         pass
     
     return Response({'error': 0})
@@ -786,11 +922,11 @@ def file_permissions_list(request):
 @permission_classes([permissions.IsAuthenticated])
 def update_sheet_info(request, file_id):
     """Update Excel sheet information"""
-    file_obj = get_object_or_404(File, id=file_id)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), id=file_id)
     
     # Check edit permission
-    if not file_obj.can_edit(user):
+    if not file_obj.user_can_edit:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
     # Update sheet information
@@ -900,11 +1036,11 @@ def create_onedrive_embed(request):
 @permission_classes([permissions.IsAuthenticated])
 def onedrive_embed_view(request, file_id):
     """Get OneDrive embed information for viewing"""
-    file_obj = get_object_or_404(File, id=file_id)
     user = request.user
+    file_obj = get_object_or_404(File.objects.with_access(user), id=file_id)
     
     # Check view permission
-    if not file_obj.can_view(user):
+    if not file_obj.user_can_view:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
     if not file_obj.is_onedrive_embed:
@@ -914,5 +1050,5 @@ def onedrive_embed_view(request, file_id):
         'embed_url': file_obj.onedrive_embed_url,
         'direct_link': file_obj.onedrive_direct_link,
         'file_name': file_obj.name,
-        'can_edit': file_obj.can_edit(user)
+        'can_edit': file_obj.user_can_edit
     })
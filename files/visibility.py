@@ -0,0 +1,165 @@
+"""Maintenance of the FileVisibility index.
+
+A non-admin user sees a file when they uploaded it, were granted a
+FilePermission or authentication Permission on it, belong to the file's
+department, or manage the parent of the file's department. Admins see
+everything and never hit the index.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from authentication.models import Permission
+from departments.models import DepartmentClosure
+from .models import File, FilePermission, FileVisibility
+
+ACCESS_RANK = {'department': 0, 'read': 1, 'write': 2, 'admin': 3}
+
+BATCH_SIZE = 500
+
+
+class _Entries(dict):
+    """(user_id, file_id) -> [access_level, is_owner, is_shared]"""
+
+    def grant(self, user_id, file_id, level, owner=False, shared=False):
+        entry = self.get((user_id, file_id))
+        if entry is None:
+            self[(user_id, file_id)] = [level, owner, shared]
+            return
+        if ACCESS_RANK[level] > ACCESS_RANK[entry[0]]:
+            entry[0] = level
+        entry[1] = entry[1] or owner
+        entry[2] = entry[2] or shared
+
+    def rows(self):
+        return [
+            FileVisibility(
+                user_id=user_id,
+                file_id=file_id,
+                access_level=level,
+                is_owner=owner,
+                is_shared=shared
+            )
+            for (user_id, file_id), (level, owner, shared) in self.items()
+        ]
+
+
+def _managing_departments(department_ids):
+    """Map each department to the departments whose managers can see its files"""
+    managing = {}
+    # Managers see their direct child departments only
+    for department_id, ancestor_id in DepartmentClosure.objects.filter(
+        descendant_id__in=department_ids, depth=1
+    ).values_list('descendant_id', 'ancestor_id'):
+        managing.setdefault(department_id, []).append(ancestor_id)
+    return managing
+
+
+def _file_entries(file_ids, user_id=None):
+    """Collect visibility entries for the given files, optionally for one user"""
+    User = get_user_model()
+    entries = _Entries()
+
+    files = list(File.objects.filter(id__in=file_ids).values_list(
+        'id', 'uploaded_by_id', 'department_id'
+    ))
+    for file_id, owner_id, _ in files:
+        if user_id is None or owner_id == user_id:
+            entries.grant(owner_id, file_id, 'admin', owner=True)
+
+    for model in (FilePermission, Permission):
+        grants = model.objects.filter(file_id__in=file_ids)
+        if user_id is not None:
+            grants = grants.filter(user_id=user_id)
+        for file_id, grantee_id, level in grants.values_list('file_id', 'user_id', 'permission_type'):
+            entries.grant(grantee_id, file_id, level, shared=True)
+
+    files_by_department = {}
+    for file_id, _, department_id in files:
+        if department_id:
+            files_by_department.setdefault(department_id, []).append(file_id)
+    if not files_by_department:
+        return entries
+
+    members = User.objects.filter(department_id__in=files_by_department)
+    if user_id is not None:
+        members = members.filter(id=user_id)
+    for member_id, department_id in members.values_list('id', 'department_id'):
+        for file_id in files_by_department[department_id]:
+            entries.grant(member_id, file_id, 'department')
+
+    managing = _managing_departments(files_by_department)
+    files_by_manager_department = {}
+    for department_id, managing_ids in managing.items():
+        for managing_id in managing_ids:
+            files_by_manager_department.setdefault(managing_id, []).extend(
+                files_by_department[department_id]
+            )
+    if files_by_manager_department:
+        managers = User.objects.filter(
+            role='manager', department_id__in=files_by_manager_department
+        )
+        if user_id is not None:
+            managers = managers.filter(id=user_id)
+        for manager_id, department_id in managers.values_list('id', 'department_id'):
+            for file_id in files_by_manager_department[department_id]:
+                entries.grant(manager_id, file_id, 'department')
+
+    return entries
+
+
+def _user_entries(user):
+    """Collect visibility entries for every file the user can see"""
+    entries = _Entries()
+    for file_id in File.objects.filter(uploaded_by=user).values_list('id', flat=True):
+        entries.grant(user.id, file_id, 'admin', owner=True)
+    for model in (FilePermission, Permission):
+        for file_id, level in model.objects.filter(user=user).values_list('file_id', 'permission_type'):
+            entries.grant(user.id, file_id, level, shared=True)
+    if user.department_id:
+        for file_id in File.objects.filter(department_id=user.department_id).values_list('id', flat=True):
+            entries.grant(user.id, file_id, 'department')
+        if user.role == 'manager':
+            managed = File.objects.filter(
+                department__ancestor_links__ancestor_id=user.department_id,
+                department__ancestor_links__depth=1
+            )
+            for file_id in managed.values_list('id', flat=True):
+                entries.grant(user.id, file_id, 'department')
+    return entries
+
+
+def refresh_files(file_ids):
+    """Recompute every index row of the given files"""
+    file_ids = list(file_ids)
+    with transaction.atomic():
+        for start in range(0, len(file_ids), BATCH_SIZE):
+            batch = file_ids[start:start + BATCH_SIZE]
+            FileVisibility.objects.filter(file_id__in=batch).delete()
+            FileVisibility.objects.bulk_create(_file_entries(batch).rows(), batch_size=1000)
+
+
+def refresh_user(user):
+    """Recompute every index row of the given user"""
+    with transaction.atomic():
+        FileVisibility.objects.filter(user_id=user.id).delete()
+        FileVisibility.objects.bulk_create(_user_entries(user).rows(), batch_size=1000)
+
+
+def refresh_pair(user_id, file_id):
+    """Recompute the index row of one user and one file"""
+    with transaction.atomic():
+        FileVisibility.objects.filter(user_id=user_id, file_id=file_id).delete()
+        FileVisibility.objects.bulk_create(_file_entries([file_id], user_id=user_id).rows())
+
+
+def rebuild_index(batch_size=BATCH_SIZE):
+    """Rebuild the whole index in bulk, returns the number of rows written"""
+    written = 0
+    with transaction.atomic():
+        FileVisibility.objects.all().delete()
+        file_ids = list(File.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(file_ids), batch_size):
+            rows = _file_entries(file_ids[start:start + batch_size]).rows()
+            FileVisibility.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    return written
@@ -0,0 +1,140 @@
+"""Moving blobs between storage volumes.
+
+A blob is copied to its new volume under a temporary name, at most at the
+configured rate, fsynced and renamed into place. Only then are the blob
+and every File and FileVersion pointing at it switched to the new path in
+one transaction, and the old copy is deleted once that commits. Readers
+holding the old path are served from the new volume by the storage's
+fallback lookup, so files stay readable throughout.
+"""
+import os
+import shutil
+import time
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import Blob, File, FileVersion
+from .storage import on_volume, volume_name
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Throttle:
+    """Sleep as needed to keep to ``rate`` bytes per second, no limit when 0"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.sent = 0
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        self.sent += size
+        ahead = self.sent / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def usage():
+    """{volume: (used bytes, total bytes)} of every volume"""
+    result = {}
+    for volume, root in default_storage.volumes().items():
+        os.makedirs(root, exist_ok=True)
+        disk = shutil.disk_usage(root)
+        result[volume] = (disk.total - disk.free, disk.total)
+    return result
+
+
+def _copy(source, target, throttle):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + '.moving'
+    try:
+        with open(source, 'rb') as reader, open(partial, 'wb') as writer:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                writer.write(chunk)
+                throttle.consume(len(chunk))
+            writer.flush()
+            os.fsync(writer.fileno())
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def move_blob(blob, volume, throttle=None):
+    """Move a blob's content to ``volume``, returns whether it moved"""
+    current_volume, relative = volume_name(blob.path)
+    if current_volume == volume:
+        return False
+    new_path = on_volume(volume, relative)
+    target = default_storage.volume_storage(volume).path(relative)
+    _copy(default_storage.path(blob.path), target, throttle or Throttle(0))
+
+    with transaction.atomic():
+        if not Blob.objects.select_for_update().filter(id=blob.id, path=blob.path).exists():
+            # Collected or moved by someone else meanwhile
+            transaction.on_commit(lambda: os.remove(target))
+            return False
+        Blob.objects.filter(id=blob.id).update(path=new_path, volume=volume)
+        File.objects.filter(blob_id=blob.id).update(file=new_path)
+        FileVersion.objects.filter(blob_id=blob.id).update(file_data=new_path)
+        transaction.on_commit(lambda old_path=blob.path: default_storage.delete(old_path))
+    return True
+
+
+def rebalance(rate=0, tolerance=0.05, max_bytes=None, dry_run=False, log=None):
+    """Move blobs from the fullest volume to the emptiest until their fill ratios are within ``tolerance``
+
+    Returns (blobs moved, bytes moved).
+    """
+    throttle = Throttle(rate)
+    moved = moved_bytes = 0
+    planned, planned_ids = {}, set()
+    while max_bytes is None or moved_bytes < max_bytes:
+        volumes = usage()
+        if len(volumes) < 2:
+            break
+        for volume, size in planned.items():
+            used, total = volumes[volume]
+            volumes[volume] = (used + size, total)
+        ratios = {volume: used / total for volume, (used, total) in volumes.items() if total}
+        fullest = max(ratios, key=ratios.get)
+        emptiest = min(ratios, key=ratios.get)
+        if ratios[fullest] - ratios[emptiest] <= tolerance:
+            break
+
+        # Bring both halfway towards each other
+        gap = (ratios[fullest] - ratios[emptiest]) / 2
+        wanted = int(min(gap * volumes[fullest][1], gap * volumes[emptiest][1]))
+        if max_bytes is not None:
+            wanted = min(wanted, max_bytes - moved_bytes)
+
+        batch_bytes = 0
+        candidates = Blob.objects.filter(volume=fullest, tier='hot', ref_count__gt=0).order_by('-size')
+        for blob in candidates.iterator(chunk_size=100):
+            if batch_bytes >= wanted:
+                break
+            if blob.size > wanted - batch_bytes and batch_bytes:
+                continue
+            if dry_run:
+                if blob.id in planned_ids:
+                    continue
+                planned_ids.add(blob.id)
+                planned[fullest] = planned.get(fullest, 0) - blob.size
+                planned[emptiest] = planned.get(emptiest, 0) + blob.size
+                moved_this = True
+            else:
+                moved_this = move_blob(blob, emptiest, throttle)
+            if moved_this:
+                moved += 1
+                batch_bytes += blob.size
+                if log:
+                    log(f'{blob.path}: {fullest} -> {emptiest} ({blob.size} bytes)')
+        if not batch_bytes:
+            # Nothing left that fits
+            break
+        moved_bytes += batch_bytes
+    return moved, moved_bytes
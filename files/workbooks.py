@@ -0,0 +1,131 @@
+"""Sheet metadata of xlsx workbooks without loading them.
+
+Sheet names and the active sheet live in ``xl/workbook.xml``, a few
+kilobytes at the start of a workbook's zip. Only the central directory and
+that one part are read, so the cost does not grow with the size of the
+sheets. Results are cached by the content's SHA-256 in the default cache;
+content-addressed entries never go stale.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+
+from django.core.cache import cache
+
+from . import tiering
+
+WORKBOOK_PART = 'xl/workbook.xml'
+
+# A workbook part larger than this is not a real workbook
+MAX_WORKBOOK_PART_SIZE = 16 * 1024 * 1024
+
+CACHE_PREFIX = 'xlsx-sheets:'
+
+SheetInfo = namedtuple('SheetInfo', ['sheets', 'active'])
+
+
+class WorkbookError(Exception):
+    pass
+
+
+def _local(tag):
+    return tag.rpartition('}')[2]
+
+
+def _parse(stream):
+    sheets, active_tab = [], 0
+    for _, element in iterparse(stream):
+        tag = _local(element.tag)
+        if tag == 'workbookView':
+            active_tab = int(element.get('activeTab', 0) or 0)
+        elif tag == 'sheet':
+            sheets.append(element.get('name', ''))
+        elif tag == 'sheets':
+            # Book views come before the sheets, nothing after them is needed
+            break
+    active = sheets[active_tab] if 0 <= active_tab < len(sheets) else (sheets[0] if sheets else None)
+    return SheetInfo(tuple(sheets), active)
+
+
+def _read(source):
+    try:
+        with zipfile.ZipFile(source) as archive:
+            try:
+                member = archive.getinfo(WORKBOOK_PART)
+            except KeyError:
+                raise WorkbookError(f'{WORKBOOK_PART} is missing')
+            if member.file_size > MAX_WORKBOOK_PART_SIZE:
+                raise WorkbookError(f'{WORKBOOK_PART} is too large')
+            with archive.open(member) as stream:
+                return _parse(stream)
+    except (zipfile.BadZipFile, SyntaxError, ValueError) as e:
+        # iterparse raises ParseError, a SyntaxError subclass
+        raise WorkbookError(str(e))
+
+
+def _seekable(fileobj):
+    """Zip readers need to seek, spool non-seekable streams such as cold blobs first"""
+    seekable = getattr(fileobj, 'seekable', None)
+    if seekable and seekable():
+        return fileobj
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(fileobj, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def sheet_info(source, content_hash=None):
+    """SheetInfo of a workbook given as bytes, a path or a binary file object
+
+    Cached when ``content_hash`` is given; for bytes it is computed.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        content_hash = content_hash or hashlib.sha256(source).hexdigest()
+        source = io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        source = os.fspath(source)
+    else:
+        source = _seekable(source)
+
+    if content_hash:
+        info = cache.get(CACHE_PREFIX + content_hash)
+        if info is not None:
+            return info
+    info = _read(source)
+    if content_hash:
+        cache.set(CACHE_PREFIX + content_hash, info, timeout=None)
+    return info
+
+
+def file_sheet_info(file_obj):
+    """SheetInfo of a stored file, its content only opened on a cache miss"""
+    content_hash = file_obj.blob.sha256 if file_obj.blob_id else file_obj.content_hash
+    if content_hash:
+        info = cache.get(CACHE_PREFIX + content_hash)
+        if info is not None:
+            return info
+    with tiering.open_content(file_obj) as content:
+        return sheet_info(content, content_hash=content_hash)
+
+
+def apply(file_obj, info, track_active=False):
+    """Copy sheet metadata onto ``file_obj``, returns the names of the fields that changed
+
+    With ``track_active`` the workbook's own active sheet wins, as after an edit.
+    """
+    values = {
+        'sheet_count': len(info.sheets),
+        'has_multiple_sheets': len(info.sheets) > 1,
+    }
+    # Keep the sheet the user was last on while it still exists
+    if track_active or file_obj.last_active_sheet not in info.sheets:
+        values['last_active_sheet'] = info.active
+    changed = [field for field, value in values.items() if getattr(file_obj, field) != value]
+    for field in changed:
+        setattr(file_obj, field, values[field])
+    return changed
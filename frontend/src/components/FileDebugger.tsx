@@ -12,7 +12,7 @@ const FileDebugger: React.FC = () => {
       try {
         setDebugInfo('Dispatching fetchFiles...');
         const result = await dispatch(fetchFiles()).unwrap();
-        setDebugInfo(`Success: Got ${Array.isArray(result) ? result.length : 'non-array'} files`);
+        setDebugInfo(`Success: Got ${result.results.length} of ${result.count} files`);
       } catch (error: any) {
         setDebugInfo(`Error: ${error.message || error}`);
       }
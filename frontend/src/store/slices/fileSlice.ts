@@ -77,12 +77,24 @@ export interface OnlyOfficeConfig {
   token?: string;
 }
 
+// Cursor-paginated listing: follow `next` for older items
+export interface Page<T> {
+  count: number;
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
 interface FileState {
   files: FileItem[];
+  filesNext: string | null;
   myFiles: FileItem[];
+  myFilesNext: string | null;
   sharedFiles: FileItem[];
+  sharedFilesNext: string | null;
   currentFile: FileItem | null;
   fileVersions: FileVersion[];
+  fileVersionsNext: string | null;
   onlyOfficeConfig: OnlyOfficeConfig | null;
   loading: boolean;
   error: string | null;
@@ -90,10 +102,14 @@ interface FileState {
 
 const initialState: FileState = {
   files: [],
+  filesNext: null,
   myFiles: [],
+  myFilesNext: null,
   sharedFiles: [],
+  sharedFilesNext: null,
   currentFile: null,
   fileVersions: [],
+  fileVersionsNext: null,
   onlyOfficeConfig: null,
   loading: false,
   error: null,
@@ -107,7 +123,12 @@ export const fetchFiles = createAsyncThunk(
     file_type?: string;
     status?: string;
     department?: number;
-  }) => {
+    cursor?: string;
+  }): Promise<Page<FileItem>> => {
+    if (params?.cursor) {
+      const response = await api.get(params.cursor);
+      return response.data;
+    }
     const queryParams = new URLSearchParams();
     if (params?.search) queryParams.append('search', params.search);
     if (params?.file_type) queryParams.append('file_type', params.file_type);
@@ -121,16 +142,16 @@ export const fetchFiles = createAsyncThunk(
 
 export const fetchMyFiles = createAsyncThunk(
   'file/fetchMyFiles',
-  async () => {
-    const response = await api.get('/files/my-files/');
+  async (cursor?: string): Promise<Page<FileItem>> => {
+    const response = await api.get(cursor || '/files/my-files/');
     return response.data;
   }
 );
 
 export const fetchSharedFiles = createAsyncThunk(
   'file/fetchSharedFiles',
-  async () => {
-    const response = await api.get('/files/shared-files/');
+  async (cursor?: string): Promise<Page<FileItem>> => {
+    const response = await api.get(cursor || '/files/shared-files/');
     return response.data;
   }
 );
@@ -161,8 +182,8 @@ export const deleteFile = createAsyncThunk(
 
 export const fetchFileVersions = createAsyncThunk(
   'file/fetchVersions',
-  async (fileId: number) => {
-    const response = await api.get(`/files/${fileId}/versions/`);
+  async ({ fileId, cursor }: { fileId: number; cursor?: string }): Promise<Page<FileVersion>> => {
+    const response = await api.get(cursor || `/files/${fileId}/versions/`);
     return response.data;
   }
 );
@@ -214,7 +235,11 @@ const fileSlice = createSlice({
       })
       .addCase(fetchFiles.fulfilled, (state, action) => {
         state.loading = false;
-        state.files = action.payload;
+        // A cursor fetch appends the next page, anything else starts over
+        state.files = action.meta.arg?.cursor
+          ? [...state.files, ...action.payload.results]
+          : action.payload.results;
+        state.filesNext = action.payload.next;
       })
       .addCase(fetchFiles.rejected, (state, action) => {
         state.loading = false;
@@ -223,12 +248,18 @@ const fileSlice = createSlice({
       
       // Fetch my files
       .addCase(fetchMyFiles.fulfilled, (state, action) => {
-        state.myFiles = action.payload;
+        state.myFiles = action.meta.arg
+          ? [...state.myFiles, ...action.payload.results]
+          : action.payload.results;
+        state.myFilesNext = action.payload.next;
       })
       
       // Fetch shared files
       .addCase(fetchSharedFiles.fulfilled, (state, action) => {
-        state.sharedFiles = action.payload;
+        state.sharedFiles = action.meta.arg
+          ? [...state.sharedFiles, ...action.payload.results]
+          : action.payload.results;
+        state.sharedFilesNext = action.payload.next;
       })
       
       // Upload file
@@ -264,7 +295,10 @@ const fileSlice = createSlice({
       
       // Fetch file versions
       .addCase(fetchFileVersions.fulfilled, (state, action) => {
-        state.fileVersions = action.payload;
+        state.fileVersions = action.meta.arg.cursor
+          ? [...state.fileVersions, ...action.payload.results]
+          : action.payload.results;
+        state.fileVersionsNext = action.payload.next;
       })
       
       // Toggle file lock